@@ -0,0 +1,70 @@
+"""ledger_daily
+
+Revision ID: 3f9c1d7e2a4b
+Revises: 4502442e67af
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1d7e2a4b'
+down_revision = '4502442e67af'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ledger_daily',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('party_type', sa.Enum('customer', 'supplier', name='ledgerpartytype'), nullable=False),
+    sa.Column('party_id', sa.Integer(), nullable=False),
+    sa.Column('currency_type', postgresql.ENUM('MAD', 'EUR', name='currencytype', create_type=False), nullable=False),
+    sa.Column('income', sa.Float(), nullable=False),
+    sa.Column('expenses', sa.Float(), nullable=False),
+    sa.Column('invoiced_ttc', sa.Float(), nullable=False),
+    sa.Column('invoiced_ht', sa.Float(), nullable=False),
+    sa.Column('vat', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'project_id', 'party_type', 'party_id', 'currency_type', name='uq_ledger_daily_key')
+    )
+    op.create_index(op.f('ix_ledger_daily_day'), 'ledger_daily', ['day'], unique=False)
+    op.create_index(op.f('ix_ledger_daily_project_id'), 'ledger_daily', ['project_id'], unique=False)
+
+    # Backfill from existing payments and invoices (same query as app/rebuild_ledger.py)
+    op.execute("""
+        INSERT INTO ledger_daily (day, project_id, party_type, party_id, currency_type, income, expenses, invoiced_ttc, invoiced_ht, vat)
+        SELECT day, project_id, party_type, party_id, currency_type,
+               SUM(income), SUM(expenses), SUM(invoiced_ttc), SUM(invoiced_ht), SUM(vat)
+        FROM (
+            SELECT p.disbursement_date AS day, p.project_id, 'customer'::ledgerpartytype AS party_type, p.customer_id AS party_id,
+                   i.currency_type, COALESCE(p.amount, 0) AS income, 0.0 AS expenses, 0.0 AS invoiced_ttc, 0.0 AS invoiced_ht, 0.0 AS vat
+            FROM paymentfromcustomer p JOIN internalinvoice i ON i.id = p.internal_invoice_id
+            UNION ALL
+            SELECT p.disbursement_date, p.project_id, 'supplier'::ledgerpartytype, p.supplier_id,
+                   e.currency_type, 0.0, COALESCE(p.amount, 0), 0.0, 0.0, 0.0
+            FROM paymenttosupplier p JOIN externalinvoice e ON e.id = p.external_invoice_id
+            UNION ALL
+            SELECT invoice_date, project_id, 'customer'::ledgerpartytype, customer_id,
+                   currency_type, 0.0, 0.0, amount_ttc, amount_ht, COALESCE(vat, 0)
+            FROM internalinvoice
+            UNION ALL
+            SELECT invoice_date, project_id, 'supplier'::ledgerpartytype, supplier_id,
+                   currency_type, 0.0, 0.0, amount_ttc, amount_ht, COALESCE(vat, 0)
+            FROM externalinvoice
+        ) entries
+        GROUP BY day, project_id, party_type, party_id, currency_type
+    """)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ledger_daily_project_id'), table_name='ledger_daily')
+    op.drop_index(op.f('ix_ledger_daily_day'), table_name='ledger_daily')
+    op.drop_table('ledger_daily')
+    sa.Enum(name='ledgerpartytype').drop(op.get_bind(), checkfirst=False)
@@ -0,0 +1,32 @@
+"""fx_rate
+
+Revision ID: 6e2b8f4a1c93
+Revises: d4a7c2b91e05
+Create Date: 2026-10-18 15:12:37.418026
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2b8f4a1c93'
+down_revision = 'd4a7c2b91e05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('fx_rate',
+    sa.Column('currency_type', postgresql.ENUM('MAD', 'EUR', name='currencytype', create_type=False), nullable=False),
+    sa.Column('rate_date', sa.Date(), nullable=False),
+    sa.Column('rate', sa.Float(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('currency_type', 'rate_date', name='uq_fx_rate_currency_date')
+    )
+
+
+def downgrade():
+    op.drop_table('fx_rate')
@@ -0,0 +1,29 @@
+"""report_data_version
+
+Revision ID: 8b21e64fd0c3
+Revises: 3f9c1d7e2a4b
+Create Date: 2026-10-18 11:40:02.531877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b21e64fd0c3'
+down_revision = '3f9c1d7e2a4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reportdataversion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO reportdataversion (id, version) VALUES (1, 0)")
+
+
+def downgrade():
+    op.drop_table('reportdataversion')
@@ -0,0 +1,41 @@
+"""extraction_cache
+
+Revision ID: b7e41c9d2f58
+Revises: 6e2b8f4a1c93
+Create Date: 2026-10-18 17:41:09.512634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e41c9d2f58'
+down_revision = '6e2b8f4a1c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('extraction_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('image_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('model', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('prompt_version', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('invoice_data', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('content_hash', 'model', 'prompt_version', name='uq_extraction_cache_key')
+    )
+    op.create_index(op.f('ix_extraction_cache_image_hash'), 'extraction_cache', ['image_hash'], unique=False)
+    op.create_index(op.f('ix_extraction_cache_last_used_at'), 'extraction_cache', ['last_used_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_extraction_cache_last_used_at'), table_name='extraction_cache')
+    op.drop_index(op.f('ix_extraction_cache_image_hash'), table_name='extraction_cache')
+    op.drop_table('extraction_cache')
@@ -0,0 +1,25 @@
+"""payment_invoice_indexes
+
+Revision ID: d4a7c2b91e05
+Revises: 8b21e64fd0c3
+Create Date: 2026-10-18 14:05:51.902113
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7c2b91e05'
+down_revision = '8b21e64fd0c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_paymentfromcustomer_internal_invoice_id'), 'paymentfromcustomer', ['internal_invoice_id'], unique=False)
+    op.create_index(op.f('ix_paymenttosupplier_external_invoice_id'), 'paymenttosupplier', ['external_invoice_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_paymenttosupplier_external_invoice_id'), table_name='paymenttosupplier')
+    op.drop_index(op.f('ix_paymentfromcustomer_internal_invoice_id'), table_name='paymentfromcustomer')
@@ -0,0 +1,37 @@
+"""supplier_template
+
+Revision ID: e5c83a1f7d20
+Revises: b7e41c9d2f58
+Create Date: 2026-10-18 19:06:51.284310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c83a1f7d20'
+down_revision = 'b7e41c9d2f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('supplier_template',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ice', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('supplier', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('template', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('uses', sa.Integer(), nullable=False),
+    sa.Column('failures', sa.Integer(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_supplier_template_ice'), 'supplier_template', ['ice'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_supplier_template_ice'), table_name='supplier_template')
+    op.drop_table('supplier_template')
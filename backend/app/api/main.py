@@ -7,7 +7,9 @@ from app.api.routes import suppliers, customers
 from app.api.routes import parts
 from app.api.routes import ExternalInvoices, InternalInvoices
 from app.api.routes import paymentstosupplier, paymentsfromcustomer
-from app.api.routes import reporting
+from app.api.routes import reporting, fx_rates
+from app.api.routes import supplier_templates, extraction_jobs
+from app.api.routes import documents
 from app.api.routes import tasks
 
 api_router = APIRouter()
@@ -24,4 +26,8 @@ api_router.include_router(InternalInvoices.router, prefix="/internal_invoices",
 api_router.include_router(paymentstosupplier.router, prefix="/paymentstosupplier", tags=["paymentstosupplier"])
 api_router.include_router(paymentsfromcustomer.router, prefix="/paymentsfromcustomer", tags=["paymentsfromcustomer"])
 api_router.include_router(reporting.router, prefix="/reporting", tags=["reporting"])
+api_router.include_router(fx_rates.router, prefix="/fx_rates", tags=["fx_rates"])
+api_router.include_router(supplier_templates.router, prefix="/supplier_templates", tags=["supplier_templates"])
+api_router.include_router(extraction_jobs.router, prefix="/extraction_jobs", tags=["extraction_jobs"])
+api_router.include_router(documents.router, prefix="/documents", tags=["documents"])
 api_router.include_router(tasks.router, prefix="/tasks", tags=["tasks"]) 
\ No newline at end of file
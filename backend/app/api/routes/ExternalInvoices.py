@@ -5,11 +5,14 @@ from typing import Any, List
 
 from app.api.deps import CurrentUser, SessionDep
 from app.api.routes.tools import gpt_process
+from app.api.routes.extraction_jobs import create_extraction_job
 from app.models import ExternalInvoiceCreate, ExternalInvoicePublic, ExternalInvoicesPublic, ExternalInvoiceUpdate
 from app.models import PartPublic, PartsPublic
 from app.models import PaymentToSuppliersPublic
-from app.models import InvoiceProcessingResponse
+from app.models import InvoiceProcessingResponse, ExtractionJobPublic
+from app.models import InvoiceIngest, ExternalInvoiceIngestPublic
 from app.crud import external_invoices as external_invoices_crud
+from app.crud import invoice_ingest as invoice_ingest_crud
 
 router = APIRouter()
 
@@ -132,10 +135,14 @@ def read_payments_for_external_invoice(
 def process_external_invoices(
     session: SessionDep, 
     current_user: CurrentUser,
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    force_refresh: bool = False
 ) -> InvoiceProcessingResponse:
     """
     Process external invoices and extract relevant information.
+    Set force_refresh to re-extract documents that were already processed.
+    Larger batches than one user may queue are refused (413): send them to
+    /process_invoice/jobs instead.
     """
     try:
         # Check if user has an active API token
@@ -145,8 +152,18 @@ def process_external_invoices(
                 detail="User does not have an active API token"
             )
             
-        results = gpt_process.pipeline(files, current_user.id, debug=True)
+        results = gpt_process.pipeline(files, current_user.id, force_refresh=force_refresh)
         return InvoiceProcessingResponse(data=results)
+    except gpt_process.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except gpt_process.ExtractionQueueFull as e:
+        # Too many of the user's own files queued, else too many overall
+        status_code = 429 if isinstance(e, gpt_process.UserExtractionQueueFull) else 503
+        raise HTTPException(
+            status_code=status_code,
+            detail=str(e),
+            headers={"Retry-After": str(gpt_process.QUEUE_RETRY_AFTER_SECONDS)}
+        )
     except ValueError as e:
         # Handle specific errors like missing or invalid API key
         raise HTTPException(status_code=400, detail=str(e))
@@ -155,4 +172,37 @@ def process_external_invoices(
         raise HTTPException(
             status_code=500, 
             detail=f"Error processing invoice: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/process_invoice/jobs", response_model=ExtractionJobPublic, status_code=202)
+def process_external_invoices_job(
+    current_user: CurrentUser,
+    files: List[UploadFile] = File(...),
+    force_refresh: bool = False
+) -> ExtractionJobPublic:
+    """
+    Queue external invoices for extraction and return immediately. Poll the job or
+    follow its events_url to receive each file's result as soon as it is ready.
+    """
+    return create_extraction_job(files, current_user, force_refresh=force_refresh)
+
+@router.post("/ingest", response_model=ExternalInvoiceIngestPublic)
+def ingest_external_invoice(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    ingest: InvoiceIngest
+) -> Any:
+    """
+    Enter an extracted invoice in one request: the supplier (picked, found by ICE
+    or created), the invoice and all of its line items as parts, in one transaction.
+    """
+    try:
+        external_invoice, supplier, created, parts = invoice_ingest_crud.ingest_external_invoice_db(session, ingest)
+    except invoice_ingest_crud.DuplicateInvoice as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ExternalInvoiceIngestPublic(
+        external_invoice=external_invoice, supplier=supplier, supplier_created=created, parts=parts
+    )
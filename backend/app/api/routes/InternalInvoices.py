@@ -11,9 +11,12 @@ from app.models import (
     InternalInvoiceUpdate
 )
 from app.models import PaymentFromCustomersPublic
-from app.models import InvoiceProcessingResponse
+from app.models import InvoiceProcessingResponse, ExtractionJobPublic
+from app.models import InvoiceIngest, InternalInvoiceIngestPublic
 from app.api.routes.tools import gpt_process
+from app.api.routes.extraction_jobs import create_extraction_job
 from app.crud import internal_invoices as internal_invoices_crud
+from app.crud import invoice_ingest as invoice_ingest_crud
 
 router = APIRouter()
 
@@ -104,10 +107,14 @@ def read_payments_for_internal_invoice(
 def process_internal_invoices(
     session: SessionDep, 
     current_user: CurrentUser,
-    files: List[UploadFile] = File(...)
+    files: List[UploadFile] = File(...),
+    force_refresh: bool = False
 ) -> InvoiceProcessingResponse:
     """
     Process internal invoices and extract relevant information.
+    Set force_refresh to re-extract documents that were already processed.
+    Larger batches than one user may queue are refused (413): send them to
+    /process_invoice/jobs instead.
     """
     try:
         # Check if user has an active API token
@@ -117,8 +124,18 @@ def process_internal_invoices(
                 detail="User does not have an active API token"
             )
             
-        results = gpt_process.pipeline(files, current_user.id, debug=True)
+        results = gpt_process.pipeline(files, current_user.id, force_refresh=force_refresh)
         return InvoiceProcessingResponse(data=results)
+    except gpt_process.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except gpt_process.ExtractionQueueFull as e:
+        # Too many of the user's own files queued, else too many overall
+        status_code = 429 if isinstance(e, gpt_process.UserExtractionQueueFull) else 503
+        raise HTTPException(
+            status_code=status_code,
+            detail=str(e),
+            headers={"Retry-After": str(gpt_process.QUEUE_RETRY_AFTER_SECONDS)}
+        )
     except ValueError as e:
         # Handle specific errors like missing or invalid API key
         raise HTTPException(status_code=400, detail=str(e))
@@ -127,4 +144,35 @@ def process_internal_invoices(
         raise HTTPException(
             status_code=500, 
             detail=f"Error processing invoice: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/process_invoice/jobs", response_model=ExtractionJobPublic, status_code=202)
+def process_internal_invoices_job(
+    current_user: CurrentUser,
+    files: List[UploadFile] = File(...),
+    force_refresh: bool = False
+) -> ExtractionJobPublic:
+    """
+    Queue internal invoices for extraction and return immediately. Poll the job or
+    follow its events_url to receive each file's result as soon as it is ready.
+    """
+    return create_extraction_job(files, current_user, force_refresh=force_refresh)
+
+@router.post("/ingest", response_model=InternalInvoiceIngestPublic)
+def ingest_internal_invoice(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    ingest: InvoiceIngest
+) -> Any:
+    """
+    Enter an extracted invoice in one request: the customer (picked, found by ICE
+    or created) and the invoice, in one transaction.
+    """
+    try:
+        internal_invoice, customer, created = invoice_ingest_crud.ingest_internal_invoice_db(session, ingest)
+    except invoice_ingest_crud.DuplicateInvoice as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return InternalInvoiceIngestPublic(internal_invoice=internal_invoice, customer=customer, customer_created=created)
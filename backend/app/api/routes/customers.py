@@ -1,9 +1,11 @@
 # app/api/routes/customers.py
 
-from typing import Any
+from typing import Any, Optional
 from fastapi import APIRouter, HTTPException
 from app.api.deps import CurrentUser, SessionDep
 from app.models import (
+    CounterpartyCandidatesPublic,
+    Customer,
     CustomerCreate, 
     CustomerPublic, 
     CustomersPublic, 
@@ -15,6 +17,7 @@ from app.models import (
     InternalInvoicesPublic,
     PaymentFromCustomersPublic
 )
+from app.crud import counterparties as counterparties_crud
 from app.crud import customers as customers_crud
 
 router = APIRouter()
@@ -41,6 +44,23 @@ def read_all_customer_contacts(
     count = customers_crud.get_customer_contacts_count_db(session)
     return CustomerContactsPublic(data=contacts, count=count)
 
+@router.get("/resolve", response_model=CounterpartyCandidatesPublic)
+def resolve_customers(
+    session: SessionDep,
+    current_user: CurrentUser,
+    name: Optional[str] = None,
+    ice: Optional[str] = None,
+    postal_code: Optional[str] = None,
+    limit: int = 5
+) -> Any:
+    """
+    Find existing customers matching a customer name, ICE and/or postal code as read from an invoice, best match first.
+    """
+    if not name and not ice:
+        raise HTTPException(status_code=400, detail="name or ice is required")
+    candidates = counterparties_crud.resolve_counterparties_db(session, Customer, name, ice, postal_code, limit)
+    return CounterpartyCandidatesPublic(data=[candidate._asdict() for candidate in candidates])
+
 @router.get("/{customer_id}", response_model=CustomerPublic)
 def read_customer(session: SessionDep, current_user: CurrentUser, customer_id: int) -> Any:
     """
@@ -0,0 +1,104 @@
+# app/api/routes/documents.py
+
+import os
+from typing import Iterator, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.api.deps import CurrentUser
+from app.core.documents import documents
+from app.models import User
+
+router = APIRouter()
+
+# Documents are stored under their content hash, so a URL always serves the same bytes
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+CHUNK_BYTES = 64 * 1024
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (first, last) byte of a single "bytes=" range. None when the whole file should be
+    sent instead (no range, several ranges, or a malformed one); ValueError when the
+    range starts past the end of the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            return (max(size - length, 0), size - 1) if length > 0 else None
+        start, end = int(first), int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+def read_range(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def get_document_or_404(document_id: str, current_user: User) -> dict:
+    document = documents.get(document_id)
+    if not document or not (documents.is_owner(document, current_user.id) or current_user.is_superuser):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+@router.get("/{document_id}")
+def read_document(
+    document_id: str,
+    current_user: CurrentUser,
+    range: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None)
+) -> Response:
+    """
+    Download a processed document (the original upload), for the users who uploaded
+    it. Supports a single byte Range and conditional requests on its ETag.
+    """
+    document = get_document_or_404(document_id, current_user)
+    etag = f'"{document_id}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match.split(", ")):
+        return Response(status_code=304, headers=headers)
+
+    path, size = documents.path(document_id), document["size"]
+    byte_range = None
+    if range and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type=document["content_type"], headers=headers)
+
+    start, end = byte_range
+    return StreamingResponse(
+        read_range(path, start, end),
+        status_code=206,
+        media_type=document["content_type"],
+        headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)},
+    )
+
+@router.get("/{document_id}/thumbnail")
+def read_document_thumbnail(document_id: str, current_user: CurrentUser) -> FileResponse:
+    """
+    A small JPEG preview of the document's first page.
+    """
+    get_document_or_404(document_id, current_user)
+    path = documents.thumbnail_path(document_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": CACHE_CONTROL})
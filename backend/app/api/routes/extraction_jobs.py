@@ -0,0 +1,193 @@
+# app/api/routes/extraction_jobs.py
+
+import asyncio
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.api.deps import CurrentUser
+from app.api.routes.tools import gpt_process
+from app.core.config import settings
+from app.core.jobs import JobQueueFull, JobStore
+from app.models import ExtractionJobPublic, User
+
+router = APIRouter()
+
+# Upload batches are extracted in the background; each file's result is written to
+# the job directory as soon as it is ready, so it can be polled or streamed
+extraction_jobs = JobStore(
+    root=os.path.join(settings.JOBS_STORAGE_DIR, "extractions"),
+    max_workers=settings.EXTRACTION_JOBS_MAX_WORKERS,
+    max_pending=settings.EXTRACTION_JOBS_MAX_PENDING,
+    retention_hours=settings.EXTRACTION_JOBS_RETENTION_HOURS,
+)
+
+# How often the event stream checks for new results, and sends a comment to keep
+# proxies from closing an idle connection
+EVENTS_POLL_SECONDS = 0.5
+EVENTS_KEEPALIVE_SECONDS = 15
+
+FINISHED = ("done", "failed")
+
+def upload_path(job_id: str, index: int) -> str:
+    return extraction_jobs.artifact_path(job_id, os.path.join("uploads", str(index)))
+
+def result_path(job_id: str, sequence: int) -> str:
+    return extraction_jobs.artifact_path(job_id, f"result-{sequence}.json")
+
+def read_result(job_id: str, sequence: int) -> Dict[str, Any]:
+    with open(result_path(job_id, sequence)) as f:
+        return json.load(f)
+
+def poll_result(job_id: str, sequence: int) -> Dict[str, Any]:
+    """A stored result without its thumbnail, which /documents/{document_id}/thumbnail serves."""
+    result = read_result(job_id, sequence)
+    result["thumbnail"] = None
+    return result
+
+def extraction_job_public(job: dict, since: Optional[int] = None) -> ExtractionJobPublic:
+    return ExtractionJobPublic(
+        id=job["id"],
+        status=job["status"],
+        progress=job["progress"],
+        message=job["message"],
+        files=[file["filename"] for file in job["params"]["files"]],
+        completed=job["completed"],
+        created_at=job["created_at"],
+        finished_at=job["finished_at"],
+        results=[poll_result(job["id"], sequence) for sequence in range(since, job["completed"])] if since is not None else [],
+        next_since=job["completed"],
+        usage=job.get("usage") or {},
+        timings=job.get("timings") or {},
+        events_url=f"{settings.API_V1_STR}/extraction_jobs/{job['id']}/events",
+    )
+
+def get_extraction_job_or_404(job_id: str, current_user: User) -> dict:
+    job = extraction_jobs.get(job_id)
+    if not job or (job["owner_id"] != current_user.id and not current_user.is_superuser):
+        raise HTTPException(status_code=404, detail="Extraction job not found")
+    return job
+
+def create_extraction_job(files: List[UploadFile], current_user: User, force_refresh: bool = False) -> ExtractionJobPublic:
+    """
+    Store the uploads in a new job directory and queue their extraction. The API key
+    is checked up front and only kept in memory, never in the job record; the job's
+    place in the queue is taken before the uploads are stored.
+    """
+    if not current_user.api_token_enabled:
+        raise HTTPException(status_code=403, detail="User does not have an active API token")
+    try:
+        api_key = gpt_process.load_env(current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        extraction_jobs.reserve()
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    params = {
+        "files": [{"filename": file.filename, "content_type": file.content_type} for file in files],
+        "force_refresh": force_refresh,
+    }
+    job = extraction_jobs.create(current_user.id, params)
+    try:
+        job = extraction_jobs.update(job["id"], completed=0)
+        os.makedirs(os.path.dirname(upload_path(job["id"], 0)), exist_ok=True)
+        uploads = [gpt_process.spool(file, upload_path(job["id"], index)) for index, file in enumerate(files)]
+    except BaseException as e:
+        extraction_jobs.release()
+        shutil.rmtree(extraction_jobs.job_dir(job["id"]), ignore_errors=True)
+        if isinstance(e, gpt_process.UploadTooLarge):
+            raise HTTPException(status_code=413, detail=str(e))
+        raise
+
+    def extract(job_id: str) -> str:
+        results: List[Dict[str, Any]] = [None] * len(uploads)
+        # Totals over the job's files: tokens and cost, and seconds per stage
+        usage: Dict[str, float] = {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        timings: Dict[str, float] = {}
+        completed = gpt_process.extract_files(api_key, uploads, current_user.id, force_refresh=force_refresh)
+        for sequence, (index, result) in enumerate(completed):
+            result = {"index": index, **result}
+            with open(result_path(job_id, sequence), "w") as f:
+                json.dump(result, f, default=str)
+            results[index] = result
+            for name, value in (result["usage"] or {}).items():
+                usage[name] = round(usage[name] + value, 6)
+            for stage, seconds in (result["timings"] or {}).items():
+                timings[stage] = round(timings.get(stage, 0.0) + seconds, 4)
+            extraction_jobs.update(
+                job_id,
+                completed=sequence + 1,
+                progress=round((sequence + 1) / len(uploads), 3),
+                message=f"Processed {result['filename']}",
+                usage=usage,
+                timings=timings,
+            )
+        shutil.rmtree(os.path.dirname(upload_path(job_id, 0)), ignore_errors=True)
+        with open(extraction_jobs.artifact_path(job_id, "results.json"), "w") as f:
+            json.dump(results, f, default=str)
+        return "results.json"
+
+    extraction_jobs.submit(job["id"], extract, reserved=True)
+    return extraction_job_public(job)
+
+@router.get("/{job_id}", response_model=ExtractionJobPublic)
+def read_extraction_job(job_id: str, current_user: CurrentUser, since: int = 0) -> ExtractionJobPublic:
+    """
+    Get the status of an extraction job and the per-file results completed since the
+    last poll: pass the next_since of the previous response as since. Thumbnails are
+    left out; fetch them from the documents endpoint.
+    """
+    job = get_extraction_job_or_404(job_id, current_user)
+    return extraction_job_public(job, since=max(since, 0))
+
+@router.get("/{job_id}/events")
+async def stream_extraction_job_events(
+    job_id: str,
+    request: Request,
+    current_user: CurrentUser,
+    last_event_id: Optional[str] = Header(None)
+) -> StreamingResponse:
+    """
+    Server-Sent Events: a "result" event per file as it finishes (its id is the
+    result's position, so a reconnecting client resumes after Last-Event-ID), then
+    an "end" event with the job status.
+    """
+    # The job record and results are read from disk off the event loop
+    await run_in_threadpool(get_extraction_job_or_404, job_id, current_user)
+    start = int(last_event_id) + 1 if last_event_id and last_event_id.isdigit() else 0
+
+    async def events():
+        sent, idle = start, 0.0
+        while True:
+            job = await run_in_threadpool(extraction_jobs.get, job_id)
+            if job is None:
+                return
+            while sent < job["completed"]:
+                result = await run_in_threadpool(read_result, job_id, sent)
+                yield f"id: {sent}\nevent: result\ndata: {json.dumps(result)}\n\n"
+                sent += 1
+                idle = 0.0
+            if job["status"] in FINISHED:
+                status = extraction_job_public(job).model_dump(mode="json")
+                yield f"event: end\ndata: {json.dumps(status)}\n\n"
+                return
+            if await request.is_disconnected():
+                return
+            if idle >= EVENTS_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                idle = 0.0
+            await asyncio.sleep(EVENTS_POLL_SECONDS)
+            idle += EVENTS_POLL_SECONDS
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,77 @@
+import csv
+from datetime import date
+from io import StringIO
+from typing import Any, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+
+from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
+from app.models import CurrencyType, FxRateBase, FxRateImportResult, FxRatesPublic
+from app.crud import fx_rates as fx_rates_crud
+from app.crud.reporting import BASE_CURRENCY
+
+router = APIRouter()
+
+FX_CSV_COLUMNS = ("date", "currency", "rate")
+
+def parse_fx_rates_csv(content: str) -> List[FxRateBase]:
+    """
+    Parse a rate file with a date,currency,rate header (ISO dates, rate = MAD per unit).
+    Errors are reported with their line number.
+    """
+    reader = csv.DictReader(StringIO(content))
+    header = [name.strip().lower() for name in reader.fieldnames or []]
+    if not set(FX_CSV_COLUMNS) <= set(header):
+        raise ValueError(f"Expected columns: {', '.join(FX_CSV_COLUMNS)}")
+    reader.fieldnames = header
+
+    rates = []
+    for row in reader:
+        try:
+            rate = FxRateBase(
+                currency_type=CurrencyType(row["currency"].strip().upper()),
+                rate_date=date.fromisoformat(row["date"].strip()),
+                rate=float(row["rate"]),
+            )
+        except (ValueError, AttributeError) as e:
+            raise ValueError(f"Line {reader.line_num}: {e}")
+        if rate.currency_type == BASE_CURRENCY:
+            raise ValueError(f"Line {reader.line_num}: rates are quoted in {BASE_CURRENCY.value}, not for it")
+        rates.append(rate)
+    return rates
+
+@router.get("/", response_model=FxRatesPublic)
+def read_fx_rates(
+    session: SessionDep,
+    current_user: CurrentUser,
+    currency_type: Optional[CurrencyType] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> Any:
+    """
+    Retrieve FX rates, latest first.
+    """
+    rates = fx_rates_crud.get_fx_rates_db(session, currency_type, skip=skip, limit=limit)
+    count = fx_rates_crud.get_fx_rates_count_db(session, currency_type)
+    return FxRatesPublic(data=rates, count=count)
+
+@router.post("/import", response_model=FxRateImportResult, dependencies=[Depends(get_current_active_superuser)])
+async def import_fx_rates(session: SessionDep, file: UploadFile = File(...)) -> Any:
+    """
+    Import FX rates from a CSV file with date, currency and rate (in MAD) columns.
+    Existing rates for the same currency and date are replaced.
+    """
+    try:
+        rates = parse_fx_rates_csv((await file.read()).decode("utf-8-sig"))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not rates:
+        raise HTTPException(status_code=400, detail="No rates found in file")
+
+    imported = fx_rates_crud.import_fx_rates_db(session, rates)
+    return FxRateImportResult(
+        imported=imported,
+        currencies=sorted({rate.currency_type for rate in rates}),
+        first_date=min(rate.rate_date for rate in rates),
+        last_date=max(rate.rate_date for rate in rates),
+    )
@@ -1,132 +1,331 @@
-from fastapi import APIRouter, HTTPException, Response
-from fastapi.responses import StreamingResponse
+import os
+from datetime import date
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import FileResponse, StreamingResponse
 import pandas as pd
 from io import BytesIO
-from app.models import ReportRequest, ReportResponse, ReportData
-from app.api.deps import SessionDep, CurrentUser
-from app.models import PaymentFromCustomer, PaymentToSupplier, ExternalInvoice, InternalInvoice, Project, Customer, Supplier
-from sqlalchemy import func
-from datetime import datetime
+from app.models import ReportRequest, ReportResponse, ReportCacheStats, ReportJobPublic, User
+from app.models import AgingRequest, AgingReport, ReportSeriesRequest, ReportSeries
+from app.api.deps import SessionDep, CurrentUser, get_current_active_superuser
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.fx import MissingFxRate
+from app.core.jobs import JobStore, JobQueueFull
+from app.crud import reporting as reporting_crud
+from app.api.routes.tools import report_export, dataset_export
 
 router = APIRouter()
 
+# Rendered reports keyed by (start_date, end_date, report_type, output_format, data version).
+# Writes bump the data version, so stale entries are never hit again and age out of the LRU.
+report_cache = LRUCache(max_entries=settings.REPORT_CACHE_MAX_ENTRIES)
+
+# Large reports are built in the background and downloaded once ready
+report_jobs = JobStore(
+    root=os.path.join(settings.JOBS_STORAGE_DIR, "reports"),
+    max_workers=settings.REPORT_JOBS_MAX_WORKERS,
+    max_pending=settings.REPORT_JOBS_MAX_PENDING,
+    retention_hours=settings.REPORT_JOBS_RETENTION_HOURS,
+)
+
+# Upper bound on the number of periods in one series request
+MAX_SERIES_PERIODS = 120
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def render_report(response: ReportResponse, output_format: str) -> bytes:
+    if output_format == 'json':
+        return response.model_dump_json().encode('utf-8')
+
+    report_data = response.data
+    # Create a dictionary of dataframes
+    dfs = {
+        'Summary': pd.DataFrame([{
+            'Total Income': report_data.total_income,
+            'Total Expenses': report_data.total_expenses,
+            'Net Profit': report_data.net_profit,
+            'Total Receivables': report_data.total_receivables,
+            'Total Payables': report_data.total_payables
+        }]),
+        'Project Data': pd.DataFrame([p.model_dump() for p in report_data.project_data]),
+        'Top Customers': pd.DataFrame([(c.name, c.total_payment) for c in report_data.top_customers], columns=['Customer', 'Total Payment']),
+        'Top Suppliers': pd.DataFrame([(s.name, s.total_payment) for s in report_data.top_suppliers], columns=['Supplier', 'Total Payment'])
+    }
+
+    output = BytesIO()
+    if output_format == 'csv':
+        for sheet_name, df in dfs.items():
+            output.write(f"{sheet_name}\n".encode('utf-8'))
+            output.write(df.to_csv(index=False).encode('utf-8'))
+            output.write("\n\n".encode('utf-8'))
+    else:  # xlsx
+        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+            for sheet_name, df in dfs.items():
+                df.to_excel(writer, sheet_name=sheet_name, index=False)
+    return output.getvalue()
+
+def report_http_response(content: bytes, request: ReportRequest, cache_status: str) -> Response:
+    headers = {"X-Report-Cache": cache_status}
+    if request.output_format != 'json':
+        filename = f"report_{request.start_date}_to_{request.end_date}.{request.output_format}"
+        headers["Content-Disposition"] = f"attachment; filename={filename}"
+        headers["Access-Control-Expose-Headers"] = "Content-Disposition"
+    return Response(content=content, media_type=MEDIA_TYPES[request.output_format], headers=headers)
+
+def check_fx_coverage(session: SessionDep) -> None:
+    try:
+        reporting_crud.check_fx_coverage_db(session)
+    except MissingFxRate as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/report", response_model=ReportResponse)
-async def generate_report(
+def generate_report(
     request: ReportRequest,
     session: SessionDep,
-    current_user: CurrentUser
+    current_user: CurrentUser,
+    bypass_cache: bool = False
 ):
+    """
+    Summary report for the date range; the top customers and suppliers are ranked on
+    their payments over all time. Runs on the threadpool (plain def), so the database
+    work never blocks the event loop.
+    """
+    if request.output_format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid output format")
+
     try:
+        data_version = reporting_crud.get_report_data_version_db(session)
+        cache_key = (request.start_date, request.end_date, request.report_type, request.output_format, data_version)
+        if not bypass_cache:
+            content = report_cache.get(cache_key)
+            if content is not None:
+                return report_http_response(content, request, "hit")
+
         # The start_date and end_date are already datetime.date objects, so no need to parse them
-        start_date = request.start_date
-        end_date = request.end_date
-
-        # Fetch data from database
-        payments_from_customers = session.query(PaymentFromCustomer).filter(
-            PaymentFromCustomer.disbursement_date.between(start_date, end_date)
-        ).all()
-        payments_to_suppliers = session.query(PaymentToSupplier).filter(
-            PaymentToSupplier.disbursement_date.between(start_date, end_date)
-        ).all()
-        external_invoices = session.query(ExternalInvoice).filter(
-            ExternalInvoice.invoice_date.between(start_date, end_date)
-        ).all()
-        internal_invoices = session.query(InternalInvoice).filter(
-            InternalInvoice.invoice_date.between(start_date, end_date)
-        ).all()
-
-        # Perform calculations
-        total_income = sum(payment.amount for payment in payments_from_customers if payment.amount is not None)
-        total_expenses = sum(payment.amount for payment in payments_to_suppliers if payment.amount is not None)
-        net_profit = total_income - total_expenses
-        total_receivables = sum(invoice.amount_ttc for invoice in internal_invoices if invoice.amount_ttc is not None)
-        total_payables = sum(invoice.amount_ttc for invoice in external_invoices if invoice.amount_ttc is not None)
-
-        # Project-wise breakdown
-        projects = session.query(Project).all()
-        project_data = []
-        for project in projects:
-            project_income = sum(payment.amount for payment in payments_from_customers if payment.project_id == project.id and payment.amount is not None)
-            project_expenses = sum(payment.amount for payment in payments_to_suppliers if payment.project_id == project.id and payment.amount is not None)
-            project_data.append({
-                "project_name": project.name,
-                "income": project_income,
-                "expenses": project_expenses,
-                "profit": project_income - project_expenses
-            })
-
-        # Top customers
-        top_customers = session.query(
-            Customer.name,
-            func.sum(PaymentFromCustomer.amount).label('total_payment')
-        ).join(PaymentFromCustomer).group_by(Customer.id).order_by(func.sum(PaymentFromCustomer.amount).desc()).limit(5).all()
-
-        # Top suppliers
-        top_suppliers = session.query(
-            Supplier.name,
-            func.sum(PaymentToSupplier.amount).label('total_payment')
-        ).join(PaymentToSupplier).group_by(Supplier.id).order_by(func.sum(PaymentToSupplier.amount).desc()).limit(5).all()
-
-        report_data = ReportData(
-            total_income=total_income,
-            total_expenses=total_expenses,
-            net_profit=net_profit,
-            total_receivables=total_receivables,
-            total_payables=total_payables,
-            project_data=project_data,
-            top_customers=[{"name": c[0], "total_payment": c[1]} for c in top_customers],
-            top_suppliers=[{"name": s[0], "total_payment": s[1]} for s in top_suppliers]
-        )
+        report_data = reporting_crud.get_report_data_db(session, request.start_date, request.end_date)
 
         response = ReportResponse(
             data=report_data,
-            start_date=start_date,
-            end_date=end_date,
+            start_date=request.start_date,
+            end_date=request.end_date,
             report_type=request.report_type
         )
+        content = render_report(response, request.output_format)
+        report_cache.set(cache_key, content)
+        return report_http_response(content, request, "bypass" if bypass_cache else "miss")
 
-        if request.output_format == 'json':
-            return response
-        elif request.output_format in ['csv', 'xlsx']:
-            # Create a dictionary of dataframes
-            dfs = {
-                'Summary': pd.DataFrame([{
-                    'Total Income': total_income,
-                    'Total Expenses': total_expenses,
-                    'Net Profit': net_profit,
-                    'Total Receivables': total_receivables,
-                    'Total Payables': total_payables
-                }]),
-                'Project Data': pd.DataFrame(project_data),
-                'Top Customers': pd.DataFrame(top_customers, columns=['Customer', 'Total Payment']),
-                'Top Suppliers': pd.DataFrame(top_suppliers, columns=['Supplier', 'Total Payment'])
-            }
-
-            if request.output_format == 'csv':
-                output = BytesIO()
-                for sheet_name, df in dfs.items():
-                    output.write(f"{sheet_name}\n".encode('utf-8'))
-                    output.write(df.to_csv(index=False).encode('utf-8'))
-                    output.write("\n\n".encode('utf-8'))
-                output.seek(0)
-                media_type = "text/csv"
-                filename = f"report_{start_date}_to_{end_date}.csv"
-            else:  # xlsx
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    for sheet_name, df in dfs.items():
-                        df.to_excel(writer, sheet_name=sheet_name, index=False)
-                output.seek(0)
-                media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                filename = f"report_{start_date}_to_{end_date}.xlsx"
-
-            headers = {
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Access-Control-Expose-Headers": "Content-Disposition"
-            }
-            return Response(content=output.getvalue(), media_type=media_type, headers=headers)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid output format")
-
+    except MissingFxRate as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/export")
+def export_report(
+    request: ReportRequest,
+    session: SessionDep,
+    current_user: CurrentUser
+) -> StreamingResponse:
+    """
+    Stream a CSV/XLSX report including line-level sheets for every payment and invoice in range.
+    """
+    # Fail before the response starts rather than midway through the stream; the
+    # summary's top customers and suppliers read every day, not just the range
+    check_fx_coverage(session)
+    if request.output_format == 'csv':
+        content = report_export.stream_csv_report(request.start_date, request.end_date)
+    elif request.output_format == 'xlsx':
+        content = report_export.stream_xlsx_report(request.start_date, request.end_date)
+    else:
+        raise HTTPException(status_code=400, detail="Export supports csv and xlsx only")
+
+    filename = f"export_{request.start_date}_to_{request.end_date}.{request.output_format}"
+    headers = {
+        "Content-Disposition": f"attachment; filename={filename}",
+        "Access-Control-Expose-Headers": "Content-Disposition"
+    }
+    return StreamingResponse(content, media_type=MEDIA_TYPES[request.output_format], headers=headers)
+
+@router.post("/series", response_model=ReportSeries)
+def generate_report_series(
+    request: ReportSeriesRequest,
+    session: SessionDep,
+    current_user: CurrentUser,
+    bypass_cache: bool = False
+) -> Any:
+    """
+    Period-over-period report: totals and per-project profit for each month, quarter or
+    year between start_date and end_date, or for an explicit list of periods.
+    """
+    if request.periods:
+        if request.granularity:
+            raise HTTPException(status_code=400, detail="Pass either periods or a granularity, not both")
+        periods = [(period.start_date, period.end_date) for period in request.periods]
+    elif request.granularity and request.start_date and request.end_date:
+        # A long range would be expanded into a huge list only to be refused
+        count = reporting_crud.series_period_count(request.start_date, request.end_date, request.granularity)
+        if count > MAX_SERIES_PERIODS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_SERIES_PERIODS} periods per series")
+        periods = reporting_crud.series_periods(request.start_date, request.end_date, request.granularity)
+    else:
+        raise HTTPException(status_code=400, detail="Pass periods, or start_date, end_date and granularity")
+    if not periods or any(start > end for start, end in periods):
+        raise HTTPException(status_code=400, detail="Each period must end on or after its start")
+    if len(periods) > MAX_SERIES_PERIODS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SERIES_PERIODS} periods per series")
+
+    data_version = reporting_crud.get_report_data_version_db(session)
+    cache_key = ("series", request.granularity, tuple(periods), data_version)
+    if not bypass_cache:
+        content = report_cache.get(cache_key)
+        if content is not None:
+            return Response(content=content, media_type=MEDIA_TYPES['json'], headers={"X-Report-Cache": "hit"})
+
+    try:
+        series = reporting_crud.get_report_series_db(session, periods, request.granularity)
+    except MissingFxRate as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    content = ReportSeries(
+        granularity=request.granularity,
+        currency=reporting_crud.BASE_CURRENCY,
+        periods=series
+    ).model_dump_json().encode('utf-8')
+    report_cache.set(cache_key, content)
+    return Response(
+        content=content,
+        media_type=MEDIA_TYPES['json'],
+        headers={"X-Report-Cache": "bypass" if bypass_cache else "miss"}
+    )
+
+@router.post("/aging", response_model=AgingReport)
+def generate_aging_report(
+    request: AgingRequest,
+    session: SessionDep,
+    current_user: CurrentUser
+) -> Any:
+    """
+    Receivables (customer) or payables (supplier) aging: outstanding invoice balances per
+    counterparty, bucketed by days past due as of the given date (default today).
+    """
+    as_of = request.as_of or date.today()
+    if request.output_format == 'csv':
+        filename = f"aging_{request.party_type.value}s_{as_of}.csv"
+        headers = {
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Access-Control-Expose-Headers": "Content-Disposition"
+        }
+        return StreamingResponse(
+            report_export.stream_aging_csv(request.party_type, as_of),
+            media_type=MEDIA_TYPES['csv'],
+            headers=headers
+        )
+    if request.output_format != 'json':
+        raise HTTPException(status_code=400, detail="Aging report supports json and csv only")
+
+    rows = reporting_crud.get_aging_rows_db(session, request.party_type, as_of)
+    return AgingReport(as_of=as_of, party_type=request.party_type, rows=rows)
+
+@router.get("/datasets/{name}", dependencies=[Depends(get_current_active_superuser)])
+def export_dataset(name: str, output_format: str = "parquet") -> StreamingResponse:
+    """
+    Download a full table (internal_invoices, external_invoices, parts, payments_from_customers
+    or payments_to_suppliers) with names joined in, as Parquet or an Arrow IPC file.
+    """
+    if name not in dataset_export.DATASETS:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    if output_format not in dataset_export.DATASET_FORMATS:
+        raise HTTPException(status_code=400, detail="Dataset export supports parquet and arrow only")
+
+    extension, media_type = dataset_export.DATASET_FORMATS[output_format]
+    headers = {
+        "Content-Disposition": f"attachment; filename={name}.{extension}",
+        "Access-Control-Expose-Headers": "Content-Disposition"
+    }
+    return StreamingResponse(dataset_export.stream_dataset(name, output_format), media_type=media_type, headers=headers)
+
+@router.get("/cache", response_model=ReportCacheStats, dependencies=[Depends(get_current_active_superuser)])
+def read_report_cache_stats(session: SessionDep) -> ReportCacheStats:
+    """
+    Report cache size and hit/miss counters for this worker.
+    """
+    return ReportCacheStats(
+        **report_cache.stats(),
+        data_version=reporting_crud.get_report_data_version_db(session)
+    )
+
+def report_job_public(job: dict) -> ReportJobPublic:
+    return ReportJobPublic(
+        id=job["id"],
+        status=job["status"],
+        progress=job["progress"],
+        message=job["message"],
+        request=ReportRequest(**job["params"]),
+        created_at=job["created_at"],
+        finished_at=job["finished_at"],
+        download_url=f"{settings.API_V1_STR}/reporting/jobs/{job['id']}/download" if job["status"] == "done" else None,
+    )
+
+def get_report_job_or_404(job_id: str, current_user: User) -> dict:
+    job = report_jobs.get(job_id)
+    if not job or (job["owner_id"] != current_user.id and not current_user.is_superuser):
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+@router.post("/jobs", response_model=ReportJobPublic, status_code=202)
+def create_report_job(
+    request: ReportRequest,
+    session: SessionDep,
+    current_user: CurrentUser
+) -> ReportJobPublic:
+    """
+    Queue a CSV/XLSX report build. Poll the job and download the file once it is done.
+    """
+    if request.output_format not in ('csv', 'xlsx'):
+        raise HTTPException(status_code=400, detail="Report jobs support csv and xlsx only")
+    check_fx_coverage(session)
+
+    job = report_jobs.create(current_user.id, request.model_dump(mode="json"))
+    filename = f"report_{request.start_date}_to_{request.end_date}.{request.output_format}"
+
+    def build(job_id: str) -> str:
+        report_export.write_report_file(
+            request.start_date,
+            request.end_date,
+            request.output_format,
+            report_jobs.artifact_path(job_id, filename),
+            on_progress=lambda progress, message: report_jobs.progress(job_id, progress, message),
+        )
+        return filename
+
+    try:
+        report_jobs.submit(job["id"], build)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return report_job_public(job)
+
+@router.get("/jobs/{job_id}", response_model=ReportJobPublic)
+def read_report_job(job_id: str, current_user: CurrentUser) -> ReportJobPublic:
+    """
+    Get the status and progress of a report job.
+    """
+    return report_job_public(get_report_job_or_404(job_id, current_user))
+
+@router.get("/jobs/{job_id}/download")
+def download_report_job(job_id: str, current_user: CurrentUser) -> FileResponse:
+    """
+    Download the file built by a finished report job.
+    """
+    job = get_report_job_or_404(job_id, current_user)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Report job is {job['status']}")
+    output_format = job["params"]["output_format"]
+    return FileResponse(
+        report_jobs.artifact_path(job_id, job["filename"]),
+        media_type=MEDIA_TYPES[output_format],
+        filename=job["filename"],
+        headers={"Access-Control-Expose-Headers": "Content-Disposition"},
+    )
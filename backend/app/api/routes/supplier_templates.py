@@ -0,0 +1,94 @@
+# app/api/routes/supplier_templates.py
+
+import os
+import tempfile
+from typing import Any
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from pydantic import ValidationError
+
+from app.api.deps import CurrentUser, SessionDep
+from app.api.routes.tools import gpt_process
+from app.api.routes.tools.gpt_utils import Invoice
+from app.api.routes.tools.invoice_render import PDF_CONTENT_TYPE
+from app.api.routes.tools.invoice_templates import TemplateError, learn_template
+from app.crud import supplier_templates as supplier_templates_crud
+from app.models import SupplierTemplate, SupplierTemplatePublic, SupplierTemplatesPublic
+
+router = APIRouter()
+
+def to_public(template: SupplierTemplate) -> SupplierTemplatePublic:
+    return SupplierTemplatePublic(
+        id=template.id,
+        ice=template.ice,
+        supplier=template.supplier,
+        fields=sorted(template.template["fields"]),
+        created_at=template.created_at,
+        uses=template.uses,
+        failures=template.failures,
+        last_used_at=template.last_used_at,
+    )
+
+@router.get("/", response_model=SupplierTemplatesPublic)
+def read_supplier_templates(
+    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+) -> Any:
+    """
+    Retrieve supplier layout templates.
+    """
+    templates = supplier_templates_crud.get_supplier_templates_db(session, skip, limit)
+    count = supplier_templates_crud.get_supplier_templates_count_db(session)
+    return SupplierTemplatesPublic(data=[to_public(template) for template in templates], count=count)
+
+@router.post("/confirm", response_model=SupplierTemplatePublic)
+def confirm_supplier_template(
+    session: SessionDep,
+    current_user: CurrentUser,
+    file: UploadFile = File(...),
+    invoice_data: str = Form(...)
+) -> Any:
+    """
+    Learn a supplier's layout from one of its PDF invoices and the extracted data
+    as confirmed by the user (Invoice JSON). The supplier's next invoices with the
+    same layout are then read without the model.
+    """
+    try:
+        invoice = Invoice.model_validate_json(invoice_data)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid invoice data: {e}")
+    if file.content_type != PDF_CONTENT_TYPE:
+        raise HTTPException(status_code=400, detail="Templates are learned from PDF invoices")
+
+    with tempfile.TemporaryDirectory(prefix="template-") as directory:
+        try:
+            path = gpt_process.spool_upload(file.file, os.path.join(directory, "upload.pdf"))
+        except gpt_process.UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        text_layer = gpt_process.read_text(path, file.content_type)
+    if not text_layer:
+        raise HTTPException(status_code=422, detail="The PDF has no usable text layer (scanned document?)")
+    try:
+        template = learn_template(text_layer.lines, invoice)
+    except TemplateError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    saved = supplier_templates_crud.save_supplier_template_db(
+        session, invoice.ice, invoice.supplier or invoice.ice, template
+    )
+    return to_public(saved)
+
+@router.delete("/{template_id}")
+def delete_supplier_template(
+    *,
+    session: SessionDep,
+    current_user: CurrentUser,
+    template_id: int
+) -> Any:
+    """
+    Delete a supplier template; the supplier's invoices go to the model again.
+    """
+    template = supplier_templates_crud.get_supplier_template_db(session, template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Supplier template not found")
+    supplier_templates_crud.delete_supplier_template_db(session, template)
+    return {"message": "Supplier template deleted successfully"}
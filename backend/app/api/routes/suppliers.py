@@ -1,9 +1,11 @@
 # app/api/routes/suppliers.py
 
-from typing import Any
+from typing import Any, Optional
 from fastapi import APIRouter, HTTPException
 from app.api.deps import CurrentUser, SessionDep
 from app.models import (
+    CounterpartyCandidatesPublic,
+    Supplier,
     SupplierCreate, 
     SupplierPublic, 
     SuppliersPublic, 
@@ -16,6 +18,7 @@ from app.models import (
     PaymentToSuppliersPublic,
     PartsPublic
 )
+from app.crud import counterparties as counterparties_crud
 from app.crud import suppliers as suppliers_crud
 
 router = APIRouter()
@@ -42,6 +45,23 @@ def read_all_supplier_contacts(
     count = suppliers_crud.get_supplier_contacts_count_db(session)
     return SupplierContactsPublic(data=contacts, count=count)
 
+@router.get("/resolve", response_model=CounterpartyCandidatesPublic)
+def resolve_suppliers(
+    session: SessionDep,
+    current_user: CurrentUser,
+    name: Optional[str] = None,
+    ice: Optional[str] = None,
+    postal_code: Optional[str] = None,
+    limit: int = 5
+) -> Any:
+    """
+    Find existing suppliers matching a supplier name, ICE and/or postal code as read from an invoice, best match first.
+    """
+    if not name and not ice:
+        raise HTTPException(status_code=400, detail="name or ice is required")
+    candidates = counterparties_crud.resolve_counterparties_db(session, Supplier, name, ice, postal_code, limit)
+    return CounterpartyCandidatesPublic(data=[candidate._asdict() for candidate in candidates])
+
 @router.get("/{supplier_id}", response_model=SupplierPublic)
 def read_supplier(session: SessionDep, current_user: CurrentUser, supplier_id: int) -> Any:
     """
@@ -0,0 +1,163 @@
+# app/api/routes/tools/dataset_export.py
+
+import os
+import tempfile
+from enum import Enum
+from typing import Dict, Iterator, NamedTuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Date, Float, Integer, Select, String, TypeDecorator
+from sqlalchemy import Enum as SQLEnum
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.api.routes.tools.report_export import stream_file
+from app.models import (
+    PaymentFromCustomer,
+    PaymentToSupplier,
+    InternalInvoice,
+    ExternalInvoice,
+    Part,
+    Project,
+    Customer,
+    Supplier
+)
+
+# Rows per record batch (and per Parquet row group), pulled from a server-side cursor;
+# peak memory scales with this, not with the table size
+BATCH_SIZE = 10_000
+
+DATASET_FORMATS = {
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+class Dataset(NamedTuple):
+    statement: Select
+    schema: pa.Schema
+
+
+def _arrow_type(sql_type) -> pa.DataType:
+    if isinstance(sql_type, TypeDecorator):
+        sql_type = sql_type.impl
+    if isinstance(sql_type, SQLEnum):
+        return pa.string()
+    if isinstance(sql_type, Integer):
+        return pa.int64()
+    if isinstance(sql_type, Float):
+        return pa.float64()
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    if isinstance(sql_type, String):
+        return pa.string()
+    raise TypeError(f"No Arrow type for {sql_type!r}")
+
+def _dataset(statement: Select) -> Dataset:
+    schema = pa.schema([(column.name, _arrow_type(column.type)) for column in statement.selected_columns])
+    return Dataset(statement, schema)
+
+# One flat table per entity, with counterparty and project names joined in
+DATASETS: Dict[str, Dataset] = {
+    "internal_invoices": _dataset(
+        select(
+            InternalInvoice.id, InternalInvoice.reference, InternalInvoice.invoice_date, InternalInvoice.due_date,
+            InternalInvoice.amount_ht, InternalInvoice.vat, InternalInvoice.amount_ttc, InternalInvoice.currency_type,
+            InternalInvoice.customer_id, Customer.name.label("customer_name"),
+            InternalInvoice.project_id, Project.name.label("project_name"),
+        )
+        .join(Customer, Customer.id == InternalInvoice.customer_id)
+        .join(Project, Project.id == InternalInvoice.project_id)
+        .order_by(InternalInvoice.id)
+    ),
+    "external_invoices": _dataset(
+        select(
+            ExternalInvoice.id, ExternalInvoice.reference, ExternalInvoice.invoice_date, ExternalInvoice.due_date,
+            ExternalInvoice.amount_ht, ExternalInvoice.vat, ExternalInvoice.amount_ttc, ExternalInvoice.currency_type,
+            ExternalInvoice.supplier_id, Supplier.name.label("supplier_name"),
+            ExternalInvoice.project_id, Project.name.label("project_name"),
+        )
+        .join(Supplier, Supplier.id == ExternalInvoice.supplier_id)
+        .join(Project, Project.id == ExternalInvoice.project_id)
+        .order_by(ExternalInvoice.id)
+    ),
+    "parts": _dataset(
+        select(
+            Part.id, Part.item_code, Part.description, Part.quantity, Part.unit_price, Part.amount,
+            Part.external_invoice_id, ExternalInvoice.reference.label("invoice_reference"),
+            Part.supplier_id, Supplier.name.label("supplier_name"),
+            Part.project_id, Project.name.label("project_name"),
+        )
+        .outerjoin(ExternalInvoice, ExternalInvoice.id == Part.external_invoice_id)
+        .outerjoin(Supplier, Supplier.id == Part.supplier_id)
+        .outerjoin(Project, Project.id == Part.project_id)
+        .order_by(Part.id)
+    ),
+    "payments_from_customers": _dataset(
+        select(
+            PaymentFromCustomer.id, PaymentFromCustomer.payment_ref, PaymentFromCustomer.disbursement_date,
+            PaymentFromCustomer.payment_status, PaymentFromCustomer.payment_mode, PaymentFromCustomer.amount,
+            PaymentFromCustomer.remaining, PaymentFromCustomer.additional_fees, InternalInvoice.currency_type,
+            PaymentFromCustomer.internal_invoice_id, InternalInvoice.reference.label("invoice_reference"),
+            PaymentFromCustomer.customer_id, Customer.name.label("customer_name"),
+            PaymentFromCustomer.project_id, Project.name.label("project_name"),
+        )
+        .join(InternalInvoice, InternalInvoice.id == PaymentFromCustomer.internal_invoice_id)
+        .join(Customer, Customer.id == PaymentFromCustomer.customer_id)
+        .join(Project, Project.id == PaymentFromCustomer.project_id)
+        .order_by(PaymentFromCustomer.id)
+    ),
+    "payments_to_suppliers": _dataset(
+        select(
+            PaymentToSupplier.id, PaymentToSupplier.payment_ref, PaymentToSupplier.disbursement_date,
+            PaymentToSupplier.payment_status, PaymentToSupplier.payment_mode, PaymentToSupplier.amount,
+            PaymentToSupplier.remaining, PaymentToSupplier.additional_fees, ExternalInvoice.currency_type,
+            PaymentToSupplier.external_invoice_id, ExternalInvoice.reference.label("invoice_reference"),
+            PaymentToSupplier.supplier_id, Supplier.name.label("supplier_name"),
+            PaymentToSupplier.project_id, Project.name.label("project_name"),
+        )
+        .join(ExternalInvoice, ExternalInvoice.id == PaymentToSupplier.external_invoice_id)
+        .join(Supplier, Supplier.id == PaymentToSupplier.supplier_id)
+        .join(Project, Project.id == PaymentToSupplier.project_id)
+        .order_by(PaymentToSupplier.id)
+    ),
+}
+
+
+def record_batches(session: Session, dataset: Dataset) -> Iterator[pa.RecordBatch]:
+    """Convert the query result to Arrow one cursor partition at a time."""
+    result = session.execute(dataset.statement.execution_options(yield_per=BATCH_SIZE))
+    for rows in result.partitions():
+        columns = []
+        for field, values in zip(dataset.schema, zip(*rows)):
+            if field.type == pa.string():
+                values = [value.value if isinstance(value, Enum) else value for value in values]
+            columns.append(pa.array(values, type=field.type))
+        yield pa.RecordBatch.from_arrays(columns, schema=dataset.schema)
+
+def write_dataset(session: Session, name: str, output_format: str, path: str) -> int:
+    """Write one dataset to path as Parquet or an Arrow IPC file; returns the row count."""
+    dataset = DATASETS[name]
+    if output_format == "parquet":
+        writer = pq.ParquetWriter(path, dataset.schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(path, dataset.schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    rows = 0
+    with writer:
+        for batch in record_batches(session, dataset):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+def stream_dataset(name: str, output_format: str) -> Iterator[bytes]:
+    # Both formats end with a footer, so the file is written out before it is streamed
+    fd, path = tempfile.mkstemp(suffix=f".{DATASET_FORMATS[output_format][0]}")
+    os.close(fd)
+    try:
+        with Session(engine) as session:
+            write_dataset(session, name, output_format, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    yield from stream_file(path, remove=True)
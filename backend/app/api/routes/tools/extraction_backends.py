@@ -0,0 +1,194 @@
+# app/api/routes/tools/extraction_backends.py
+
+# The model call of the extraction pipeline, behind one interface so the rest of the
+# pipeline (rendering, batching, caching, jobs) can be load-tested without the API:
+# - openai: the real extraction
+# - replay: responses recorded earlier, looked up by a hash of the request
+# - synthetic: generated invoices after a configurable delay, failing at a given rate
+
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+from app.api.routes.tools.gpt_utils import EXTRACTION_MODEL, Invoice, ItemDetail, call_openai_to_extract_data
+
+logger = logging.getLogger(__name__)
+
+def request_key(pages: List[Tuple[str, str]], page_note: str, text: Optional[str]) -> str:
+    """Hash of everything the model is shown for one call."""
+    digest = hashlib.sha256(page_note.encode())
+    digest.update((text or "").encode())
+    for encoded_img, detail in pages:
+        digest.update(detail.encode())
+        digest.update(encoded_img.encode())
+    return digest.hexdigest()
+
+
+class Usage(NamedTuple):
+    """Tokens billed for one extraction call (retries included)."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class ExtractionBackend(ABC):
+    """Extracts one invoice from (base64 JPEG, vision detail) page images or its text layer."""
+
+    # Extractions are cached per model, so each backend's results are kept apart
+    model: str
+
+    @abstractmethod
+    def extract(
+        self, api_key: str, pages: List[Tuple[str, str]], page_note: str = "", text: Optional[str] = None
+    ) -> Tuple[Invoice, Usage]:
+        ...
+
+
+class OpenAIBackend(ExtractionBackend):
+    model = EXTRACTION_MODEL
+
+    def extract(
+        self, api_key: str, pages: List[Tuple[str, str]], page_note: str = "", text: Optional[str] = None
+    ) -> Tuple[Invoice, Usage]:
+        invoice, completion = call_openai_to_extract_data(api_key, pages, page_note, text)
+        usage = completion.usage
+        return invoice, Usage(usage.prompt_tokens, usage.completion_tokens) if usage else Usage()
+
+
+class ReplayMissing(LookupError):
+    pass
+
+
+class ReplayBackend(ExtractionBackend):
+    """
+    Serves responses recorded as <directory>/<request key>.json. With record set,
+    a request that was never seen goes to the recorder backend and is saved.
+    Replayed calls cost nothing, so they report no usage.
+    """
+
+    model = "replay"
+
+    def __init__(self, directory: str, record: bool = False, recorder: Optional[ExtractionBackend] = None) -> None:
+        self.directory = directory
+        self.record = record
+        self.recorder = recorder or OpenAIBackend()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def extract(
+        self, api_key: str, pages: List[Tuple[str, str]], page_note: str = "", text: Optional[str] = None
+    ) -> Tuple[Invoice, Usage]:
+        key = request_key(pages, page_note, text)
+        try:
+            with open(self.path(key)) as f:
+                return Invoice.model_validate_json(f.read()), Usage()
+        except FileNotFoundError:
+            if not self.record:
+                raise ReplayMissing(f"No recorded extraction for request {key}")
+        invoice, usage = self.recorder.extract(api_key, pages, page_note, text)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(invoice.model_dump_json())
+        os.replace(tmp_path, self.path(key))
+        logger.info(f"Recorded extraction for request {key}")
+        return invoice, usage
+
+
+class SyntheticFailure(RuntimeError):
+    pass
+
+
+class SyntheticBackend(ExtractionBackend):
+    """
+    Answers after latency seconds (+/- 50%) and fails at failure_rate. The invoice is
+    derived from the request, so the same pages always give the same data; its usage
+    is a rough estimate (about 4 characters per token, 765 tokens per page image).
+    """
+
+    model = "synthetic"
+
+    def __init__(self, latency: float, failure_rate: float = 0.0, seed: Optional[int] = None) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def extract(
+        self, api_key: str, pages: List[Tuple[str, str]], page_note: str = "", text: Optional[str] = None
+    ) -> Tuple[Invoice, Usage]:
+        time.sleep(self.latency * self._random.uniform(0.5, 1.5))
+        if self._random.random() < self.failure_rate:
+            raise SyntheticFailure("Synthetic extraction failure")
+
+        key = request_key(pages, page_note, text)
+        document = random.Random(key)
+        items = [
+            ItemDetail(
+                code=f"REF-{document.randrange(10000):04d}",
+                description=f"Synthetic item {number + 1}",
+                unit_price=round(document.uniform(10, 5000), 2),
+                quantity=document.randint(1, 10),
+            )
+            for number in range(document.randint(1, 5))
+        ]
+        total_ht = round(sum(item.unit_price * item.quantity for item in items), 2)
+        invoice_date = date(2024, 1, 1) + timedelta(days=document.randrange(365))
+        invoice = Invoice(
+            invoice_number=f"SYN-{key[:8].upper()}",
+            invoice_date=invoice_date,
+            due_date=invoice_date + timedelta(days=30),
+            items=items,
+            total_amount_ht=total_ht,
+            total_vat_amount=round(total_ht * 0.2, 2),
+            total_amount_ttc=round(total_ht * 1.2, 2),
+            currency="MAD",
+            supplier=f"Synthetic Supplier {key[:4].upper()}",
+            ice=f"{int(key[:12], 16) % 10**15:015d}",
+            postal_code="20000",
+        )
+        usage = Usage(len(page_note + (text or "")) // 4 + 765 * len(pages), len(invoice.model_dump_json()) // 4)
+        return invoice, usage
+
+
+_backend: Optional[ExtractionBackend] = None
+_backend_lock = threading.Lock()
+
+def create_extraction_backend(name: str) -> ExtractionBackend:
+    if name == "openai":
+        return OpenAIBackend()
+    if name == "replay":
+        return ReplayBackend(settings.EXTRACTION_REPLAY_DIR, record=settings.EXTRACTION_REPLAY_RECORD)
+    if name == "synthetic":
+        return SyntheticBackend(settings.EXTRACTION_SYNTHETIC_LATENCY_SECONDS, settings.EXTRACTION_SYNTHETIC_FAILURE_RATE)
+    raise ValueError(f"Unknown extraction backend: {name}")
+
+def extraction_backend() -> ExtractionBackend:
+    """The backend selected by EXTRACTION_BACKEND, unless one was set explicitly."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_extraction_backend(settings.EXTRACTION_BACKEND)
+        return _backend
+
+def set_extraction_backend(backend: Optional[ExtractionBackend]) -> None:
+    """Swap the backend (benchmarks, tests); None goes back to the configured one."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+def extract_invoice(
+    api_key: str,
+    pages: List[Tuple[str, str]],
+    page_note: str = "",
+    text: Optional[str] = None
+) -> Tuple[Invoice, Usage]:
+    if not pages and not text:
+        raise ValueError("Encoded image not provided")
+    return extraction_backend().extract(api_key, pages, page_note, text)
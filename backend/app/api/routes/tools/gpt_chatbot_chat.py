@@ -6,6 +6,7 @@ import requests
 from pydantic import BaseModel, Field, create_model
 
 from app.api.routes.tools.gpt_utils import load_env
+from app.api.routes.tools.openai_clients import http_client
 
 from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor, OpenAIFunctionsAgent
@@ -159,14 +160,15 @@ class ChatbotManager:
                         ))
                         logger.info(f"Created tool: {tool['function']['name']}")
 
-            llm = ChatOpenAI(api_key=self.api_key, model_name="gpt-4", temperature=0.0)
+            llm = ChatOpenAI(api_key=self.api_key, model_name="gpt-4", temperature=0.0, http_client=http_client())
             logger.info("Language model initialized")
 
             prompt = ChatPromptTemplate.from_messages([
                 SystemMessage(content="""You are a helpful AI assistant that can interact with an API. 
                 Use the provided tools to respond to the user's request. 
                 When dealing with specific suppliers or invoices, make sure to use the correct supplier ID.
-                For example, if asked about 'PRO-ASSID', you should first use the suppliers-read_suppliers tool to find its ID,
+                For example, if asked about 'PRO-ASSID', you should first use the suppliers-resolve_suppliers tool
+                (or customers-resolve_customers for a customer) with its name to find its ID,
                 and then use that ID in subsequent API calls."""),
                 MessagesPlaceholder(variable_name="chat_history"),
                 HumanMessagePromptTemplate.from_template("{input}"),
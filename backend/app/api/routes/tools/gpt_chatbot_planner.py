@@ -6,6 +6,7 @@ from langchain_community.agent_toolkits.openapi import planner
 from langchain_community.agent_toolkits.openapi.spec import reduce_openapi_spec
 from langchain_community.utilities import RequestsWrapper
 from app.api.routes.tools.gpt_utils import load_env
+from app.api.routes.tools.openai_clients import http_client
 import requests
 
 # Set up logging
@@ -73,7 +74,7 @@ class ChatbotManager:
             requests_wrapper = RequestsWrapper(headers=headers)
 
             # Initialize LLM
-            llm = ChatOpenAI(api_key=self.api_key, model_name="gpt-4", temperature=0.0)
+            llm = ChatOpenAI(api_key=self.api_key, model_name="gpt-4", temperature=0.0, http_client=http_client())
             logger.info("Language model initialized")
 
 
@@ -1,35 +1,551 @@
+import base64
+import hashlib
+import itertools
 import json
-import timeit
-from typing import List
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 from fastapi import UploadFile
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.documents import documents
+from app.core.metrics import metrics
+from app.core.db import engine
+from app.crud.extraction_cache import get_cached_extraction_db, save_extraction_db, evict_extraction_cache_db
+from app.crud.supplier_templates import get_supplier_templates_by_ice_db, record_supplier_template_use_db
+from app.api.routes.tools.gpt_utils import (
+    load_env,
+    merge_invoices,
+    PROMPT_VERSION
+)
+from app.api.routes.tools.extraction_backends import Usage, extract_invoice, extraction_backend
+from app.api.routes.tools.invoice_render import RenderedPage, TextLayer, page_count, render_page, render_thumbnail, read_text_layer
+from app.api.routes.tools.invoice_templates import (
+    MIN_LAYOUT_SIMILARITY,
+    layout_similarity,
+    parse_with_template,
+    supplier_ices
+)
+
+logger = logging.getLogger(__name__)
+
+# Files are extracted concurrently: rendering in a process pool (CPU-bound), the model
+# call on the batch's own threads (network-bound). Each file holds a slot of its user's
+# semaphore and of the global one for its whole run, so one large upload cannot take
+# every slot from other users.
+_global_slots = threading.BoundedSemaphore(settings.EXTRACTION_MAX_CONCURRENCY)
+_user_slots: Dict[int, threading.BoundedSemaphore] = {}
+_slots_lock = threading.Lock()
+
+_render_pool: ProcessPoolExecutor | None = None
+_render_pool_lock = threading.Lock()
+
+# Seconds a client refused for a full queue is told to wait (Retry-After)
+QUEUE_RETRY_AFTER_SECONDS = 30
+
+class ExtractionQueueFull(Exception):
+    pass
+
+class UserExtractionQueueFull(ExtractionQueueFull):
+    pass
+
+class ExtractionQueue:
+    """
+    Files waiting for a slot or being extracted, overall and per user. Synchronous
+    uploads are only admitted while there is room, so a burst is refused at once
+    instead of holding request threads (and render workers) until it is processed;
+    job files wait for room one at a time instead.
+    """
+
+    def __init__(self, max_files: int, max_files_per_user: int) -> None:
+        self.max_files = max_files
+        self.max_files_per_user = max_files_per_user
+        self._total = 0
+        self._per_user: Dict[int, int] = {}
+        self._room = threading.Condition()
+
+    def _has_room(self, user_id: int, count: int) -> bool:
+        return (self._per_user.get(user_id, 0) + count <= self.max_files_per_user
+                and self._total + count <= self.max_files)
+
+    def _add(self, user_id: int, count: int) -> None:
+        self._total += count
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + count
+
+    def enter(self, user_id: int, count: int) -> None:
+        """Count files in, or raise when the queue has no room for them."""
+        if count > self.max_files_per_user:
+            metrics.increment("extraction.rejected.batch_too_large")
+            raise BatchTooLarge(
+                f"Batches of more than {self.max_files_per_user} files must be sent "
+                f"to /process_invoice/jobs"
+            )
+        with self._room:
+            queued = self._per_user.get(user_id, 0)
+            if queued + count > self.max_files_per_user:
+                metrics.increment("extraction.rejected.user_queue_full")
+                raise UserExtractionQueueFull(
+                    f"You already have {queued} files being processed; wait for them, "
+                    f"or send large batches as a job"
+                )
+            if self._total + count > self.max_files:
+                metrics.increment("extraction.rejected.queue_full")
+                raise ExtractionQueueFull("Invoice processing is busy, please retry shortly")
+            self._add(user_id, count)
+
+    def wait(self, user_id: int) -> None:
+        """Count one file in once the queue has room for it."""
+        with self._room:
+            self._room.wait_for(lambda: self._has_room(user_id, 1))
+            self._add(user_id, 1)
+
+    def leave(self, user_id: int, count: int = 1) -> None:
+        with self._room:
+            self._total -= count
+            self._per_user[user_id] -= count
+            if not self._per_user[user_id]:
+                del self._per_user[user_id]
+            self._room.notify_all()
+
+    def depth(self) -> int:
+        with self._room:
+            return self._total
+
+extraction_queue = ExtractionQueue(settings.EXTRACTION_MAX_QUEUED_FILES, settings.EXTRACTION_MAX_QUEUED_FILES_PER_USER)
+
+def user_slots(user_id: int) -> threading.BoundedSemaphore:
+    with _slots_lock:
+        if user_id not in _user_slots:
+            _user_slots[user_id] = threading.BoundedSemaphore(settings.EXTRACTION_MAX_CONCURRENCY_PER_USER)
+        return _user_slots[user_id]
+
+def render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn: forking a process that runs threads (server, DB pool) is unsafe
+            _render_pool = ProcessPoolExecutor(
+                max_workers=settings.EXTRACTION_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=os.nice,
+                initargs=(settings.EXTRACTION_RENDER_NICE,)
+            )
+        return _render_pool
+
+def _discard_broken_pool(pool: ProcessPoolExecutor) -> None:
+    # A worker died (e.g. on a malformed PDF); start a fresh pool for the next files
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+
+# Uploads are copied to disk this much at a time
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+class BatchTooLarge(UploadTooLarge):
+    pass
+
+def spool_upload(source: BinaryIO, path: str, max_bytes: int = settings.EXTRACTION_MAX_UPLOAD_BYTES) -> str:
+    """Copy an upload to path in chunks, so it is never held in memory whole."""
+    size = 0
+    with open(path, "wb") as f:
+        while chunk := source.read(SPOOL_CHUNK_BYTES):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Uploaded files are limited to {max_bytes // (1024 * 1024)} MB")
+            f.write(chunk)
+    return path
+
+# Buckets of the per-document token histograms
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+class ExtractionTrace:
+    """
+    Where one document's time and tokens went: seconds per stage and the model usage
+    with its estimated cost. Stages: upload (spooling and hashing it); render (reading
+    the text layer, waiting for a render worker included, then rasterizing the pages),
+    encode (JPEG) and base64, summed over the pages rendered in the workers; store;
+    cache; template; model (the calls, retries included); validate (merging and
+    converting the result).
+    """
+
+    def __init__(self, upload_seconds: float = 0.0) -> None:
+        self.timings: Dict[str, float] = {"upload": upload_seconds}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, timings: Optional[Dict[str, float]]) -> None:
+        with self._lock:
+            for stage, seconds in (timings or {}).items():
+                self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add({name: time.perf_counter() - start})
+
+    def add_usage(self, usage: Usage) -> None:
+        with self._lock:
+            self.prompt_tokens += usage.prompt_tokens
+            self.completion_tokens += usage.completion_tokens
+
+    @property
+    def cost(self) -> float:
+        """Estimated cost in USD at the configured model prices."""
+        return (
+            self.prompt_tokens * settings.EXTRACTION_PROMPT_PRICE_PER_MILLION
+            + self.completion_tokens * settings.EXTRACTION_COMPLETION_PRICE_PER_MILLION
+        ) / 1_000_000
+
+    def record(self) -> Dict[str, Any]:
+        """Add the document to the process metrics; returns its timings and usage for the result."""
+        for stage, seconds in self.timings.items():
+            metrics.observe(f"extraction.stage.{stage}", seconds)
+        if self.prompt_tokens or self.completion_tokens:
+            metrics.increment("extraction.tokens.prompt", self.prompt_tokens)
+            metrics.increment("extraction.tokens.completion", self.completion_tokens)
+            metrics.increment("extraction.cost_usd", self.cost)
+            metrics.histogram("extraction.document_tokens.prompt", self.prompt_tokens, TOKEN_BUCKETS)
+            metrics.histogram("extraction.document_tokens.completion", self.completion_tokens, TOKEN_BUCKETS)
+        return {
+            "timings": {stage: round(seconds, 4) for stage, seconds in self.timings.items()},
+            "usage": {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cost_usd": round(self.cost, 6),
+            },
+        }
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(SPOOL_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def in_render_pool(function: Callable, *args: Any) -> Any:
+    pool = render_pool()
+    try:
+        return pool.submit(function, *args).result()
+    except BrokenProcessPool:
+        _discard_broken_pool(pool)
+        raise
+
+def read_text(path: str, content_type: str) -> Optional[TextLayer]:
+    return in_render_pool(read_text_layer, path, content_type, settings.EXTRACTION_MAX_PAGES)
+
+def render(path: str, content_type: str, max_pages: int = settings.EXTRACTION_MAX_PAGES) -> List[RenderedPage]:
+    """
+    Render the pages side by side in the pool. At most one page per worker is in
+    flight, and workers return encoded JPEGs, so memory stays flat however long the PDF is.
+    """
+    pool = render_pool()
+    pages = min(page_count(path, content_type), max_pages)
+    rendered: List[RenderedPage] = []
+    in_flight = deque()
+    try:
+        for number in range(pages):
+            if len(in_flight) >= settings.EXTRACTION_RENDER_WORKERS:
+                rendered.append(in_flight.popleft().result())
+            in_flight.append(pool.submit(render_page, path, content_type, number))
+        while in_flight:
+            rendered.append(in_flight.popleft().result())
+        return rendered
+    except BrokenProcessPool:
+        _discard_broken_pool(pool)
+        raise
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+def extract(api_key: str, pages: List[RenderedPage], page_total: int, trace: ExtractionTrace) -> Dict[str, Any]:
+    """Send the pages in batches (side by side) and merge the partial invoices."""
+    size = settings.EXTRACTION_PAGES_PER_CALL
+    batches = [pages[i:i + size] for i in range(0, len(pages), size)]
+
+    def call(batch: List[RenderedPage]):
+        page_note = ""
+        if page_total > 1:
+            numbers = ", ".join(str(page.number + 1) for page in batch)
+            page_note = f"The images are pages {numbers} of a {page_total}-page invoice; only extract what they show."
+        invoice, usage = extract_invoice(api_key, [(page.image, page.detail) for page in batch], page_note)
+        trace.add_usage(usage)
+        return invoice
+
+    with trace.stage("model"):
+        if len(batches) == 1:
+            parts = [call(batches[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(batches)) as executor:
+                parts = list(executor.map(call, batches))
+    with trace.stage("validate"):
+        return json.loads(merge_invoices(parts).json())
+
+def extract_text(api_key: str, text_layer: TextLayer, trace: ExtractionTrace) -> Dict[str, Any]:
+    """One call with the layout text of every kept page (far fewer tokens than images)."""
+    text = "\n\n".join(f"--- Page {number + 1} ---\n{page_text}" for number, page_text in text_layer.pages)
+    page_note = (
+        "The invoice is given as the text layer of the PDF: one printed line per line, "
+        "table columns separated by ' | '."
+    )
+    with trace.stage("model"):
+        invoice, usage = extract_invoice(api_key, [], page_note, text=text)
+    trace.add_usage(usage)
+    with trace.stage("validate"):
+        return json.loads(invoice.json())
+
+def template_extraction(filename: str, text_layer: TextLayer) -> Optional[Dict[str, Any]]:
+    """Read the invoice with its supplier's template, if one matches and its result validates."""
+    with Session(engine) as session:
+        for template in get_supplier_templates_by_ice_db(session, supplier_ices(text_layer.lines)):
+            if layout_similarity(template.template, text_layer.lines) < MIN_LAYOUT_SIMILARITY:
+                continue
+            invoice, errors = parse_with_template(template.template, text_layer.lines)
+            record_supplier_template_use_db(session, template, success=not errors)
+            if not errors:
+                return json.loads(invoice.json())
+            metrics.increment("extraction.template_rejected")
+            logger.info(f"Template of {template.supplier} rejected for {filename}: {'; '.join(errors)}")
+    return None
+
+def cached_extraction(content_hash: Optional[str] = None, image_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    with Session(engine) as session:
+        return get_cached_extraction_db(
+            session, extraction_backend().model, PROMPT_VERSION,
+            timedelta(days=settings.EXTRACTION_CACHE_TTL_DAYS),
+            content_hash=content_hash, image_hash=image_hash
+        )
+
+# Counts this process's cache stores, so eviction runs every EXTRACTION_CACHE_EVICT_EVERY of them
+_cache_stores = itertools.count(1)
+
+def cache_extraction(content_hash: str, image_hash: str, invoice_data: Dict[str, Any]) -> None:
+    with Session(engine) as session:
+        save_extraction_db(session, content_hash, image_hash, extraction_backend().model, PROMPT_VERSION, invoice_data)
+        if next(_cache_stores) % settings.EXTRACTION_CACHE_EVICT_EVERY == 0:
+            evicted = evict_extraction_cache_db(
+                session, timedelta(days=settings.EXTRACTION_CACHE_TTL_DAYS), settings.EXTRACTION_CACHE_MAX_ENTRIES
+            )
+            logger.info(f"Evicted {evicted} extraction cache entries")
+
+def stored_thumbnail(document_id: str, file_path: str, content_type: str) -> bytes:
+    """The stored preview of a document, rendered (and stored) if it has none yet."""
+    thumbnail = documents.get_thumbnail(document_id)
+    if thumbnail is None:
+        thumbnail = in_render_pool(render_thumbnail, file_path, content_type)
+        documents.put_thumbnail(document_id, thumbnail)
+    return thumbnail
+
+def process_invoice(
+    api_key: str,
+    filename: str,
+    file_path: str,
+    content_type: str,
+    user_id: int,
+    force_refresh: bool = False,
+    trace: Optional[ExtractionTrace] = None
+):
+    start = time.perf_counter()
+    trace = trace or ExtractionTrace()
+
+    with trace.stage("upload"):
+        content_hash = file_sha256(file_path)
+
+    # An upload with the same bytes was already extracted: answer without rendering it
+    if not force_refresh:
+        with trace.stage("cache"):
+            invoice_data = cached_extraction(content_hash=content_hash)
+        if invoice_data is not None:
+            metrics.increment("extraction.cache_hits")
+            with trace.stage("store"):
+                documents.put(content_hash, file_path, content_type, owner_id=user_id)
+                thumbnail = stored_thumbnail(content_hash, file_path, content_type)
+            return extraction_result(filename, content_hash, thumbnail, invoice_data, True, "cache", None, trace, start)
+
+    # Digitally generated PDFs go to the model as text; scans and images as page images
+    input_hash = hashlib.sha256()
+    with trace.stage("render"):
+        text_layer = read_text(file_path, content_type)
+        if text_layer:
+            thumbnail = in_render_pool(render_thumbnail, file_path, content_type)
+    if text_layer:
+        path = "text"
+        preprocessing = text_layer.stats
+        for _, page_text in text_layer.pages:
+            input_hash.update(page_text.encode())
+    else:
+        path = "vision"
+        rendered = render(file_path, content_type)
+        thumbnail = rendered[0].thumbnail
+        preprocessing = [page.stats for page in rendered]
+        for page in rendered:
+            trace.add(page.timings)
+            if page.image:
+                input_hash.update(page.image.encode())
+    logger.info(f"Preprocessed {filename} for the {path} path: {preprocessing}")
+
+    # The response links to the stored document instead of embedding it
+    with trace.stage("store"):
+        documents.put(content_hash, file_path, content_type, owner_id=user_id)
+        documents.put_thumbnail(content_hash, thumbnail)
+
+    # An upload rendering to the same text or images (e.g. the same PDF saved again) is only sent to the model once
+    image_hash = input_hash.hexdigest()
+    with trace.stage("cache"):
+        invoice_data = None if force_refresh else cached_extraction(image_hash=image_hash)
+    cached = invoice_data is not None
+
+    # Repeat suppliers' digital invoices are read with their learned template
+    if not cached and text_layer and not force_refresh:
+        with metrics.timer("extraction.template"), trace.stage("template"):
+            invoice_data = template_extraction(filename, text_layer)
+        if invoice_data is not None:
+            path = "template"
+            metrics.increment("extraction.path.template")
+
+    if cached:
+        metrics.increment("extraction.cache_hits")
+    elif path != "template":
+        metrics.increment(f"extraction.path.{path}")
+        with metrics.timer(f"extraction.model.{path}"):
+            if text_layer:
+                invoice_data = extract_text(api_key, text_layer, trace)
+            else:
+                invoice_data = extract(api_key, [page for page in rendered if page.image], len(rendered), trace)
+        logger.debug(
+            "Text path hit rate: %s",
+            metrics.ratio("extraction.path.text", "extraction.path.text", "extraction.path.vision")
+        )
+        try:
+            with trace.stage("cache"):
+                cache_extraction(content_hash, image_hash, invoice_data)
+        except Exception as e:
+            logger.warning(f"Could not cache extraction for {filename}: {str(e)}")
+    return extraction_result(filename, content_hash, thumbnail, invoice_data, cached, path, preprocessing, trace, start)
+
+def extraction_result(
+    filename: str,
+    content_hash: str,
+    thumbnail: bytes,
+    invoice_data: Dict[str, Any],
+    cached: bool,
+    path: str,
+    preprocessing: Any,
+    trace: ExtractionTrace,
+    start: float
+) -> Dict[str, Any]:
+    metrics.observe(f"extraction.path.{path}", time.perf_counter() - start)
+    instrumentation = trace.record()
+    logger.info(f"Extracted {filename} on the {path} path: {instrumentation}")
 
-from app.api.routes.tools.gpt_utils import load_env, encode_file_to_base64, check_and_call_openai, debug_log
-
-def process_invoice(file: UploadFile, user_id: int, debug: bool = False):
-    api_key = load_env(user_id) 
-    debug_log(debug, 1, "API key loaded") 
-    
-    start = timeit.default_timer()
-    debug_log(debug, 2)
-    
-    encoded_img = encode_file_to_base64(file)
-    
-    extracted_data = check_and_call_openai(api_key, encoded_img)
-    
-    response_data_json = extracted_data.json()
-    end = timeit.default_timer()
-    
-    debug_log(debug, 3, response_data_json)
-    debug_log(debug, 4, start, end)
-    
     return {
-        "invoice_data": json.loads(response_data_json),
-        "document_image": encoded_img
+        "filename": filename,
+        "invoice_data": invoice_data,
+        "document_id": content_hash,
+        "document_url": f"{settings.API_V1_STR}/documents/{content_hash}",
+        "thumbnail": base64.b64encode(thumbnail).decode(),
+        "cached": cached,
+        "path": path,
+        "preprocessing": preprocessing,
+        **instrumentation,
+        "error": None
     }
 
-def pipeline(files: List[UploadFile], user_id: int, debug: bool = False):
-    results = []
-    for file in files:
-        result = process_invoice(file, user_id, debug)
-        results.append(result)
-    return results
\ No newline at end of file
+class Upload(NamedTuple):
+    filename: str
+    content_type: str
+    path: str  # spooled copy on local disk
+    upload_seconds: float = 0.0  # spent spooling it
+
+def spool(file: UploadFile, path: str) -> Upload:
+    start = time.perf_counter()
+    spool_upload(file.file, path)
+    return Upload(file.filename, file.content_type, path, time.perf_counter() - start)
+
+def error_result(filename: str, error: Exception) -> Dict[str, Any]:
+    return {"filename": filename, "invoice_data": None, "document_id": None, "document_url": None,
+            "thumbnail": None, "cached": False, "path": None, "preprocessing": None,
+            "timings": None, "usage": None, "error": str(error)}
+
+def extract_files(
+    api_key: str,
+    uploads: List[Upload],
+    user_id: int,
+    force_refresh: bool = False,
+    admitted: bool = False
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Extract every file concurrently, yielding (upload index, result) as each one
+    finishes. A file that fails gets a result with its error instead of failing the batch.
+    Each file is counted in the extraction queue until it is done: the caller entered
+    the whole batch (admitted), else each file waits for room before it starts.
+    """
+    slots = user_slots(user_id)
+
+    def run(index: int, upload: Upload) -> Tuple[int, Dict[str, Any]]:
+        if not admitted:
+            extraction_queue.wait(user_id)
+        try:
+            with slots, _global_slots:
+                return index, process_invoice(
+                    api_key, upload.filename, upload.path, upload.content_type, user_id,
+                    force_refresh=force_refresh, trace=ExtractionTrace(upload.upload_seconds)
+                )
+        except Exception as e:
+            logger.error(f"Error processing invoice {upload.filename}: {str(e)}", exc_info=True)
+            return index, error_result(upload.filename, e)
+        finally:
+            extraction_queue.leave(user_id)
+
+    if not uploads:
+        return
+    workers = min(len(uploads), settings.EXTRACTION_MAX_CONCURRENCY_PER_USER)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"extract-{user_id}") as executor:
+        futures = [executor.submit(run, index, upload) for index, upload in enumerate(uploads)]
+        for future in as_completed(futures):
+            yield future.result()
+
+def pipeline(
+    files: List[UploadFile],
+    user_id: int,
+    force_refresh: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Extract every file concurrently; results are in upload order. force_refresh skips
+    the extraction cache (the fresh result still replaces the cached one).
+    Raises UploadTooLarge when a file is over the upload size limit (BatchTooLarge
+    when there are more files than one user may queue), and ExtractionQueueFull (or
+    UserExtractionQueueFull) when too many files are queued.
+    """
+    api_key = load_env(user_id)
+    if not files:
+        return []
+
+    extraction_queue.enter(user_id, len(files))
+    with tempfile.TemporaryDirectory(prefix="extraction-") as directory:
+        try:
+            uploads = [spool(file, os.path.join(directory, str(index))) for index, file in enumerate(files)]
+        except BaseException:
+            extraction_queue.leave(user_id, len(files))
+            raise
+        results: List[Dict[str, Any]] = [None] * len(uploads)
+        for index, result in extract_files(api_key, uploads, user_id, force_refresh, admitted=True):
+            results[index] = result
+    return results
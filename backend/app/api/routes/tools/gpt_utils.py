@@ -1,23 +1,17 @@
 # app/api/routeS/tools/gpt_utils.py
 
 import os
-import base64
 from dotenv import load_dotenv
-from fastapi import UploadFile
-from PIL import Image
-from io import BytesIO
 from pydantic import BaseModel, Field
 from datetime import date
-from typing import List, Optional, Literal
-import fitz 
-import json
-import instructor
-from openai import OpenAI
+from typing import List, Optional, Literal, Tuple
 
 from sqlmodel import Session, select
 from app.models import User
+from app.core.config import settings
 from app.core.db import engine
 from app.core.security import decrypt_token
+from app.api.routes.tools.openai_clients import openai_clients
 
 import logging
 
@@ -55,113 +49,86 @@ def load_env(user_id: int) -> str:
         raise ValueError(f"Failed to load API key: {str(e)}")
 
 
-# PDF processing
-def is_pdf(file: UploadFile):
-    return file.content_type == 'application/pdf'
-
-def convert_pdf_to_jpeg(file: UploadFile, resolution=144):
-    # Read the uploaded file
-    pdf_data = file.file.read()
-    pdf_document = fitz.open(stream=pdf_data, filetype="pdf")
-    page = pdf_document.load_page(0)  # Load the first page
-
-    # Set the resolution (DPI)
-    zoom_x = resolution / 72  # Horizontal zoom factor
-    zoom_y = resolution / 72  # Vertical zoom factor
-    mat = fitz.Matrix(zoom_x, zoom_y)  # Define transformation matrix for zoom
-
-    pix = page.get_pixmap(matrix=mat)  # Render page to an image
-    image = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-    jpeg_image = BytesIO()
-    image.save(jpeg_image, format="JPEG", quality=95, optimize=True)
-    jpeg_image.seek(0)
-    return jpeg_image
-
-# Image processing
-def convert_image_to_jpeg(file: UploadFile):
-    image = Image.open(file.file)
-    jpeg_image = BytesIO()
-    image = image.convert("RGB")
-    image.save(jpeg_image, format="JPEG", quality=95, optimize=True)
-    jpeg_image.seek(0)
-    return jpeg_image
-
-def encode_image_to_base64(file: UploadFile):
-    jpeg_image = convert_image_to_jpeg(file)
-    content = jpeg_image.read()
-    encoded_string = base64.b64encode(content).decode('utf-8')
-    return encoded_string
-
-def encode_pdf_to_base64(file: UploadFile):
-    jpeg_image = convert_pdf_to_jpeg(file)
-    content = jpeg_image.read()
-    encoded_string = base64.b64encode(content).decode('utf-8')
-    return encoded_string
-
-def encode_file_to_base64(file: UploadFile):
-    if is_pdf(file):
-        return encode_pdf_to_base64(file)
-    else:
-        return encode_image_to_base64(file)
-
-
 # OpenAI API
-def call_openai_to_extract_data(key: str, encoded_img: str):
-    client = instructor.from_openai(OpenAI(api_key=key))
-    response = client.chat.completions.create(
-        model='gpt-4o',
+EXTRACTION_MODEL = 'gpt-4o'
+# Bump whenever the prompt or the Invoice model changes, so cached extractions are not reused
+PROMPT_VERSION = "2"
+
+def system_prompt() -> str:
+    """The extraction instructions, naming the company's own ICE when it is configured."""
+    prompt = """You are a specialized invoice processing AI. You have been trained to extract information from invoices for the profit of Al inside Private S.A.R.L. You will extract information from the given invoice and output the information in json format. Make sure that each information goes to the correct field in the json output.You can handle external and internal invoices. the main difference is that internal invoices contain values " RC N': 50543 l.F:26185261 T.P : 20800463 " on the top left corner of the invoice. when these values are found it is an internal invoice and you are required to return the customer name and ice of the customer. Never return AI-INSIDE PRIVATE SARL as a customer. On external invoices, you are required to return the supplier name and ice of the supplier.
+                """
+    if settings.COMPANY_ICE:
+        prompt += (
+            f"There are usually two ICE numbers one for the supplier and one for the client which is {settings.COMPANY_ICE} is the wrong ice. "
+            f"Find the ICE for supplier or the customer never return the wrong ICE number ({settings.COMPANY_ICE}). "
+            "when only one is found, it is the wrong one. return 00000 instead. "
+        )
+    return prompt + "the postal code is usually found within the address of the supplier or the customer."
+
+def call_openai_to_extract_data(
+    key: str,
+    pages: List[Tuple[str, str]],
+    page_note: str = "",
+    text: Optional[str] = None
+):
+    """
+    Extract one invoice from (base64 JPEG, vision detail) page images, or from its text
+    layer. Returns the invoice and the completion (for its token usage).
+    """
+    content = [
+        {
+            "type": "text",
+            "text": "Analyze the given invoice and extract relevant data in the correct format. " + page_note
+        }
+    ]
+    if text:
+        content.append({"type": "text", "text": text})
+    for encoded_img, detail in pages:
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{encoded_img}",
+                "detail": detail
+            }
+        })
+
+    client = openai_clients.get(key)
+    return client.chat.completions.create_with_completion(
+        model=EXTRACTION_MODEL,
         messages=[
             {
                 "role": "system",
-                "content": """You are a specialized invoice processing AI. You have been trained to extract information from invoices for the profit of Al inside Private S.A.R.L. You will extract information from the given invoice and output the information in json format. Make sure that each information goes to the correct field in the json output.You can handle external and internal invoices. the main difference is that internal invoices contain values " RC N': 50543 l.F:26185261 T.P : 20800463 " on the top left corner of the invoice. when these values are found it is an internal invoice and you are required to return the customer name and ice of the customer. Never return AI-INSIDE PRIVATE SARL as a customer. On external invoices, you are required to return the supplier name and ice of the supplier.
-                There are usually two ICE numbers one for the supplier and one for the client which is 002150760000076 is the wrong ice. Find the ICE for supplier or the customer never return the wrong ICE number (002150760000076). when only one is found, it is the wrong one. return 00000 instead. the postal code is usually found within the address of the supplier or the customer."""
+                "content": system_prompt()
             },
             {
                 "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "Analyze the given invoice and extract relevant data in the correct format. "
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{encoded_img}",
-                            "detail":"high"
-                        }
-                    }
-                ]
+                "content": content
             },
         ],
         response_model=Invoice,
     )
-    return response
-
-def check_and_call_openai(api_key: str, encoded_img: str):
-    if encoded_img is not None:
-        return call_openai_to_extract_data(api_key, encoded_img)
-    else:
-        raise ValueError("Encoded image not provided")
-
-
-# Debugging logs
-def debug_log(debug: bool, case: int, *args):
-    if not debug:
-        return
-    
-    if case == 1:
-        api_key = args[0]
-        print("\nLoaded API key:", api_key, "...\n")
-    elif case == 2:
-        print("Starting timer...")
-        print("Waiting for the Assistant to process...")
-    elif case == 3:
-        beautified_json = json.loads(args[0])
-        print(f"\nJSON response:\n")
-        print(json.dumps(beautified_json, indent=2))
-    elif case == 4:
-        start, end = args
-        print(f"\nProcessing time: {end - start} seconds")
+
+# Totals are printed on the last page, everything else on the first
+TOTAL_FIELDS = ("total_amount_ht", "total_vat_amount", "total_amount_ttc")
+
+def merge_invoices(parts: List["Invoice"]) -> "Invoice":
+    """
+    Combine the extractions of consecutive page batches: header fields from the first
+    batch that has them, totals from the last one, line items in page order.
+    """
+    merged = parts[0].model_copy(deep=True)
+    for part in parts[1:]:
+        for field in Invoice.model_fields:
+            value = getattr(part, field)
+            if field == "items":
+                merged.items.extend(value)
+            elif field in TOTAL_FIELDS:
+                if value is not None:
+                    setattr(merged, field, value)
+            elif not getattr(merged, field) and value:
+                setattr(merged, field, value)
+    return merged
 
 
 # Model response
@@ -0,0 +1,332 @@
+# app/api/routes/tools/invoice_render.py
+
+# Turning an upload into the JPEG sent to the model is CPU-bound, so it runs in worker
+# processes. Keep this module free of app imports (settings, database) so workers start fast.
+# Uploads are spooled to disk and opened by path here, so only the path crosses to the
+# workers and only the page being rendered is held in memory.
+
+import base64
+import re
+import time
+import unicodedata
+from io import BytesIO
+from math import ceil, floor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import fitz
+from PIL import Image, ImageOps
+
+PDF_CONTENT_TYPE = 'application/pdf'
+RESOLUTION = 144
+
+# Vision input billing: high detail fits the image in 2048x2048, scales the short side
+# down to 768, then costs 170 tokens per 512px tile plus 85; low detail is a flat 85
+# tokens for a 512x512 view of the image
+TILE = 512
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+
+# Printed invoice text stops being legible below about half of the 144 DPI render
+MIN_LEGIBLE_SCALE = 0.5
+# Shrink by at most this much more to save a row or column of tiles
+MAX_TILE_SHRINK = 0.9
+# Pixels lighter than this are page margin when cropping
+MARGIN_THRESHOLD = 235
+CROP_PADDING = 16
+# Tried in order; the first one that fits the byte budget per tile is kept
+JPEG_QUALITIES = (85, 75, 65)
+# First-page preview returned with each processed document (fits a THUMBNAIL_SIZE box)
+THUMBNAIL_SIZE = 320
+THUMBNAIL_QUALITY = 70
+THUMBNAIL_RESOLUTION = 72
+BYTES_PER_TILE = 48_000
+# What a plain quality 95 JPEG of the full colour render would weigh, per pixel: the
+# baseline of the bytes saved stat (0.07 to 0.26 over the sample invoices), estimated
+# rather than encoded since that encode would cost more than the page's real one
+BASELINE_JPEG_BYTES_PER_PIXEL = 0.15
+
+# Pages after the first are skipped when almost no pixel is inked, or when their text
+# layer reads like terms and conditions: a long text under a T&C heading with hardly
+# any amounts in it
+BLANK_INK_RATIO = 0.002
+TERMS_KEYWORDS = (
+    "conditions générales", "conditions generales", "conditions de vente",
+    "terms and conditions", "general terms", "terms of sale",
+)
+TERMS_MIN_WORDS = 150
+TERMS_MAX_AMOUNT_RATIO = 0.02
+AMOUNT = re.compile(r"\d+(?:[.,\s]\d{3})*[.,]\d{2}")
+
+# A PDF text layer replaces the page images when every kept page has enough words,
+# almost no unmapped glyphs (broken font encodings extract as \ufffd or private-use
+# characters) and the document contains amounts; scans have no or a few stray words
+TEXT_MIN_WORDS = 30
+TEXT_MAX_GARBLED_RATIO = 0.02
+# Pages mostly covered by one image are scans, whatever text layer they carry
+SCAN_IMAGE_RATIO = 0.5
+# Horizontal gap (points) between words that separates two columns
+COLUMN_GAP = 18
+
+
+class RenderedPage(NamedTuple):
+    number: int
+    image: Optional[str]  # base64-encoded JPEG, None when the page is skipped
+    detail: Optional[str]  # "low" or "high" vision detail
+    stats: Dict[str, Any]
+    thumbnail: Optional[bytes] = None  # small JPEG preview, first page only
+    timings: Optional[Dict[str, float]] = None  # seconds spent to render, encode (JPEG) and base64 it
+
+
+class Stopwatch:
+    """Seconds spent per stage, for stages that take turns: lap(stage) ends the current one."""
+
+    def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+# (x0, x1, text) of a word; a printed line is a list of cells, each a list of words
+Word = Tuple[float, float, str]
+Line = List[List[Word]]
+
+
+class TextLayer(NamedTuple):
+    pages: List[Tuple[int, str]]  # (page number, layout text) of the kept pages
+    lines: List[Line]  # printed lines of the kept pages, in order
+    stats: List[Dict[str, Any]]
+
+
+def page_count(path: str, content_type: str) -> int:
+    if content_type != PDF_CONTENT_TYPE:
+        return 1
+    with fitz.open(path, filetype="pdf") as pdf_document:
+        return pdf_document.page_count
+
+def load_page(path: str, content_type: str, number: int = 0, resolution: int = RESOLUTION) -> Tuple[Image.Image, str]:
+    """A page of a PDF, or the uploaded image, as an RGB image along with its text layer."""
+    if content_type != PDF_CONTENT_TYPE:
+        with Image.open(path) as image:
+            return image.convert("RGB"), ""
+    with fitz.open(path, filetype="pdf") as pdf_document:
+        page = pdf_document.load_page(number)
+
+        # Set the resolution (DPI)
+        zoom = resolution / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))  # Render page to an image
+        # samples_mv reads the pixmap in place instead of copying it to bytes first
+        return Image.frombytes("RGB", [pix.width, pix.height], pix.samples_mv), page.get_text()
+
+def to_jpeg(image: Image.Image, quality: int, optimize: bool = False) -> bytes:
+    jpeg_image = BytesIO()
+    image.save(jpeg_image, format="JPEG", quality=quality, optimize=optimize)
+    return jpeg_image.getvalue()
+
+def high_detail_size(width: int, height: int) -> Tuple[int, int]:
+    """Size the model downscales a high detail image to before tiling it."""
+    scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+    short_side = min(width, height) * scale
+    if short_side > HIGH_DETAIL_SHORT_SIDE:
+        scale *= HIGH_DETAIL_SHORT_SIDE / short_side
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def tile_count(width: int, height: int) -> int:
+    width, height = high_detail_size(width, height)
+    return ceil(width / TILE) * ceil(height / TILE)
+
+def estimate_tokens(width: int, height: int, detail: str) -> int:
+    if detail == "low":
+        return BASE_TOKENS
+    return BASE_TOKENS + TILE_TOKENS * tile_count(width, height)
+
+def crop_margins(image: Image.Image) -> Image.Image:
+    """Crop the blank border around the printed content of a grayscale page."""
+    ink = image.point(lambda p: 255 if p < MARGIN_THRESHOLD else 0)
+    bbox = ink.getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    return image.crop((
+        max(left - CROP_PADDING, 0),
+        max(top - CROP_PADDING, 0),
+        min(right + CROP_PADDING, image.width),
+        min(bottom + CROP_PADDING, image.height),
+    ))
+
+def choose_detail(width: int, height: int) -> str:
+    """Low detail when the content still reads at 512x512 (receipts, short notes)."""
+    return "low" if TILE / max(width, height) >= MIN_LEGIBLE_SCALE else "high"
+
+def fit_size(width: int, height: int, detail: str) -> Tuple[int, int]:
+    """
+    Smallest size that loses nothing the model would see: the size it downscales
+    to anyway, shrunk a little further when that drops a whole row or column of tiles
+    and the text stays legible.
+    """
+    if detail == "low":
+        scale = min(1.0, TILE / max(width, height))
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    fitted_width, fitted_height = high_detail_size(width, height)
+    best_tiles, best_shrink = tile_count(fitted_width, fitted_height), 1.0
+    for side in (fitted_width, fitted_height):
+        if side <= TILE or side % TILE == 0:
+            continue
+        shrink = floor(side / TILE) * TILE / side
+        if shrink < MAX_TILE_SHRINK or fitted_width * shrink / width < MIN_LEGIBLE_SCALE:
+            continue
+        tiles = tile_count(round(fitted_width * shrink), round(fitted_height * shrink))
+        if tiles < best_tiles or (tiles == best_tiles and shrink > best_shrink):
+            best_tiles, best_shrink = tiles, shrink
+    return max(1, round(fitted_width * best_shrink)), max(1, round(fitted_height * best_shrink))
+
+def encode(image: Image.Image, tiles: int) -> Tuple[bytes, int]:
+    """JPEG at the highest quality that fits the byte budget, else the lowest one."""
+    for quality in JPEG_QUALITIES:
+        jpeg = to_jpeg(image, quality)
+        if len(jpeg) <= BYTES_PER_TILE * tiles:
+            break
+    return jpeg, quality
+
+def is_blank(image: Image.Image) -> bool:
+    histogram = image.histogram()
+    return sum(histogram[:MARGIN_THRESHOLD]) < BLANK_INK_RATIO * image.width * image.height
+
+def is_terms_page(text: str) -> bool:
+    lowered = text.lower()
+    words = lowered.split()
+    if len(words) < TERMS_MIN_WORDS or not any(keyword in lowered for keyword in TERMS_KEYWORDS):
+        return False
+    return len(AMOUNT.findall(lowered)) < TERMS_MAX_AMOUNT_RATIO * len(words)
+
+def make_thumbnail(page: Image.Image) -> bytes:
+    return to_jpeg(ImageOps.contain(page, (THUMBNAIL_SIZE, THUMBNAIL_SIZE)), THUMBNAIL_QUALITY)
+
+def render_thumbnail(path: str, content_type: str) -> bytes:
+    """Preview of the first page alone, for documents that are not rendered for the model."""
+    page, _ = load_page(path, content_type, 0, resolution=THUMBNAIL_RESOLUTION)
+    return make_thumbnail(page)
+
+def render_page(path: str, content_type: str, number: int = 0) -> RenderedPage:
+    """
+    Render one page of a PDF, or an image upload, to the smallest JPEG that keeps it
+    readable for the model: margins cropped, grayscale, sized to the vision tile grid.
+    Pages after the first that are blank or terms and conditions are skipped.
+    """
+    stopwatch = Stopwatch()
+    page, text = load_page(path, content_type, number)
+    grayscale = page.convert("L")
+    if number > 0:
+        skipped = "blank" if is_blank(grayscale) else "terms" if is_terms_page(text) else None
+        if skipped:
+            stopwatch.lap("render")
+            return RenderedPage(number, None, None, {"page": number + 1, "skipped": skipped}, timings=stopwatch.timings)
+
+    original_width, original_height = page.size
+    original_tokens = estimate_tokens(original_width, original_height, "high")
+    original_bytes = round(original_width * original_height * BASELINE_JPEG_BYTES_PER_PIXEL)
+    stopwatch.lap("render")
+    thumbnail = make_thumbnail(page) if number == 0 else None
+    del page  # the full-size colour render is not needed past this point
+    stopwatch.lap("encode")
+
+    image = crop_margins(grayscale)
+    del grayscale
+    detail = choose_detail(*image.size)
+    width, height = fit_size(*image.size, detail)
+    if (width, height) != image.size:
+        image = image.resize((width, height), Image.LANCZOS, reducing_gap=2.0)
+    tiles = 1 if detail == "low" else tile_count(width, height)
+    tokens = estimate_tokens(width, height, detail)
+    stopwatch.lap("render")
+    jpeg, quality = encode(image, tiles)
+    stopwatch.lap("encode")
+    image_base64 = base64.b64encode(jpeg).decode('utf-8')
+    stopwatch.lap("base64")
+
+    stats = {
+        "page": number + 1,
+        "original_size": [original_width, original_height],
+        "size": [width, height],
+        "detail": detail,
+        "quality": quality,
+        "bytes": len(jpeg),
+        "estimated_bytes_saved": original_bytes - len(jpeg),
+        "estimated_tokens": tokens,
+        "estimated_tokens_saved": original_tokens - tokens,
+    }
+    return RenderedPage(number, image_base64, detail, stats, thumbnail, stopwatch.timings)
+
+def layout_lines(words: List[tuple]) -> List[Line]:
+    """
+    Words of a page (fitz "words" tuples) in reading order: printed lines top to
+    bottom, each split into cells where the gap between two words marks a new column.
+    """
+    rows: List[Tuple[float, List[Word]]] = []
+    for x0, y0, x1, y1, word, *_ in sorted(words, key=lambda word: (word[3], word[0])):
+        if rows and abs(y1 - rows[-1][0]) <= (y1 - y0) / 2:
+            rows[-1][1].append((x0, x1, word))
+        else:
+            rows.append((y1, [(x0, x1, word)]))
+    lines = []
+    for _, row in rows:
+        row.sort()
+        cells = [[row[0]]]
+        for previous, word in zip(row, row[1:]):
+            if word[0] - previous[1] > COLUMN_GAP:
+                cells.append([word])
+            else:
+                cells[-1].append(word)
+        lines.append(cells)
+    return lines
+
+def cell_text(cell: List[Word]) -> str:
+    return " ".join(word[2] for word in cell)
+
+def layout_text(lines: List[Line]) -> str:
+    """One printed line per line, columns separated by " | ", so table rows keep their cells together."""
+    return "\n".join(" | ".join(cell_text(cell) for cell in line) for line in lines)
+
+def covered_by_image(page: "fitz.Page") -> bool:
+    """Scanned pages are a page-sized image, possibly under an OCR text layer too unreliable to use."""
+    page_area = abs(page.rect)
+    return any(abs(fitz.Rect(image["bbox"]) & page.rect) > SCAN_IMAGE_RATIO * page_area for image in page.get_image_info())
+
+def is_usable_text(text: str) -> bool:
+    if len(text.split()) < TEXT_MIN_WORDS:
+        return False
+    garbled = sum(1 for char in text if char == "\ufffd" or (unicodedata.category(char) in ("Co", "Cc") and char != "\n"))
+    return garbled <= TEXT_MAX_GARBLED_RATIO * len(text)
+
+def read_text_layer(path: str, content_type: str, max_pages: int) -> Optional[TextLayer]:
+    """
+    The layout text of a digitally generated PDF, skipping the same pages as
+    render_page; None when any kept page has no usable text (scans, images).
+    """
+    if content_type != PDF_CONTENT_TYPE:
+        return None
+    pages, all_lines, stats = [], [], []
+    with fitz.open(path, filetype="pdf") as pdf_document:
+        for number in range(min(pdf_document.page_count, max_pages)):
+            page = pdf_document.load_page(number)
+            lines = layout_lines(page.get_text("words"))
+            text = layout_text(lines)
+            if number > 0:
+                skipped = "blank" if not text.strip() else "terms" if is_terms_page(text) else None
+                if skipped:
+                    stats.append({"page": number + 1, "skipped": skipped})
+                    continue
+            if covered_by_image(page) or not is_usable_text(text):
+                return None
+            pages.append((number, text))
+            all_lines.extend(lines)
+            stats.append({"page": number + 1, "characters": len(text)})
+    if not any(AMOUNT.search(text) for _, text in pages):
+        return None
+    return TextLayer(pages, all_lines, stats)
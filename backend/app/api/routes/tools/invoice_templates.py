@@ -0,0 +1,396 @@
+# app/api/routes/tools/invoice_templates.py
+
+# Supplier layout templates. One confirmed extraction of a supplier's digital PDF is
+# enough to learn where its fields are printed, relative to labels on the page
+# (anchors) and to the columns of the line-item table; the supplier's next invoices
+# are then read from their text layer without the model. A parse that fails
+# validation is discarded and the invoice goes to the model as usual.
+
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.api.routes.tools.gpt_utils import Invoice, ItemDetail
+from app.api.routes.tools.invoice_render import Line, Word, cell_text
+
+ICE = re.compile(r"(?<!\d)\d{15}(?!\d)")
+# 1 550,00 / 7,000.00 / 6400.00 / 3300: thousands groups must have three digits, so
+# "1 550,00 550,00" reads as two amounts
+AMOUNT = re.compile(r"(?<![\d.,])(?:\d{1,3}(?:[ .,]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)(?!\d)")
+DATE = re.compile(r"(?<!\d)\d{1,4}[/.-]\d{1,2}[/.-]\d{2,4}(?!\d)")
+DATE_FORMATS = ("%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d", "%Y/%m/%d", "%d/%m/%y", "%d-%m-%y", "%d.%m.%y")
+
+# Read at an anchor on every invoice: field -> kind of value
+SCALAR_FIELDS = {
+    "invoice_number": "text",
+    "invoice_date": "date",
+    "due_date": "date",
+    "total_amount_ht": "amount",
+    "total_vat_amount": "amount",
+    "total_amount_ttc": "amount",
+}
+# Totals are printed at the bottom, so their last occurrence is the one to learn
+LAST_OCCURRENCE_FIELDS = ("total_amount_ht", "total_vat_amount", "total_amount_ttc")
+REQUIRED_FIELDS = ("invoice_number", "invoice_date")
+# Properties of the supplier, copied from the confirmed invoice
+CONSTANT_FIELDS = ("supplier", "customer", "ice", "postal_code", "currency")
+ITEM_TEXT_FIELDS = ("code", "description")
+
+# The words printed above the item table (letterhead, labels, our address) fingerprint
+# a layout; a template applies when most of them are found in the document
+MIN_LAYOUT_SIMILARITY = 0.8
+AMOUNT_TOLERANCE = 0.005
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def anchor_key(text: str) -> str:
+    """Label text of a cell: lowercased words without digits or punctuation, so it stays the same across invoices."""
+    tokens = (re.sub(r"[^\w]+", "", token) for token in text.casefold().split())
+    return " ".join(token for token in tokens if token and not any(char.isdigit() for char in token))
+
+def parse_amount(text: str) -> Optional[float]:
+    text = re.sub(r"\s", "", text)
+    if not re.fullmatch(r"\d[\d.,]*", text):
+        return None
+    separators = [sep for sep in ",." if sep in text]
+    if len(separators) == 2:
+        decimal = "," if text.rfind(",") > text.rfind(".") else "."
+    elif separators:
+        sep = separators[0]
+        decimal = sep if text.count(sep) == 1 and len(text.rpartition(sep)[2]) != 3 else None
+    else:
+        decimal = None
+    integer, _, fraction = text.rpartition(decimal) if decimal else (text, "", "")
+    integer = re.sub(r"[.,]", "", integer)
+    try:
+        return float(f"{integer}.{fraction}" if fraction else integer)
+    except ValueError:
+        return None
+
+def parse_date(text: str, date_format: str) -> Optional[date]:
+    try:
+        return datetime.strptime(text, date_format).date()
+    except ValueError:
+        return None
+
+def close(value: float, expected: float) -> bool:
+    return abs(value - expected) <= max(0.05, AMOUNT_TOLERANCE * abs(expected))
+
+def values_in(text: str, kind: str, date_format: Optional[str] = None) -> List[Any]:
+    if kind == "amount":
+        return [amount for amount in (parse_amount(match.group()) for match in AMOUNT.finditer(text)) if amount is not None]
+    if kind == "date":
+        return [day for day in (parse_date(match.group(), date_format) for match in DATE.finditer(text)) if day]
+    return text.split()
+
+def line_words(line: Line) -> List[Word]:
+    return [word for cell in line for word in cell]
+
+def supplier_ices(lines: List[Line]) -> Set[str]:
+    return {ice for line in lines for cell in line for ice in ICE.findall(cell_text(cell).replace(" ", ""))}
+
+def layout_words(lines: List[Line]) -> Set[str]:
+    return {token for line in lines for cell in line for token in anchor_key(cell_text(cell)).split()}
+
+def layout_similarity(template: Dict[str, Any], lines: List[Line]) -> float:
+    """Share of the template's layout words found in the document."""
+    learned = set(template["layout"])
+    return len(learned & layout_words(lines)) / len(learned) if learned else 0.0
+
+
+# Scalar fields
+
+def _cells_with_key(lines: List[Line], key: str) -> List[Tuple[int, int]]:
+    return [
+        (line_index, cell_index)
+        for line_index, line in enumerate(lines)
+        for cell_index, cell in enumerate(line)
+        if anchor_key(cell_text(cell)) == key
+    ]
+
+def _overlapping_cell(line: Line, anchor: List[Word]) -> Optional[int]:
+    left, right = anchor[0][0], anchor[-1][1]
+    for cell_index, cell in enumerate(line):
+        if cell[0][0] < right and cell[-1][1] > left:
+            return cell_index
+    return None
+
+def _value_cell(lines: List[Line], rule: Dict[str, Any], line_index: int, cell_index: int) -> Optional[List[Word]]:
+    """The cell holding a field's value, given where its anchor was found."""
+    if rule["relation"] == "inline":
+        return lines[line_index][cell_index]
+    if rule["relation"] == "right":
+        line = lines[line_index]
+        return line[cell_index + 1] if cell_index + 1 < len(line) else None
+    if line_index + 1 < len(lines):
+        below = _overlapping_cell(lines[line_index + 1], lines[line_index][cell_index])
+        if below is not None:
+            return lines[line_index + 1][below]
+    return None
+
+def read_field(lines: List[Line], rule: Dict[str, Any]) -> Any:
+    anchors = _cells_with_key(lines, rule["anchor"])
+    if len(anchors) <= rule["occurrence"]:
+        return None
+    cell = _value_cell(lines, rule, *anchors[rule["occurrence"]])
+    if cell is None:
+        return None
+    values = values_in(cell_text(cell), rule["kind"], rule.get("date_format"))
+    if len(values) <= rule["index"]:
+        return None
+    value = values[rule["index"]]
+    return value if rule["kind"] != "text" else " ".join(values[rule["index"]:rule["index"] + rule["tokens"]])
+
+def _matches(values: List[Any], kind: str, expected: Any) -> List[int]:
+    if kind == "amount":
+        return [index for index, value in enumerate(values) if close(value, expected)]
+    if kind == "date":
+        return [index for index, value in enumerate(values) if value == expected]
+    tokens = str(expected).split()
+    return [index for index in range(len(values)) if values[index:index + len(tokens)] == tokens]
+
+def _same(kind: str, value: Any, expected: Any) -> bool:
+    if value is None:
+        return False
+    if kind == "amount":
+        return close(value, expected)
+    return value == (str(expected) if kind == "text" else expected)
+
+def learn_field(lines: List[Line], field: str, expected: Any) -> Optional[Dict[str, Any]]:
+    """An anchor rule that reads expected back from lines, or None when no printed label leads to it."""
+    kind = SCALAR_FIELDS[field]
+    date_formats = DATE_FORMATS if kind == "date" else (None,)
+    positions = [(line_index, cell_index) for line_index, line in enumerate(lines) for cell_index in range(len(line))]
+    if field in LAST_OCCURRENCE_FIELDS:
+        positions.reverse()
+
+    for line_index, cell_index in positions:
+        text = cell_text(lines[line_index][cell_index])
+        for date_format in date_formats:
+            indexes = _matches(values_in(text, kind, date_format), kind, expected)
+            if not indexes:
+                continue
+            candidates = []
+            if cell_index > 0:
+                candidates.append(("right", line_index, cell_index - 1))
+            candidates.append(("inline", line_index, cell_index))
+            if line_index > 0:
+                above = _overlapping_cell(lines[line_index - 1], lines[line_index][cell_index])
+                if above is not None:
+                    candidates.append(("below", line_index - 1, above))
+            for relation, anchor_line, anchor_cell in candidates:
+                key = anchor_key(cell_text(lines[anchor_line][anchor_cell]))
+                if not key:
+                    continue
+                rule = {
+                    "relation": relation,
+                    "anchor": key,
+                    "occurrence": _cells_with_key(lines, key).index((anchor_line, anchor_cell)),
+                    "kind": kind,
+                    "index": indexes[0],
+                    "tokens": len(str(expected).split()),
+                    "date_format": date_format,
+                }
+                if _same(kind, read_field(lines, rule), expected):
+                    return rule
+    return None
+
+
+# Line items
+
+def _amount_span(words: List[Word], expected: float, used: Set[int]) -> Optional[Tuple[int, int]]:
+    """Leftmost run of up to three words that reads as expected (thousands may be split: "1 550,00")."""
+    for start in range(len(words)):
+        for end in range(start + 1, min(start + 3, len(words)) + 1):
+            if used & set(range(start, end)):
+                break
+            amount = parse_amount(" ".join(word[2] for word in words[start:end]))
+            if amount is not None and close(amount, expected):
+                return start, end
+    return None
+
+def _text_span(words: List[Word], expected: str) -> Optional[Tuple[int, int]]:
+    tokens = expected.casefold().split()
+    texts = [word[2].casefold() for word in words]
+    for start in range(len(words) - len(tokens) + 1):
+        if tokens and texts[start:start + len(tokens)] == tokens:
+            return start, start + len(tokens)
+    return None
+
+def _find_item_row(lines: List[Line], item: ItemDetail, start: int) -> Optional[Dict[str, Any]]:
+    """The printed row of a confirmed item: word spans of its price and quantity, and where its texts are."""
+    for line_index in range(start, len(lines)):
+        words = line_words(lines[line_index])
+        price = _amount_span(words, item.unit_price or 0, set())
+        if not price:
+            continue
+        used = set(range(*price))
+        center = (words[price[0]][0] + words[price[1] - 1][1]) / 2
+        quantities = [
+            index for index, word in enumerate(words)
+            if index not in used and parse_amount(word[2]) == item.quantity
+        ]
+        if not quantities:
+            continue
+        quantity = min(quantities, key=lambda index: abs((words[index][0] + words[index][1]) / 2 - center))
+        row = {"line": line_index, "spans": {"unit_price": price, "quantity": (quantity, quantity + 1)}, "offsets": {}}
+        used.add(quantity)
+        for field in ITEM_TEXT_FIELDS:
+            expected = getattr(item, field)
+            if not expected:
+                continue
+            for offset in (0, -1, 1):
+                if not 0 <= line_index + offset < len(lines):
+                    continue
+                span = _text_span(line_words(lines[line_index + offset]), expected)
+                if span and not (offset == 0 and used & set(range(*span))):
+                    row["offsets"][field] = offset
+                    if offset == 0:
+                        row["spans"][field] = span
+                        used |= set(range(*span))
+                    break
+        row["other"] = [index for index in range(len(words)) if index not in used]
+        return row
+    return None
+
+def learn_items(lines: List[Line], items: List[ItemDetail]) -> Dict[str, Any]:
+    """
+    Columns of the item table (x ranges of each field on the price row, texts on
+    the line above or below when printed there) and the lines around the table.
+    """
+    if not items:
+        raise TemplateError("The confirmed invoice has no line items")
+    rows, start = [], 0
+    for item in items:
+        row = _find_item_row(lines, item, start)
+        if row is None:
+            raise TemplateError(f"Line item not found in the text layer: {item.description or item.code}")
+        rows.append(row)
+        start = row["line"] + 1
+
+    first = rows[0]
+    words = line_words(lines[first["line"]])
+    columns = []
+    for field, (begin, end) in first["spans"].items():
+        columns.append({"field": field, "x0": words[begin][0], "x1": words[end - 1][1]})
+    for index in first["other"]:
+        columns.append({"field": None, "x0": words[index][0], "x1": words[index][1]})
+    columns.sort(key=lambda column: column["x0"])
+    # Unmatched neighbouring words (row numbers, units, line totals) are one column
+    merged = []
+    for column in columns:
+        if merged and column["field"] is None and merged[-1]["field"] is None:
+            merged[-1]["x1"] = column["x1"]
+        else:
+            merged.append(column)
+
+    offsets = first["offsets"]
+    top = first["line"] + min([0, *offsets.values()])
+    bottom = rows[-1]["line"] + max([0, *offsets.values()])
+    if top == 0:
+        raise TemplateError("No printed line above the item table")
+    return {
+        "header": anchor_key(" ".join(cell_text(cell) for cell in lines[top - 1])),
+        "end": anchor_key(" ".join(cell_text(cell) for cell in lines[bottom + 1])) if bottom + 1 < len(lines) else None,
+        "columns": merged,
+        "offsets": {field: offset for field, offset in offsets.items() if offset != 0},
+    }
+
+def _column_of(columns: List[Dict[str, Any]], word: Word) -> Optional[str]:
+    center = (word[0] + word[1]) / 2
+    for index, column in enumerate(columns):
+        left = (columns[index - 1]["x1"] + column["x0"]) / 2 if index else float("-inf")
+        right = (column["x1"] + columns[index + 1]["x0"]) / 2 if index + 1 < len(columns) else float("inf")
+        if left <= center < right:
+            return column["field"]
+    return None
+
+def read_items(lines: List[Line], rule: Dict[str, Any]) -> List[ItemDetail]:
+    keys = [anchor_key(" ".join(cell_text(cell) for cell in line)) for line in lines]
+    if rule["header"] not in keys:
+        return []
+    start = keys.index(rule["header"]) + 1
+    end = keys.index(rule["end"], start) if rule["end"] in keys[start:] else len(lines)
+
+    items = []
+    for line_index in range(start, end):
+        values: Dict[str, List[str]] = {}
+        for word in line_words(lines[line_index]):
+            field = _column_of(rule["columns"], word)
+            if field:
+                values.setdefault(field, []).append(word[2])
+        unit_price = parse_amount(" ".join(values.get("unit_price", [])))
+        quantity = parse_amount(" ".join(values.get("quantity", [])))
+        if unit_price is None or quantity is None:
+            continue
+        item = {"unit_price": unit_price, "quantity": int(round(quantity))}
+        for field in ITEM_TEXT_FIELDS:
+            offset = rule["offsets"].get(field)
+            if offset is None:
+                item[field] = " ".join(values.get(field, []))
+            elif start <= line_index + offset < end:
+                item[field] = " ".join(cell_text(cell) for cell in lines[line_index + offset])
+        items.append(ItemDetail(**item))
+    return items
+
+
+# Templates
+
+def validate_invoice(invoice: Invoice) -> List[str]:
+    """Consistency checks a template parse must pass, or the model is asked instead."""
+    errors = [f"no {field.replace('_', ' ')}" for field in REQUIRED_FIELDS if not getattr(invoice, field)]
+    if not invoice.items:
+        errors.append("no line items")
+    ht, vat, ttc = invoice.total_amount_ht, invoice.total_vat_amount, invoice.total_amount_ttc
+    if ht is None and ttc is None:
+        errors.append("no total")
+    if ht is not None and invoice.items:
+        items_total = sum((item.unit_price or 0) * (item.quantity or 0) for item in invoice.items)
+        if not close(items_total, ht):
+            errors.append(f"items sum to {items_total:.2f}, total HT is {ht:.2f}")
+    if ht is not None and vat is not None and ttc is not None and not close(ht + vat, ttc):
+        errors.append(f"total HT {ht:.2f} + VAT {vat:.2f} is not total TTC {ttc:.2f}")
+    return errors
+
+def parse_with_template(template: Dict[str, Any], lines: List[Line]) -> Tuple[Invoice, List[str]]:
+    values = dict(template["constants"])
+    for field, rule in template["fields"].items():
+        values[field] = read_field(lines, rule)
+    values["items"] = read_items(lines, template["items"])
+    invoice = Invoice(**{field: value for field, value in values.items() if value is not None})
+    return invoice, validate_invoice(invoice)
+
+def learn_template(lines: List[Line], invoice: Invoice) -> Dict[str, Any]:
+    """Learn a template from the text layer and the confirmed data of one invoice."""
+    if not invoice.ice or invoice.ice not in supplier_ices(lines):
+        raise TemplateError("The supplier ICE was not found in the text layer")
+    errors = validate_invoice(invoice)
+    if errors:
+        raise TemplateError(f"The confirmed invoice is inconsistent: {'; '.join(errors)}")
+
+    items = learn_items(lines, invoice.items)
+    keys = [anchor_key(" ".join(cell_text(cell) for cell in line)) for line in lines]
+    template = {
+        "layout": sorted(layout_words(lines[:keys.index(items["header"])])),
+        "constants": {field: getattr(invoice, field) for field in CONSTANT_FIELDS},
+        "fields": {},
+        "items": items,
+    }
+    for field in SCALAR_FIELDS:
+        expected = getattr(invoice, field)
+        if expected in (None, ""):
+            continue
+        rule = learn_field(lines, field, expected)
+        if rule:
+            template["fields"][field] = rule
+        elif field in REQUIRED_FIELDS or field in LAST_OCCURRENCE_FIELDS:
+            raise TemplateError(f"No printed label leads to {field.replace('_', ' ')}")
+
+    # The template must read the confirmed invoice back
+    parsed, errors = parse_with_template(template, lines)
+    if errors or len(parsed.items) != len(invoice.items):
+        raise TemplateError(f"The learned template does not read this invoice back: {'; '.join(errors) or 'item count differs'}")
+    return template
@@ -0,0 +1,67 @@
+# app/api/routes/tools/openai_clients.py
+
+# OpenAI clients are reused instead of being built per call: every client shares one
+# keep-alive HTTP/2 connection pool (httpx[http2]), so extractions
+# and chatbot calls skip the TCP and TLS setup. Clients are kept per API key and
+# dropped once unused for OPENAI_CLIENT_IDLE_SECONDS.
+
+import hashlib
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+import instructor
+from openai import DefaultHttpxClient, OpenAI
+
+from app.core.config import settings
+
+_http_client: Optional[httpx.Client] = None
+_http_client_lock = threading.Lock()
+
+def http_client() -> httpx.Client:
+    """The connection pool shared by every OpenAI client of this process."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = DefaultHttpxClient(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    keepalive_expiry=settings.OPENAI_KEEPALIVE_SECONDS,
+                ),
+            )
+        return _http_client
+
+
+class ClientRegistry:
+    """Instructor-wrapped OpenAI clients by API key, evicted when idle."""
+
+    def __init__(self, idle_seconds: float) -> None:
+        self.idle_seconds = idle_seconds
+        # sha256 of the key -> (client, last use)
+        self._clients: Dict[str, Tuple[instructor.Instructor, float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str) -> instructor.Instructor:
+        key = hashlib.sha256(api_key.encode()).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            client = entry[0] if entry else instructor.from_openai(OpenAI(api_key=api_key, http_client=http_client()))
+            self._clients[key] = (client, now)
+            return client
+
+    def _evict_idle(self, now: float) -> None:
+        # The clients share the connection pool, so dropping them closes nothing
+        for key in [key for key, (_, last_used) in self._clients.items() if now - last_used > self.idle_seconds]:
+            del self._clients[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._clients)
+
+
+openai_clients = ClientRegistry(settings.OPENAI_CLIENT_IDLE_SECONDS)
@@ -0,0 +1,224 @@
+# app/api/routes/tools/report_export.py
+
+import csv
+import os
+import tempfile
+from datetime import date
+from enum import Enum
+from io import StringIO
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple
+
+import xlsxwriter
+from sqlmodel import Session, select
+
+from app.core.db import engine
+from app.crud import reporting as reporting_crud
+from app.models import (
+    LedgerPartyType,
+    PaymentFromCustomer,
+    PaymentToSupplier,
+    InternalInvoice,
+    ExternalInvoice,
+    Project,
+    Customer,
+    Supplier
+)
+
+# Rows are pulled from a server-side cursor this many at a time
+YIELD_PER = 1000
+# CSV output is flushed to the client in chunks of roughly this size
+CSV_CHUNK_SIZE = 64 * 1024
+FILE_CHUNK_SIZE = 256 * 1024
+
+
+class Sheet(NamedTuple):
+    name: str
+    columns: List[str]
+    rows: Iterable[tuple]
+
+
+def stream_rows(session: Session, statement) -> Iterator[tuple]:
+    result = session.execute(statement.execution_options(yield_per=YIELD_PER))
+    for row in result:
+        yield tuple(row)
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+def summary_sheets(session: Session, start_date: date, end_date: date) -> List[Sheet]:
+    report_data = reporting_crud.get_report_data_db(session, start_date, end_date)
+    return [
+        Sheet(
+            "Summary",
+            ["Total Income", "Total Expenses", "Net Profit", "Total Receivables", "Total Payables"],
+            [(report_data.total_income, report_data.total_expenses, report_data.net_profit,
+              report_data.total_receivables, report_data.total_payables)],
+        ),
+        Sheet(
+            "Project Data",
+            ["project_name", "income", "expenses", "profit"],
+            [(p.project_name, p.income, p.expenses, p.profit) for p in report_data.project_data],
+        ),
+        Sheet("Top Customers", ["Customer", "Total Payment"], [(c.name, c.total_payment) for c in report_data.top_customers]),
+        Sheet("Top Suppliers", ["Supplier", "Total Payment"], [(s.name, s.total_payment) for s in report_data.top_suppliers]),
+    ]
+
+def detail_sheets(session: Session, start_date: date, end_date: date) -> List[Sheet]:
+    """Line-level sheets: every payment and invoice in range, streamed from the database."""
+    payments_from_customers = (
+        select(
+            PaymentFromCustomer.disbursement_date, PaymentFromCustomer.payment_ref, Customer.name, Project.name,
+            InternalInvoice.reference, PaymentFromCustomer.payment_status, PaymentFromCustomer.payment_mode,
+            PaymentFromCustomer.amount, PaymentFromCustomer.additional_fees, InternalInvoice.currency_type,
+        )
+        .join(InternalInvoice, InternalInvoice.id == PaymentFromCustomer.internal_invoice_id)
+        .join(Customer, Customer.id == PaymentFromCustomer.customer_id)
+        .join(Project, Project.id == PaymentFromCustomer.project_id)
+        .where(PaymentFromCustomer.disbursement_date.between(start_date, end_date))
+        .order_by(PaymentFromCustomer.disbursement_date, PaymentFromCustomer.id)
+    )
+    payments_to_suppliers = (
+        select(
+            PaymentToSupplier.disbursement_date, PaymentToSupplier.payment_ref, Supplier.name, Project.name,
+            ExternalInvoice.reference, PaymentToSupplier.payment_status, PaymentToSupplier.payment_mode,
+            PaymentToSupplier.amount, PaymentToSupplier.additional_fees, ExternalInvoice.currency_type,
+        )
+        .join(ExternalInvoice, ExternalInvoice.id == PaymentToSupplier.external_invoice_id)
+        .join(Supplier, Supplier.id == PaymentToSupplier.supplier_id)
+        .join(Project, Project.id == PaymentToSupplier.project_id)
+        .where(PaymentToSupplier.disbursement_date.between(start_date, end_date))
+        .order_by(PaymentToSupplier.disbursement_date, PaymentToSupplier.id)
+    )
+    internal_invoices = (
+        select(
+            InternalInvoice.invoice_date, InternalInvoice.due_date, InternalInvoice.reference, Customer.name, Project.name,
+            InternalInvoice.amount_ht, InternalInvoice.vat, InternalInvoice.amount_ttc, InternalInvoice.currency_type,
+        )
+        .join(Customer, Customer.id == InternalInvoice.customer_id)
+        .join(Project, Project.id == InternalInvoice.project_id)
+        .where(InternalInvoice.invoice_date.between(start_date, end_date))
+        .order_by(InternalInvoice.invoice_date, InternalInvoice.id)
+    )
+    external_invoices = (
+        select(
+            ExternalInvoice.invoice_date, ExternalInvoice.due_date, ExternalInvoice.reference, Supplier.name, Project.name,
+            ExternalInvoice.amount_ht, ExternalInvoice.vat, ExternalInvoice.amount_ttc, ExternalInvoice.currency_type,
+        )
+        .join(Supplier, Supplier.id == ExternalInvoice.supplier_id)
+        .join(Project, Project.id == ExternalInvoice.project_id)
+        .where(ExternalInvoice.invoice_date.between(start_date, end_date))
+        .order_by(ExternalInvoice.invoice_date, ExternalInvoice.id)
+    )
+
+    payment_columns = ["Date", "Reference", "{party}", "Project", "Invoice", "Status", "Mode", "Amount", "Additional Fees", "Currency"]
+    invoice_columns = ["Invoice Date", "Due Date", "Reference", "{party}", "Project", "Amount HT", "VAT", "Amount TTC", "Currency"]
+    return [
+        Sheet("Payments From Customers", [c.format(party="Customer") for c in payment_columns], stream_rows(session, payments_from_customers)),
+        Sheet("Payments To Suppliers", [c.format(party="Supplier") for c in payment_columns], stream_rows(session, payments_to_suppliers)),
+        Sheet("Internal Invoices", [c.format(party="Customer") for c in invoice_columns], stream_rows(session, internal_invoices)),
+        Sheet("External Invoices", [c.format(party="Supplier") for c in invoice_columns], stream_rows(session, external_invoices)),
+    ]
+
+def export_sheets(session: Session, start_date: date, end_date: date) -> List[Sheet]:
+    # Detail rows are lazy, so only the (small) summary is computed up front
+    return summary_sheets(session, start_date, end_date) + detail_sheets(session, start_date, end_date)
+
+
+# CSV: every sheet becomes a titled section, written and flushed in chunks
+def write_csv(sheets: Iterable[Sheet]) -> Iterator[bytes]:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> bytes:
+        chunk = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    for sheet in sheets:
+        buffer.write(f"{sheet.name}\n")
+        writer.writerow(sheet.columns)
+        for row in sheet.rows:
+            writer.writerow([_cell(value) for value in row])
+            if buffer.tell() >= CSV_CHUNK_SIZE:
+                yield flush()
+        buffer.write("\n\n")
+    yield flush()
+
+def stream_csv_report(start_date: date, end_date: date) -> Iterator[bytes]:
+    # The request session is closed before the body is streamed, so the export owns its own
+    with Session(engine) as session:
+        yield from write_csv(export_sheets(session, start_date, end_date))
+
+
+def stream_aging_csv(party_type: LedgerPartyType, as_of: date) -> Iterator[bytes]:
+    columns = ["ID", "Name", "Currency", "Invoices", "Current", "1-30", "31-60", "61-90", "90+", "Total"]
+    with Session(engine) as session:
+        rows = stream_rows(session, reporting_crud.aging_statement(party_type, as_of))
+        yield from write_csv([Sheet(f"Aging ({party_type.value}s) as of {as_of}", columns, rows)])
+
+
+# XLSX: constant_memory keeps only the current row in memory; the zip container can only
+# be produced once the workbook is closed, so it is spooled to disk and streamed from there
+def write_xlsx(sheets: Iterable[Sheet], path: str) -> None:
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd"})
+    try:
+        for sheet in sheets:
+            worksheet = workbook.add_worksheet(sheet.name)
+            worksheet.write_row(0, 0, sheet.columns)
+            for row_index, row in enumerate(sheet.rows, start=1):
+                for col_index, value in enumerate(row):
+                    if isinstance(value, date):
+                        worksheet.write_datetime(row_index, col_index, value, date_format)
+                    else:
+                        worksheet.write(row_index, col_index, _cell(value))
+    finally:
+        workbook.close()
+
+def stream_file(path: str, remove: bool = False) -> Iterator[bytes]:
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(FILE_CHUNK_SIZE):
+                yield chunk
+    finally:
+        if remove:
+            os.remove(path)
+
+def stream_xlsx_report(start_date: date, end_date: date) -> Iterator[bytes]:
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        with Session(engine) as session:
+            write_xlsx(export_sheets(session, start_date, end_date), path)
+    except BaseException:
+        os.remove(path)
+        raise
+    yield from stream_file(path, remove=True)
+
+
+def write_report_file(
+    start_date: date,
+    end_date: date,
+    output_format: str,
+    path: str,
+    on_progress: Callable[[float, str], None] | None = None
+) -> None:
+    """Write the export to path, reporting progress as each sheet is started."""
+    with Session(engine) as session:
+        sheets = export_sheets(session, start_date, end_date)
+
+        def tracked() -> Iterator[Sheet]:
+            for index, sheet in enumerate(sheets):
+                if on_progress:
+                    on_progress(index / len(sheets), f"Writing {sheet.name}")
+                yield sheet
+
+        if output_format == "xlsx":
+            write_xlsx(tracked(), path)
+        else:
+            with open(path, "wb") as f:
+                for chunk in write_csv(tracked()):
+                    f.write(chunk)
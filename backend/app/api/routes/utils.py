@@ -1,9 +1,11 @@
 # app/api/routeS/utils.py
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic.networks import EmailStr
 from pydantic import BaseModel
 
 from app.api.deps import get_current_active_superuser, get_current_user, TokenDep
+from app.core.metrics import metrics
 from app.models import Message, User
 from app.utils import generate_test_email, send_email
 from app.api.routes.tools.gpt_chatbot_planner import process_query as process_query_planner
@@ -31,6 +33,18 @@ def test_email(email_to: EmailStr) -> Message:
     )
     return Message(message="Test email sent")
 
+@router.get(
+    "/metrics",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_class=PlainTextResponse,
+)
+def read_metrics() -> str:
+    """
+    Counters, timings and histograms of this worker (extraction stages, tokens and
+    cost, cache hits, ...) in the Prometheus text format.
+    """
+    return metrics.prometheus()
+
 @router.post("/chatbot_planner")
 def chatbot_planner(
     token: TokenDep,
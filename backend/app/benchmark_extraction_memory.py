@@ -0,0 +1,80 @@
+import argparse
+import logging
+import mimetypes
+import os
+import resource
+import time
+from contextlib import ExitStack
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.api.routes.tools import gpt_process
+from app.api.routes.tools.extraction_backends import SyntheticBackend, set_extraction_backend
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def peak_rss_mb(who: int) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024  # KiB on Linux
+
+
+def init(paths: list[str], batch_size: int, latency: float) -> None:
+    """
+    Run one batch through the upload pipeline with the synthetic extraction backend
+    and without the extraction cache, so only spooling, rendering and encoding are measured.
+    """
+    set_extraction_backend(SyntheticBackend(latency))
+    gpt_process.load_env = lambda user_id: "benchmark"
+    gpt_process.cache_extraction = lambda *args, **kwargs: None
+    # The whole batch is one synchronous upload, however large
+    gpt_process.extraction_queue = gpt_process.ExtractionQueue(batch_size, batch_size)
+
+    with ExitStack() as stack:
+        files = []
+        for index in range(batch_size):
+            path = paths[index % len(paths)]
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            files.append(UploadFile(
+                file=stack.enter_context(open(path, "rb")),
+                filename=os.path.basename(path),
+                headers=Headers({"content-type": content_type}),
+            ))
+        baseline = current_rss_mb()
+        start = time.perf_counter()
+        results = gpt_process.pipeline(files, user_id=0, force_refresh=True)
+        elapsed = time.perf_counter() - start
+
+    gpt_process.render_pool().shutdown()
+    errors = [result for result in results if result["error"]]
+    logger.info(f"{len(results)} files in {elapsed:.1f}s, {len(errors)} failed")
+    stages: dict[str, float] = {}
+    for result in results:
+        for stage, seconds in (result["timings"] or {}).items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+    logger.info("Seconds per stage, summed over the files: " + ", ".join(f"{stage} {seconds:.2f}" for stage, seconds in stages.items()))
+    logger.info(f"Files left in the extraction queue: {gpt_process.extraction_queue.depth()}")
+    logger.info(f"RSS before the batch: {baseline:.0f} MB")
+    logger.info(f"Peak RSS of the API process: {peak_rss_mb(resource.RUSAGE_SELF):.0f} MB")
+    logger.info(f"Peak RSS of a render worker: {peak_rss_mb(resource.RUSAGE_CHILDREN):.0f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure peak memory while extracting a batch of invoice uploads")
+    parser.add_argument("paths", nargs="+", help="PDF or image invoices, repeated to fill the batch")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per synthetic model call")
+    args = parser.parse_args()
+
+    logger.info(f"Extracting a batch of {args.batch_size} uploads")
+    init(args.paths, args.batch_size, args.latency)
+
+
+if __name__ == "__main__":
+    main()
@@ -96,6 +96,79 @@ class Settings(BaseSettings):
     FIRST_SUPERUSER_PASSWORD: str
     USERS_OPEN_REGISTRATION: bool = False
 
+    # Reporting
+    REPORT_CACHE_MAX_ENTRIES: int = 64
+    # Connections used to run one report's aggregates side by side, in a pool of their
+    # own (shared by all requests)
+    REPORT_QUERY_WORKERS: int = 4
+    REPORT_JOBS_MAX_WORKERS: int = 2
+    REPORT_JOBS_MAX_PENDING: int = 20
+    REPORT_JOBS_RETENTION_HOURS: int = 24
+
+    # The company's own ICE, printed on its invoices next to the counterparty's; set per
+    # deployment. Empty: extracted ICEs are all taken as the counterparty's.
+    COMPANY_ICE: str = ""
+
+    # Invoice extraction: files in flight across all users / for one user,
+    # and worker processes rendering PDFs and images
+    EXTRACTION_MAX_CONCURRENCY: int = 8
+    EXTRACTION_MAX_CONCURRENCY_PER_USER: int = 3
+    EXTRACTION_RENDER_WORKERS: int = 2
+    # Render workers run at this niceness, so request handling gets the CPU first
+    EXTRACTION_RENDER_NICE: int = 10
+    # Files waiting or in flight (jobs included) past which synchronous uploads are
+    # refused: 503, or 429 past one user's share. Each synchronous upload holds one of
+    # the server's 40 request threads until it is processed, so keep this below 40.
+    # A batch larger than the per-user limit is refused (413) and must be sent as a
+    # job; job files are counted too, waiting for room one at a time.
+    EXTRACTION_MAX_QUEUED_FILES: int = 32
+    EXTRACTION_MAX_QUEUED_FILES_PER_USER: int = 12
+    # Longer PDFs are cut off; relevant pages go to the model this many at a time
+    EXTRACTION_MAX_PAGES: int = 20
+    EXTRACTION_PAGES_PER_CALL: int = 4
+    # Uploads are spooled to disk and rejected (413) past this size
+    EXTRACTION_MAX_UPLOAD_BYTES: int = 20 * 1024 * 1024
+    # Where extractions come from: the OpenAI API, responses recorded in
+    # EXTRACTION_REPLAY_DIR, or generated invoices (offline benchmarks and CI)
+    EXTRACTION_BACKEND: Literal["openai", "replay", "synthetic"] = "openai"
+    EXTRACTION_REPLAY_DIR: str = "/tmp/accounting-ai/replay"
+    # Replay misses are sent to OpenAI and their response recorded
+    EXTRACTION_REPLAY_RECORD: bool = False
+    EXTRACTION_SYNTHETIC_LATENCY_SECONDS: float = 1.0
+    EXTRACTION_SYNTHETIC_FAILURE_RATE: float = 0.0
+    # Model prices (USD per million tokens) for the extraction cost estimates
+    EXTRACTION_PROMPT_PRICE_PER_MILLION: float = 2.5
+    EXTRACTION_COMPLETION_PRICE_PER_MILLION: float = 10.0
+    # Extracted data is reused for identical uploads until it expires or is evicted
+    EXTRACTION_CACHE_TTL_DAYS: int = 90
+    EXTRACTION_CACHE_MAX_ENTRIES: int = 10000
+    # Expired and least recently used entries are evicted once every this many stores
+    EXTRACTION_CACHE_EVICT_EVERY: int = 100
+    # Upload batches processed in the background (results are polled or streamed)
+    EXTRACTION_JOBS_MAX_WORKERS: int = 4
+    EXTRACTION_JOBS_MAX_PENDING: int = 20
+    EXTRACTION_JOBS_RETENTION_HOURS: int = 24
+
+    # Connections to the OpenAI API are pooled and kept alive across calls and users;
+    # each API key's client is dropped after being unused this long
+    OPENAI_MAX_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_SECONDS: float = 60
+    OPENAI_CLIENT_IDLE_SECONDS: int = 900
+
+    # Supplier/customer lookup index kept in memory by each worker; reloaded from the
+    # database after this long, to pick up writes made by other workers
+    COUNTERPARTY_INDEX_REFRESH_SECONDS: int = 300
+
+    # Background job state and artifacts (shared by all workers on this host)
+    JOBS_STORAGE_DIR: str = "/tmp/accounting-ai/jobs"
+    # Processed invoice uploads, by content hash (served by /documents)
+    DOCUMENTS_STORAGE_DIR: str = "/tmp/accounting-ai/documents"
+    # Documents not uploaded again for this long are removed, then the oldest past the
+    # size limit; checked at most once per interval, when a document is stored
+    DOCUMENTS_RETENTION_DAYS: int = 365
+    DOCUMENTS_MAX_BYTES: int = 10 * 1024 ** 3
+    DOCUMENTS_CLEANUP_INTERVAL_SECONDS: int = 3600
+
     def _check_default_secret(self, var_name: str, value: str | None) -> None:
         if value == "youness":
             message = (
@@ -0,0 +1,206 @@
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from collections.abc import Iterable
+from itertools import islice
+from typing import NamedTuple
+
+# Legal forms and filler words that say nothing about which company it is
+STOP_WORDS = {
+    "sarl", "sarlau", "sa", "sas", "sasu", "snc", "ste", "societe", "ets",
+    "etablissements", "group", "groupe", "co", "company", "ltd", "inc", "au",
+    "de", "des", "du", "la", "le", "les", "et", "of", "the",
+}
+# A name is only scored against a few counterparties (CANDIDATE_BUDGET): those sharing
+# its rarest words, or when none does, those sharing the most of its trigrams found
+# in at most SCAN_BUDGET names, so a common word never scans the whole index
+CANDIDATE_BUDGET = 64
+SCAN_BUDGET = 1000
+MIN_SCORE = 0.3
+POSTAL_CODE_BONUS = 0.05
+
+
+class Counterparty(NamedTuple):
+    id: int
+    name: str
+    ice: str | None
+    postal_code: str | None
+
+
+class Candidate(NamedTuple):
+    id: int
+    name: str
+    ice: str | None
+    postal_code: str | None
+    score: float
+    match: str  # "ice" or "name"
+
+
+def normalize_name(name: str | None) -> str:
+    """Lower-case ASCII words without punctuation, legal forms or filler words."""
+    text = unicodedata.normalize("NFKD", name or "").encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"[^a-z0-9 ]", " ", text.replace(".", ""))
+    return " ".join(word for word in text.split() if word not in STOP_WORDS)
+
+
+def normalize_ice(ice: str | None) -> str | None:
+    digits = re.sub(r"\D", "", ice or "")
+    return digits or None
+
+
+def trigrams(normalized: str) -> frozenset[str]:
+    if not normalized:
+        return frozenset()
+    padded = f"  {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _unpost(postings: dict[str, set[int]], key: str, counterparty_id: int) -> None:
+    ids = postings.get(key)
+    if ids is not None:
+        ids.discard(counterparty_id)
+        if not ids:
+            del postings[key]
+
+
+class CounterpartyIndex:
+    """
+    In-memory lookup of suppliers or customers by extracted name and ICE: an exact
+    ICE map, plus an inverted index of name trigrams scored by Dice similarity.
+    Thread-safe; rebuilt with begin_replace()/replace() and kept current with
+    upsert()/remove(), including while a rebuild is reading the table.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[int, tuple[Counterparty, frozenset[str]]] = {}
+        self._by_ice: dict[str, set[int]] = {}
+        self._by_word: dict[str, set[int]] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._lock = threading.Lock()
+        # Writes made since begin_replace(), replayed over the rebuilt index
+        self._writes: dict[int, Counterparty | None] | None = None
+        self.built_at: float | None = None
+        # Held while (re)loading from the database, so only one thread does it
+        self.build_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_stale(self, max_age_seconds: float) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > max_age_seconds
+
+    def _add(self, counterparty: Counterparty) -> None:
+        normalized = normalize_name(counterparty.name)
+        grams = trigrams(normalized)
+        self._entries[counterparty.id] = (counterparty, grams)
+        ice = normalize_ice(counterparty.ice)
+        if ice:
+            self._by_ice.setdefault(ice, set()).add(counterparty.id)
+        for word in normalized.split():
+            self._by_word.setdefault(word, set()).add(counterparty.id)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(counterparty.id)
+
+    def _discard(self, counterparty_id: int) -> None:
+        entry = self._entries.pop(counterparty_id, None)
+        if entry is None:
+            return
+        counterparty, grams = entry
+        ice = normalize_ice(counterparty.ice)
+        if ice:
+            _unpost(self._by_ice, ice, counterparty_id)
+        for word in normalize_name(counterparty.name).split():
+            _unpost(self._by_word, word, counterparty_id)
+        for gram in grams:
+            _unpost(self._postings, gram, counterparty_id)
+
+    def begin_replace(self) -> None:
+        """Call before reading the snapshot given to replace(), so no write made meanwhile is lost."""
+        with self._lock:
+            self._writes = {}
+
+    def replace(self, counterparties: Iterable[Counterparty]) -> None:
+        fresh = CounterpartyIndex()
+        for counterparty in counterparties:
+            fresh._add(counterparty)
+        with self._lock:
+            for counterparty_id, counterparty in (self._writes or {}).items():
+                fresh._discard(counterparty_id)
+                if counterparty is not None:
+                    fresh._add(counterparty)
+            self._writes = None
+            self._entries, self._by_ice, self._by_word, self._postings = (
+                fresh._entries, fresh._by_ice, fresh._by_word, fresh._postings
+            )
+            self.built_at = time.monotonic()
+
+    def upsert(self, counterparty: Counterparty) -> None:
+        with self._lock:
+            self._discard(counterparty.id)
+            self._add(counterparty)
+            if self._writes is not None:
+                self._writes[counterparty.id] = counterparty
+
+    def remove(self, counterparty_id: int) -> None:
+        with self._lock:
+            self._discard(counterparty_id)
+            if self._writes is not None:
+                self._writes[counterparty_id] = None
+
+    def _name_candidates(self, normalized: str, grams: frozenset[str]) -> Iterable[int]:
+        # The counterparties sharing one of the name's distinctive words...
+        candidates: set[int] = set()
+        for ids in sorted((self._by_word[word] for word in normalized.split() if word in self._by_word), key=len):
+            if len(candidates) + len(ids) > CANDIDATE_BUDGET:
+                break
+            candidates |= ids
+        if candidates:
+            return candidates
+
+        # ...else (a misread name) those sharing the most of its less common trigrams
+        postings = sorted((self._postings[gram] for gram in grams if gram in self._postings), key=len)
+        shared: Counter[int] = Counter()
+        for ids in postings:
+            if len(ids) > SCAN_BUDGET:
+                break
+            shared.update(ids)
+        if not shared:
+            return ()
+        floor, kept = 0, 0
+        for floor, number in sorted(Counter(shared.values()).items(), reverse=True):
+            kept += number
+            if kept >= CANDIDATE_BUDGET:
+                break
+        return islice((counterparty_id for counterparty_id, count in shared.items() if count >= floor), CANDIDATE_BUDGET)
+
+    def resolve(
+        self,
+        name: str | None = None,
+        ice: str | None = None,
+        postal_code: str | None = None,
+        limit: int = 5,
+    ) -> list[Candidate]:
+        """Best matches first: an ICE match scores 1, a name match the Dice similarity of the trigrams."""
+        normalized = normalize_name(name)
+        grams = trigrams(normalized)
+        scored: list[tuple[float, int, str]] = []
+        with self._lock:
+            ice_matches = self._by_ice.get(normalize_ice(ice) or "", set())
+            scored.extend((1.0, counterparty_id, "ice") for counterparty_id in ice_matches)
+            for counterparty_id in self._name_candidates(normalized, grams):
+                if counterparty_id in ice_matches:
+                    continue
+                counterparty, entry_grams = self._entries[counterparty_id]
+                score = 2 * len(grams & entry_grams) / (len(grams) + len(entry_grams))
+                if postal_code and counterparty.postal_code == postal_code:
+                    score = min(score + POSTAL_CODE_BONUS, 0.99)
+                if score >= MIN_SCORE:
+                    scored.append((score, counterparty_id, "name"))
+            best = heapq.nlargest(limit, scored, key=lambda item: (item[0], -item[1]))
+            return [
+                Candidate(*self._entries[counterparty_id][0], score=round(score, 3), match=match)
+                for score, counterparty_id, match in best
+            ]
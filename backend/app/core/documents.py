@@ -0,0 +1,157 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import timedelta
+from typing import Any
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_ID = re.compile(r"[0-9a-f]{64}")
+
+
+class DocumentStore:
+    """
+    Processed uploads kept on local disk under their sha256, so a document that is
+    uploaded again is stored once and its URL never changes content.
+
+    <root>/<id[:2]>/<id> holds the file, <id>.json its content type, size and the
+    users who uploaded it, and <id>.thumb.jpg a small preview of its first page.
+    Documents not uploaded again within the retention period are removed, then the
+    least recently uploaded ones past max_bytes; at most once per cleanup interval,
+    when a document is stored.
+    """
+
+    def __init__(self, root: str, retention_days: int, max_bytes: int, cleanup_interval_seconds: float) -> None:
+        self.root = root
+        self.retention = timedelta(days=retention_days)
+        self.max_bytes = max_bytes
+        self.cleanup_interval = cleanup_interval_seconds
+        self._cleaned_at: float | None = None
+        self._lock = threading.Lock()
+
+    def path(self, document_id: str) -> str:
+        return os.path.join(self.root, document_id[:2], document_id)
+
+    def thumbnail_path(self, document_id: str) -> str:
+        return f"{self.path(document_id)}.thumb.jpg"
+
+    def _write(self, path: str, write: Any) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def get(self, document_id: str) -> dict[str, Any] | None:
+        if not DOCUMENT_ID.fullmatch(document_id):
+            return None
+        try:
+            with open(f"{self.path(document_id)}.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def is_owner(self, document: dict[str, Any], user_id: int) -> bool:
+        return user_id in document.get("owner_ids", [])
+
+    def put(self, document_id: str, source_path: str, content_type: str, owner_id: int) -> None:
+        """
+        Store the file at source_path, unless a document with this id is already
+        stored; either way owner_id may read it from now on.
+        """
+        with self._lock:
+            record = self.get(document_id)
+            if record is None:
+                def copy(f: Any) -> None:
+                    with open(source_path, "rb") as source:
+                        shutil.copyfileobj(source, f)
+
+                self._write(self.path(document_id), copy)
+                record = {"content_type": content_type, "size": os.path.getsize(self.path(document_id)), "owner_ids": []}
+            owner_ids = record.setdefault("owner_ids", [])
+            if owner_id not in owner_ids:
+                owner_ids.append(owner_id)
+            # Rewritten on every upload: its modification time is the document's last use
+            self._write(f"{self.path(document_id)}.json", lambda f: f.write(json.dumps(record).encode()))
+            cleanup = self._cleanup_due()
+        if cleanup:
+            self.cleanup()
+
+    def get_thumbnail(self, document_id: str) -> bytes | None:
+        if not DOCUMENT_ID.fullmatch(document_id):
+            return None
+        try:
+            with open(self.thumbnail_path(document_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put_thumbnail(self, document_id: str, jpeg: bytes) -> None:
+        self._write(self.thumbnail_path(document_id), lambda f: f.write(jpeg))
+
+    def remove(self, document_id: str) -> None:
+        for path in (f"{self.path(document_id)}.json", self.path(document_id), self.thumbnail_path(document_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _cleanup_due(self) -> bool:
+        now = time.monotonic()
+        if self._cleaned_at is not None and now - self._cleaned_at < self.cleanup_interval:
+            return False
+        self._cleaned_at = now
+        return True
+
+    def cleanup(self) -> None:
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root, exist_ok=True)
+            return
+        cutoff = time.time() - self.retention.total_seconds()
+        stored = []  # (last upload, size on disk, id)
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if not (name.endswith(".json") and DOCUMENT_ID.fullmatch(name[:-5])):
+                    continue
+                document_id = name[:-5]
+                try:
+                    used_at = os.path.getmtime(os.path.join(directory, name))
+                    size = sum(
+                        os.path.getsize(path)
+                        for path in (self.path(document_id), self.thumbnail_path(document_id))
+                        if os.path.exists(path)
+                    )
+                except FileNotFoundError:
+                    continue
+                if used_at < cutoff:
+                    self.remove(document_id)
+                else:
+                    stored.append((used_at, size, document_id))
+
+        total = sum(size for _, size, _ in stored)
+        removed = 0
+        for _, size, document_id in sorted(stored):
+            if total <= self.max_bytes:
+                break
+            self.remove(document_id)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Removed {removed} documents over the {self.max_bytes} byte storage limit")
+
+
+documents = DocumentStore(
+    settings.DOCUMENTS_STORAGE_DIR,
+    retention_days=settings.DOCUMENTS_RETENTION_DAYS,
+    max_bytes=settings.DOCUMENTS_MAX_BYTES,
+    cleanup_interval_seconds=settings.DOCUMENTS_CLEANUP_INTERVAL_SECONDS,
+)
@@ -0,0 +1,54 @@
+import threading
+from bisect import bisect_right
+from collections.abc import Iterable
+from datetime import date
+
+
+class MissingFxRate(Exception):
+    pass
+
+
+class FxRateCache:
+    """
+    In-process copy of the FX rate table: per currency, rate dates sorted ascending
+    with the matching rates in a parallel list. A lookup returns the latest rate
+    on or before the requested day (binary search), so gaps such as weekends and
+    holidays are covered by the previous published rate.
+    """
+
+    def __init__(self, base_currency: str) -> None:
+        self.base_currency = base_currency
+        self.version: int | None = None
+        self._dates: dict[str, list[date]] = {}
+        self._rates: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, rows: Iterable[tuple[str, date, float]], version: int) -> None:
+        """Replace the cache with (currency, rate_date, rate) rows sorted by currency and date."""
+        dates: dict[str, list[date]] = {}
+        rates: dict[str, list[float]] = {}
+        for currency, rate_date, rate in rows:
+            dates.setdefault(currency, []).append(rate_date)
+            rates.setdefault(currency, []).append(rate)
+        with self._lock:
+            self._dates, self._rates, self.version = dates, rates, version
+
+    def rate(self, currency: str, day: date) -> float | None:
+        if currency == self.base_currency:
+            return 1.0
+        with self._lock:
+            dates, rates = self._dates.get(currency), self._rates.get(currency)
+        if not dates:
+            return None
+        index = bisect_right(dates, day)
+        return rates[index - 1] if index else None
+
+    def require_rate(self, currency: str, day: date) -> float:
+        rate = self.rate(currency, day)
+        if rate is None:
+            name, base = getattr(currency, "value", currency), getattr(self.base_currency, "value", self.base_currency)
+            raise MissingFxRate(f"No {name} to {base} rate on or before {day}")
+        return rate
+
+    def convert(self, amount: float, currency: str, day: date) -> float:
+        return amount * self.require_rate(currency, day)
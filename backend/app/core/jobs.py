@@ -0,0 +1,154 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobStore:
+    """
+    Background jobs with their state and artifacts kept on local disk, so any
+    worker sharing the storage directory can report status and serve downloads.
+
+    Each job lives in <root>/<job_id>/ with a job.json record next to its files.
+    Work runs on a bounded thread pool; jobs older than the retention period are
+    removed whenever a new job is created.
+    """
+
+    def __init__(self, root: str, max_workers: int, max_pending: int, retention_hours: int) -> None:
+        self.root = root
+        self.max_pending = max_pending
+        self.retention = timedelta(hours=retention_hours)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"jobs-{os.path.basename(root)}")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def artifact_path(self, job_id: str, filename: str) -> str:
+        return os.path.join(self.job_dir(job_id), filename)
+
+    def _record_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir(job_id), "job.json")
+
+    def _write(self, job: dict[str, Any]) -> None:
+        path = self._record_path(job["id"])
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, default=str)
+        os.replace(tmp_path, path)
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        try:
+            uuid.UUID(job_id)
+            with open(self._record_path(job_id)) as f:
+                return json.load(f)
+        except (ValueError, FileNotFoundError):
+            return None
+
+    def update(self, job_id: str, **fields: Any) -> dict[str, Any]:
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        job.update(fields)
+        self._write(job)
+        return job
+
+    def create(self, owner_id: int, params: dict[str, Any]) -> dict[str, Any]:
+        self.cleanup()
+        job_id = str(uuid.uuid4())
+        os.makedirs(self.job_dir(job_id), exist_ok=True)
+        job = {
+            "id": job_id,
+            "owner_id": owner_id,
+            "status": "queued",
+            "progress": 0.0,
+            "message": None,
+            "params": params,
+            "filename": None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+        }
+        self._write(job)
+        return job
+
+    def reserve(self) -> None:
+        """
+        Take a place in the queue before creating a job whose inputs are costly to
+        store, so a full queue refuses it first; submit it with reserved=True, or
+        release() the place if it is not submitted after all.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull("Too many jobs in progress, try again later")
+            self._pending += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, job_id: str, work: Callable[[str], str], reserved: bool = False) -> None:
+        """
+        Run work(job_id) in the background. It returns the artifact filename
+        (relative to the job directory) and may call progress() as it goes.
+        """
+        if not reserved:
+            try:
+                self.reserve()
+            except JobQueueFull:
+                shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+                raise
+        self._executor.submit(self._run, job_id, work)
+
+    def progress(self, job_id: str, progress: float, message: str | None = None) -> None:
+        self.update(job_id, progress=round(progress, 3), message=message)
+
+    def _run(self, job_id: str, work: Callable[[str], str]) -> None:
+        try:
+            self.update(job_id, status="running")
+            filename = work(job_id)
+            self.update(
+                job_id,
+                status="done",
+                progress=1.0,
+                message=None,
+                filename=filename,
+                finished_at=datetime.now(timezone.utc).isoformat(),
+            )
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+            self.update(
+                job_id,
+                status="failed",
+                message=str(e),
+                finished_at=datetime.now(timezone.utc).isoformat(),
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def cleanup(self) -> None:
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root, exist_ok=True)
+            return
+        cutoff = time.time() - self.retention.total_seconds()
+        for job_id in os.listdir(self.root):
+            job_dir = self.job_dir(job_id)
+            try:
+                if os.path.getmtime(job_dir) < cutoff:
+                    shutil.rmtree(job_dir, ignore_errors=True)
+            except FileNotFoundError:
+                continue
@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+# Upper bounds of the histogram buckets of timings
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def prometheus(self, metric: str) -> list[str]:
+        lines = [f"# TYPE {metric} histogram"]
+        cumulative = 0
+        for bound, count in zip((*map(repr, self.buckets), "+Inf"), self.counts):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines += [f"{metric}_sum {self.sum}", f"{metric}_count {self.count}"]
+        return lines
+
+
+class Metrics:
+    """
+    Thread-safe in-process counters, timings (count, total, min, max seconds) and
+    histograms of other values, exported as JSON (snapshot) or Prometheus text.
+    """
+
+    def __init__(self) -> None:
+        self._counters: dict[str, float] = {}
+        self._timings: dict[str, list[float]] = {}
+        self._timing_histograms: dict[str, Histogram] = {}
+        self._histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                self._timings[name] = [1, seconds, seconds, seconds]
+                self._timing_histograms[name] = Histogram(SECONDS_BUCKETS)
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = min(timing[2], seconds)
+                timing[3] = max(timing[3], seconds)
+            self._timing_histograms[name].add(seconds)
+
+    def histogram(self, name: str, value: float, buckets: tuple[float, ...]) -> None:
+        """Add a value (e.g. tokens per call) to a histogram; its buckets are fixed by the first call."""
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(buckets)
+            self._histograms[name].add(value)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def ratio(self, name: str, *names: str) -> float | None:
+        """Share of counter name in the sum of names (e.g. a hit rate)."""
+        with self._lock:
+            total = sum(self._counters.get(other, 0) for other in names)
+            return self._counters.get(name, 0) / total if total else None
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+            self._timing_histograms.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {
+                    name: {
+                        "count": count,
+                        "total_seconds": total,
+                        "mean_seconds": total / count,
+                        "min_seconds": low,
+                        "max_seconds": high,
+                    }
+                    for name, (count, total, low, high) in self._timings.items()
+                },
+            }
+
+    def prometheus(self) -> str:
+        """Counters as <name>_total, timings as <name>_seconds and histograms as <name> histograms."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = f"{_metric_name(name)}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, histogram in sorted(self._timing_histograms.items()):
+                lines += histogram.prometheus(f"{_metric_name(name)}_seconds")
+            for name, histogram in sorted(self._histograms.items()):
+                lines += histogram.prometheus(_metric_name(name))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -1 +1 @@
-from . import user, projects, suppliers, customers, parts, payments_from_customers, payments_to_suppliers, external_invoices, internal_invoices
\ No newline at end of file
+from . import user, projects, suppliers, customers, parts, payments_from_customers, payments_to_suppliers, external_invoices, internal_invoices, extraction_cache, supplier_templates, invoice_ingest, counterparties
\ No newline at end of file
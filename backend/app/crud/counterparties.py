@@ -0,0 +1,75 @@
+# app/crud/counterparties.py
+
+import logging
+import threading
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.counterparty_index import Candidate, Counterparty, CounterpartyIndex
+from app.models import Customer, Supplier
+
+logger = logging.getLogger(__name__)
+
+# Extracted supplier/customer names and ICEs are matched against an in-memory index
+# of each table instead of the database. Every worker keeps its own copy: it is
+# loaded on first use (or at startup), updated by this worker's writes, and reloaded
+# in the background after COUNTERPARTY_INDEX_REFRESH_SECONDS to pick up the other
+# workers' writes, while lookups keep using the loaded copy.
+
+_indexes: Dict[type, CounterpartyIndex] = {Supplier: CounterpartyIndex(), Customer: CounterpartyIndex()}
+
+def _load_counterparty_index_db(session: Session, model: type, index: CounterpartyIndex) -> None:
+    index.begin_replace()
+    rows = session.exec(select(model.id, model.name, model.ice, model.postal_code)).all()
+    index.replace(Counterparty(*row) for row in rows)
+
+def _refresh_counterparty_index(engine: Engine, model: type, index: CounterpartyIndex) -> None:
+    """Reload an index in its own session; the caller holds its build_lock."""
+    try:
+        with Session(engine) as session:
+            _load_counterparty_index_db(session, model, index)
+    except Exception as e:
+        logger.warning(f"Could not refresh the {model.__name__} index: {str(e)}")
+    finally:
+        index.build_lock.release()
+
+def get_counterparty_index_db(session: Session, model: type) -> CounterpartyIndex:
+    index = _indexes[model]
+    if index.built_at is None:
+        with index.build_lock:
+            if index.built_at is None:
+                _load_counterparty_index_db(session, model, index)
+    elif index.is_stale(settings.COUNTERPARTY_INDEX_REFRESH_SECONDS) and index.build_lock.acquire(blocking=False):
+        threading.Thread(
+            target=_refresh_counterparty_index,
+            args=(session.get_bind(), model, index),
+            name=f"refresh-{model.__name__}-index",
+            daemon=True,
+        ).start()
+    return index
+
+def build_counterparty_indexes_db(session: Session) -> None:
+    for model in _indexes:
+        get_counterparty_index_db(session, model)
+
+def resolve_counterparties_db(
+    session: Session,
+    model: type,
+    name: Optional[str] = None,
+    ice: Optional[str] = None,
+    postal_code: Optional[str] = None,
+    limit: int = 5
+) -> List[Candidate]:
+    return get_counterparty_index_db(session, model).resolve(name, ice, postal_code, limit)
+
+def index_counterparty(counterparty: Union[Supplier, Customer]) -> None:
+    """Record a committed write (kept even if the index is being loaded meanwhile)."""
+    _indexes[type(counterparty)].upsert(
+        Counterparty(counterparty.id, counterparty.name, counterparty.ice, counterparty.postal_code)
+    )
+
+def unindex_counterparty(model: type, counterparty_id: int) -> None:
+    _indexes[model].remove(counterparty_id)
@@ -3,7 +3,11 @@
 from sqlmodel import Session, select, func
 from typing import List, Optional
 
+from app.crud import counterparties as counterparties_crud
+from app.crud import ledger as ledger_crud
+from app.crud import reporting as reporting_crud
 from app.models import (
+    LedgerPartyType,
     Customer,
     CustomerCreate,
     CustomerUpdate,
@@ -19,6 +23,7 @@ def create_customer_db(session: Session, customer_in: CustomerCreate) -> Custome
     session.add(customer)
     session.commit()
     session.refresh(customer)
+    counterparties_crud.index_counterparty(customer)
     return customer
 
 def get_customer_db(session: Session, customer_id: int) -> Optional[Customer]:
@@ -35,13 +40,19 @@ def update_customer_db(session: Session, customer: Customer, customer_in: Custom
     for key, value in customer_data.items():
         setattr(customer, key, value)
     session.add(customer)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(customer)
+    counterparties_crud.index_counterparty(customer)
     return customer
 
 def delete_customer_db(session: Session, customer: Customer) -> Customer:
+    ledger_crud.purge_party_ledger(session, LedgerPartyType.customer, customer.id)
+    customer_id = customer.id
     session.delete(customer)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
+    counterparties_crud.unindex_counterparty(Customer, customer_id)
     return customer
 
 def get_customer_contacts_db(session: Session, customer_id: int) -> List[CustomerContact]:
@@ -3,6 +3,8 @@
 from sqlmodel import Session, select, func
 from typing import List, Optional
 
+from app.crud import ledger as ledger_crud
+from app.crud import reporting as reporting_crud
 from app.models import ExternalInvoice, ExternalInvoiceCreate, ExternalInvoiceUpdate, Supplier, Project, Part, PaymentToSupplier
 
 def create_external_invoice_db(session: Session, external_invoice_in: ExternalInvoiceCreate) -> ExternalInvoice:
@@ -29,6 +31,8 @@ def create_external_invoice_db(session: Session, external_invoice_in: ExternalIn
     )
 
     session.add(external_invoice)
+    ledger_crud.post_external_invoice(session, external_invoice)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(external_invoice)
     return external_invoice
@@ -44,15 +48,21 @@ def get_external_invoices_count_db(session: Session) -> int:
 
 def update_external_invoice_db(session: Session, external_invoice: ExternalInvoice, external_invoice_in: ExternalInvoiceUpdate) -> ExternalInvoice:
     external_invoice_data = external_invoice_in.model_dump(exclude_unset=True)
+    currency_changed = external_invoice_data.get("currency_type", external_invoice.currency_type) != external_invoice.currency_type
+    ledger_crud.post_external_invoice(session, external_invoice, sign=-1, with_payments=currency_changed)
     for key, value in external_invoice_data.items():
         setattr(external_invoice, key, value)
     session.add(external_invoice)
+    ledger_crud.post_external_invoice(session, external_invoice, with_payments=currency_changed)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(external_invoice)
     return external_invoice
 
 def delete_external_invoice_db(session: Session, external_invoice: ExternalInvoice) -> ExternalInvoice:
+    ledger_crud.post_external_invoice(session, external_invoice, sign=-1, with_payments=True)
     session.delete(external_invoice)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     return external_invoice
 
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select, delete, or_
+
+from app.models import ExtractionCache
+
+def get_cached_extraction_db(
+    session: Session,
+    model: str,
+    prompt_version: str,
+    max_age: timedelta,
+    content_hash: Optional[str] = None,
+    image_hash: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Cached invoice data for an upload with the same bytes, or one that renders to the
+    same image (e.g. the same PDF saved again), counting the hit. Either hash may be
+    omitted, so the bytes can be looked up before the upload is rendered.
+    """
+    keys = []
+    if content_hash:
+        keys.append(ExtractionCache.content_hash == content_hash)
+    if image_hash:
+        keys.append(ExtractionCache.image_hash == image_hash)
+    if not keys:
+        return None
+    entry = session.exec(
+        select(ExtractionCache)
+        .where(
+            ExtractionCache.model == model,
+            ExtractionCache.prompt_version == prompt_version,
+            ExtractionCache.created_at >= datetime.utcnow() - max_age,
+            or_(*keys),
+        )
+        .order_by(ExtractionCache.created_at.desc())
+        .limit(1)
+    ).first()
+    if not entry:
+        return None
+    entry.hits += 1
+    entry.last_used_at = datetime.utcnow()
+    session.add(entry)
+    session.commit()
+    return entry.invoice_data
+
+def save_extraction_db(
+    session: Session,
+    content_hash: str,
+    image_hash: str,
+    model: str,
+    prompt_version: str,
+    invoice_data: Dict[str, Any]
+) -> None:
+    now = datetime.utcnow()
+    stmt = insert(ExtractionCache).values(
+        content_hash=content_hash,
+        image_hash=image_hash,
+        model=model,
+        prompt_version=prompt_version,
+        invoice_data=invoice_data,
+        created_at=now,
+        last_used_at=now,
+        hits=0,
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_extraction_cache_key",
+        set_={
+            "image_hash": stmt.excluded.image_hash,
+            "invoice_data": stmt.excluded.invoice_data,
+            "created_at": now,
+            "last_used_at": now,
+        },
+    )
+    session.execute(stmt)
+    session.commit()
+
+def evict_extraction_cache_db(session: Session, max_age: timedelta, max_entries: int) -> int:
+    """Drop expired entries, then the least recently used ones beyond max_entries."""
+    expired = session.execute(
+        delete(ExtractionCache).where(ExtractionCache.created_at < datetime.utcnow() - max_age)
+    ).rowcount
+    keep = select(ExtractionCache.id).order_by(ExtractionCache.last_used_at.desc()).limit(max_entries)
+    overflow = session.execute(
+        delete(ExtractionCache).where(ExtractionCache.id.not_in(keep))
+    ).rowcount
+    session.commit()
+    return expired + overflow
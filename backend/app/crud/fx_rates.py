@@ -0,0 +1,48 @@
+from typing import List, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select, func
+
+from app.crud import reporting as reporting_crud
+from app.models import CurrencyType, FxRate, FxRateBase
+
+# Rows per INSERT statement when importing a rate file
+IMPORT_BATCH_SIZE = 1000
+
+def get_fx_rates_db(
+    session: Session,
+    currency_type: Optional[CurrencyType] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> List[FxRate]:
+    statement = select(FxRate)
+    if currency_type:
+        statement = statement.where(FxRate.currency_type == currency_type)
+    statement = statement.order_by(FxRate.currency_type, FxRate.rate_date.desc())
+    return session.exec(statement.offset(skip).limit(limit)).all()
+
+def get_fx_rates_count_db(session: Session, currency_type: Optional[CurrencyType] = None) -> int:
+    statement = select(func.count()).select_from(FxRate)
+    if currency_type:
+        statement = statement.where(FxRate.currency_type == currency_type)
+    return session.exec(statement).one()
+
+def import_fx_rates_db(session: Session, rates: List[FxRateBase]) -> int:
+    """Insert rates, replacing any existing rate for the same currency and date."""
+    # Last occurrence wins, as a single INSERT cannot update the same row twice
+    unique = {(rate.currency_type, rate.rate_date): rate.rate for rate in rates}
+    values = [
+        {"currency_type": currency_type, "rate_date": rate_date, "rate": rate}
+        for (currency_type, rate_date), rate in unique.items()
+    ]
+    for start in range(0, len(values), IMPORT_BATCH_SIZE):
+        stmt = insert(FxRate).values(values[start:start + IMPORT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_fx_rate_currency_date",
+            set_={"rate": stmt.excluded.rate},
+        )
+        session.execute(stmt)
+    reporting_crud.bump_fx_rates_version_db(session)
+    reporting_crud.bump_report_data_version_db(session)
+    session.commit()
+    return len(values)
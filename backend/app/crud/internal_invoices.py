@@ -3,6 +3,8 @@
 from sqlmodel import Session, select, func
 from typing import List, Optional, Any
 
+from app.crud import ledger as ledger_crud
+from app.crud import reporting as reporting_crud
 from app.models import InternalInvoice, InternalInvoiceCreate, InternalInvoiceUpdate, Customer, Project
 
 def create_internal_invoice_db(session: Session, internal_invoice_in: InternalInvoiceCreate) -> InternalInvoice:
@@ -29,6 +31,8 @@ def create_internal_invoice_db(session: Session, internal_invoice_in: InternalIn
     )
 
     session.add(internal_invoice)
+    ledger_crud.post_internal_invoice(session, internal_invoice)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(internal_invoice)
     return internal_invoice
@@ -44,15 +48,21 @@ def get_internal_invoices_count_db(session: Session) -> int:
 
 def update_internal_invoice_db(session: Session, internal_invoice: InternalInvoice, internal_invoice_in: InternalInvoiceUpdate) -> InternalInvoice:
     internal_invoice_data = internal_invoice_in.model_dump(exclude_unset=True)
+    currency_changed = internal_invoice_data.get("currency_type", internal_invoice.currency_type) != internal_invoice.currency_type
+    ledger_crud.post_internal_invoice(session, internal_invoice, sign=-1, with_payments=currency_changed)
     for key, value in internal_invoice_data.items():
         setattr(internal_invoice, key, value)
     session.add(internal_invoice)
+    ledger_crud.post_internal_invoice(session, internal_invoice, with_payments=currency_changed)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(internal_invoice)
     return internal_invoice
 
 def delete_internal_invoice_db(session: Session, internal_invoice: InternalInvoice) -> InternalInvoice:
+    ledger_crud.post_internal_invoice(session, internal_invoice, sign=-1, with_payments=True)
     session.delete(internal_invoice)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     return internal_invoice
 
@@ -0,0 +1,163 @@
+# app/crud/invoice_ingest.py
+
+import re
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.crud import counterparties as counterparties_crud
+from app.crud import ledger as ledger_crud
+from app.crud import reporting as reporting_crud
+from app.models import (
+    Customer,
+    ExternalInvoice,
+    InternalInvoice,
+    InvoiceIngest,
+    InvoiceIngestData,
+    Part,
+    Project,
+    Supplier
+)
+
+# An extracted invoice is entered in one transaction: its counterparty is found or
+# created, then the invoice and all of its parts are inserted together (the parts
+# in a single multi-row INSERT), with the ledger posting of the invoice.
+
+# Due date when the invoice does not print one (as the invoice form does)
+DEFAULT_PAYMENT_DAYS = 60
+# Name similarity above which an extracted name is taken to be an existing counterparty
+AUTO_MATCH_SCORE = 0.9
+
+class DuplicateInvoice(ValueError):
+    pass
+
+def normalize_ice(ice: Optional[str]) -> Optional[str]:
+    """The 15-digit ICE, or None when it is missing, malformed or our own."""
+    digits = re.sub(r"\D", "", ice or "")
+    return digits if len(digits) == 15 and digits != settings.COMPANY_ICE else None
+
+def _check_invoice(session: Session, ingest: InvoiceIngest) -> InvoiceIngestData:
+    if not session.get(Project, ingest.project_id):
+        raise ValueError("Project not found")
+    invoice = ingest.invoice
+    missing = [
+        name for name in ("invoice_number", "invoice_date", "total_amount_ht", "total_amount_ttc", "currency")
+        if getattr(invoice, name) in (None, "")
+    ]
+    if missing:
+        raise ValueError(f"Missing invoice fields: {', '.join(missing)}")
+    return invoice
+
+def _resolve_counterparty(session: Session, model: type, counterparty_id: Optional[int], name: str, ice: Optional[str], postal_code: str):
+    """
+    The picked counterparty, else the one with this ICE, else one with a near-identical
+    name (and no other ICE on record), else a new one.
+    """
+    if counterparty_id is not None:
+        counterparty = session.get(model, counterparty_id)
+        if not counterparty:
+            raise ValueError(f"{model.__name__} not found")
+        return counterparty, False
+
+    normalized = normalize_ice(ice)
+    if not normalized and not name:
+        raise ValueError(f"{model.__name__} name or ICE is required")
+    # The index matches stored ICEs however they were typed (spaces, dashes)
+    for candidate in counterparties_crud.resolve_counterparties_db(session, model, name=name, ice=normalized, postal_code=postal_code):
+        if candidate.match == "ice" or (
+            candidate.score >= AUTO_MATCH_SCORE
+            and (not normalized or not normalize_ice(candidate.ice))
+        ):
+            counterparty = session.get(model, candidate.id)
+            if counterparty:
+                return counterparty, False
+
+    counterparty = model(name=name or normalized, ice=normalized or "", postal_code=postal_code or "")
+    session.add(counterparty)
+    session.flush()
+    return counterparty, True
+
+def _check_duplicate(session: Session, model: type, party_field: str, party_id: int, reference: str) -> None:
+    existing = session.exec(
+        select(model.id).where(getattr(model, party_field) == party_id, model.reference == reference)
+    ).first()
+    if existing:
+        raise DuplicateInvoice(f"Invoice {reference} was already entered (id {existing})")
+
+def ingest_external_invoice_db(session: Session, ingest: InvoiceIngest) -> Tuple[ExternalInvoice, Supplier, bool, List[Part]]:
+    invoice = _check_invoice(session, ingest)
+    supplier, created = _resolve_counterparty(
+        session, Supplier, ingest.counterparty_id, invoice.supplier, invoice.ice, invoice.postal_code
+    )
+    _check_duplicate(session, ExternalInvoice, "supplier_id", supplier.id, invoice.invoice_number)
+
+    external_invoice = ExternalInvoice(
+        reference=invoice.invoice_number,
+        invoice_date=invoice.invoice_date,
+        due_date=invoice.due_date or invoice.invoice_date + timedelta(days=DEFAULT_PAYMENT_DAYS),
+        amount_ttc=invoice.total_amount_ttc,
+        amount_ht=invoice.total_amount_ht,
+        vat=round(invoice.total_amount_ttc - invoice.total_amount_ht, 2),
+        currency_type=invoice.currency,
+        supplier_id=supplier.id,
+        project_id=ingest.project_id
+    )
+    session.add(external_invoice)
+    session.flush()
+
+    rows = [
+        {
+            "item_code": item.code or "",
+            "description": item.description,
+            "quantity": item.quantity or 1,
+            "unit_price": item.unit_price or 0.0,
+            "amount": round((item.unit_price or 0.0) * (item.quantity or 1), 2),
+            "external_invoice_id": external_invoice.id,
+            "supplier_id": supplier.id,
+            "project_id": ingest.project_id,
+        }
+        for item in invoice.items
+    ]
+    if rows:
+        session.execute(insert(Part), rows)
+
+    ledger_crud.post_external_invoice(session, external_invoice)
+    reporting_crud.bump_report_data_version_db(session)
+    session.commit()
+    session.refresh(external_invoice)
+    session.refresh(supplier)
+    if created:
+        counterparties_crud.index_counterparty(supplier)
+    parts = session.exec(select(Part).where(Part.external_invoice_id == external_invoice.id).order_by(Part.id)).all()
+    return external_invoice, supplier, created, parts
+
+def ingest_internal_invoice_db(session: Session, ingest: InvoiceIngest) -> Tuple[InternalInvoice, Customer, bool]:
+    invoice = _check_invoice(session, ingest)
+    customer, created = _resolve_counterparty(
+        session, Customer, ingest.counterparty_id, invoice.customer, invoice.ice, invoice.postal_code
+    )
+    _check_duplicate(session, InternalInvoice, "customer_id", customer.id, invoice.invoice_number)
+
+    internal_invoice = InternalInvoice(
+        reference=invoice.invoice_number,
+        invoice_date=invoice.invoice_date,
+        due_date=invoice.due_date or invoice.invoice_date + timedelta(days=DEFAULT_PAYMENT_DAYS),
+        amount_ttc=invoice.total_amount_ttc,
+        amount_ht=invoice.total_amount_ht,
+        vat=round(invoice.total_amount_ttc - invoice.total_amount_ht, 2),
+        currency_type=invoice.currency,
+        customer_id=customer.id,
+        project_id=ingest.project_id
+    )
+    session.add(internal_invoice)
+    ledger_crud.post_internal_invoice(session, internal_invoice)
+    reporting_crud.bump_report_data_version_db(session)
+    session.commit()
+    session.refresh(internal_invoice)
+    session.refresh(customer)
+    if created:
+        counterparties_crud.index_counterparty(customer)
+    return internal_invoice, customer, created
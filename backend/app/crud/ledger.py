@@ -0,0 +1,185 @@
+# app/crud/ledger.py
+
+from datetime import date
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select, delete, func, literal, union_all, cast
+
+from app.models import (
+    LedgerDaily,
+    LedgerPartyType,
+    CurrencyType,
+    PaymentFromCustomer,
+    PaymentToSupplier,
+    InternalInvoice,
+    ExternalInvoice
+)
+
+# The ledger_daily rollup is maintained incrementally: every CRUD write posts a
+# signed delta into the same transaction, and rebuild_ledger_daily_db() recomputes
+# the whole table from the raw rows if it ever drifts.
+
+LEDGER_KEY = ["day", "project_id", "party_type", "party_id", "currency_type"]
+LEDGER_AMOUNTS = ["income", "expenses", "invoiced_ttc", "invoiced_ht", "vat"]
+
+def _post_delta(
+    session: Session,
+    *,
+    day: date,
+    project_id: int,
+    party_type: LedgerPartyType,
+    party_id: int,
+    currency_type: CurrencyType,
+    **amounts: float | None
+) -> None:
+    values = {
+        "day": day,
+        "project_id": project_id,
+        "party_type": party_type,
+        "party_id": party_id,
+        "currency_type": currency_type,
+    }
+    for name in LEDGER_AMOUNTS:
+        values[name] = amounts.get(name) or 0.0
+
+    stmt = insert(LedgerDaily).values(**values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=LEDGER_KEY,
+        set_={name: getattr(LedgerDaily, name) + getattr(stmt.excluded, name) for name in amounts},
+    )
+    session.execute(stmt)
+
+def post_payment_from_customer(session: Session, payment: PaymentFromCustomer, sign: int = 1) -> None:
+    internal_invoice = session.get(InternalInvoice, payment.internal_invoice_id)
+    _post_delta(
+        session,
+        day=payment.disbursement_date,
+        project_id=payment.project_id,
+        party_type=LedgerPartyType.customer,
+        party_id=payment.customer_id,
+        currency_type=internal_invoice.currency_type,
+        income=sign * (payment.amount or 0.0),
+    )
+
+def post_payment_to_supplier(session: Session, payment: PaymentToSupplier, sign: int = 1) -> None:
+    external_invoice = session.get(ExternalInvoice, payment.external_invoice_id)
+    _post_delta(
+        session,
+        day=payment.disbursement_date,
+        project_id=payment.project_id,
+        party_type=LedgerPartyType.supplier,
+        party_id=payment.supplier_id,
+        currency_type=external_invoice.currency_type,
+        expenses=sign * (payment.amount or 0.0),
+    )
+
+def post_internal_invoice(session: Session, internal_invoice: InternalInvoice, sign: int = 1, with_payments: bool = False) -> None:
+    """
+    Post an internal invoice. Payments inherit the invoice currency, so they are
+    re-posted too (with_payments) when the invoice is deleted or changes currency.
+    """
+    _post_delta(
+        session,
+        day=internal_invoice.invoice_date,
+        project_id=internal_invoice.project_id,
+        party_type=LedgerPartyType.customer,
+        party_id=internal_invoice.customer_id,
+        currency_type=internal_invoice.currency_type,
+        invoiced_ttc=sign * (internal_invoice.amount_ttc or 0.0),
+        invoiced_ht=sign * (internal_invoice.amount_ht or 0.0),
+        vat=sign * (internal_invoice.vat or 0.0),
+    )
+    if with_payments:
+        for payment in internal_invoice.payments_from_customers:
+            post_payment_from_customer(session, payment, sign)
+
+def post_external_invoice(session: Session, external_invoice: ExternalInvoice, sign: int = 1, with_payments: bool = False) -> None:
+    _post_delta(
+        session,
+        day=external_invoice.invoice_date,
+        project_id=external_invoice.project_id,
+        party_type=LedgerPartyType.supplier,
+        party_id=external_invoice.supplier_id,
+        currency_type=external_invoice.currency_type,
+        invoiced_ttc=sign * (external_invoice.amount_ttc or 0.0),
+        invoiced_ht=sign * (external_invoice.amount_ht or 0.0),
+        vat=sign * (external_invoice.vat or 0.0),
+    )
+    if with_payments:
+        for payment in external_invoice.payments_to_suppliers:
+            post_payment_to_supplier(session, payment, sign)
+
+def purge_project_ledger(session: Session, project_id: int) -> None:
+    # Deleting a project cascades to all of its invoices and payments
+    session.execute(delete(LedgerDaily).where(LedgerDaily.project_id == project_id))
+
+def purge_party_ledger(session: Session, party_type: LedgerPartyType, party_id: int) -> None:
+    # Deleting a customer/supplier cascades to its invoices, and from there to their payments
+    session.execute(
+        delete(LedgerDaily).where(LedgerDaily.party_type == party_type, LedgerDaily.party_id == party_id)
+    )
+
+def rebuild_ledger_daily_db(session: Session) -> int:
+    """Recompute the whole rollup from payments and invoices. Returns the number of rows written."""
+    party_type = LedgerDaily.__table__.c.party_type.type
+    zero = literal(0.0)
+
+    entries = union_all(
+        select(
+            PaymentFromCustomer.disbursement_date.label("day"),
+            PaymentFromCustomer.project_id,
+            cast(literal(LedgerPartyType.customer.value), party_type).label("party_type"),
+            PaymentFromCustomer.customer_id.label("party_id"),
+            InternalInvoice.currency_type,
+            func.coalesce(PaymentFromCustomer.amount, 0.0).label("income"),
+            zero.label("expenses"),
+            zero.label("invoiced_ttc"),
+            zero.label("invoiced_ht"),
+            zero.label("vat"),
+        ).join(InternalInvoice, InternalInvoice.id == PaymentFromCustomer.internal_invoice_id),
+        select(
+            PaymentToSupplier.disbursement_date,
+            PaymentToSupplier.project_id,
+            cast(literal(LedgerPartyType.supplier.value), party_type),
+            PaymentToSupplier.supplier_id,
+            ExternalInvoice.currency_type,
+            zero,
+            func.coalesce(PaymentToSupplier.amount, 0.0),
+            zero,
+            zero,
+            zero,
+        ).join(ExternalInvoice, ExternalInvoice.id == PaymentToSupplier.external_invoice_id),
+        select(
+            InternalInvoice.invoice_date,
+            InternalInvoice.project_id,
+            cast(literal(LedgerPartyType.customer.value), party_type),
+            InternalInvoice.customer_id,
+            InternalInvoice.currency_type,
+            zero,
+            zero,
+            InternalInvoice.amount_ttc,
+            InternalInvoice.amount_ht,
+            func.coalesce(InternalInvoice.vat, 0.0),
+        ),
+        select(
+            ExternalInvoice.invoice_date,
+            ExternalInvoice.project_id,
+            cast(literal(LedgerPartyType.supplier.value), party_type),
+            ExternalInvoice.supplier_id,
+            ExternalInvoice.currency_type,
+            zero,
+            zero,
+            ExternalInvoice.amount_ttc,
+            ExternalInvoice.amount_ht,
+            func.coalesce(ExternalInvoice.vat, 0.0),
+        ),
+    ).subquery()
+
+    rollup = select(
+        *[entries.c[name] for name in LEDGER_KEY],
+        *[func.sum(entries.c[name]) for name in LEDGER_AMOUNTS],
+    ).group_by(*[entries.c[name] for name in LEDGER_KEY])
+
+    session.execute(delete(LedgerDaily))
+    session.execute(insert(LedgerDaily).from_select(LEDGER_KEY + LEDGER_AMOUNTS, rollup))
+    session.commit()
+    return session.exec(select(func.count()).select_from(LedgerDaily)).one()
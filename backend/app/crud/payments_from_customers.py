@@ -3,6 +3,8 @@
 from sqlmodel import Session, select, func
 from typing import List, Optional
 
+from app.crud import ledger as ledger_crud
+from app.crud import reporting as reporting_crud
 from app.models import PaymentFromCustomer, PaymentFromCustomerCreate, PaymentFromCustomerUpdate, InternalInvoice, Customer, Project
 
 def create_payment_from_customer_db(session: Session, payment_in: PaymentFromCustomerCreate) -> PaymentFromCustomer:
@@ -27,6 +29,8 @@ def create_payment_from_customer_db(session: Session, payment_in: PaymentFromCus
 
     payment = PaymentFromCustomer.model_validate(payment_data)
     session.add(payment)
+    ledger_crud.post_payment_from_customer(session, payment)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(payment)
     return payment
@@ -41,6 +45,8 @@ def get_payments_from_customers_count_db(session: Session) -> int:
     return session.exec(select(func.count()).select_from(PaymentFromCustomer)).one()
 
 def update_payment_from_customer_db(session: Session, payment: PaymentFromCustomer, payment_in: PaymentFromCustomerUpdate) -> PaymentFromCustomer:
+    ledger_crud.post_payment_from_customer(session, payment, sign=-1)
+
     if payment_in.internal_invoice_id is not None:
         internal_invoice = session.get(InternalInvoice, payment_in.internal_invoice_id)
         if not internal_invoice:
@@ -65,11 +71,15 @@ def update_payment_from_customer_db(session: Session, payment: PaymentFromCustom
         setattr(payment, key, value)
     
     session.add(payment)
+    ledger_crud.post_payment_from_customer(session, payment)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(payment)
     return payment
 
 def delete_payment_from_customer_db(session: Session, payment: PaymentFromCustomer) -> PaymentFromCustomer:
+    ledger_crud.post_payment_from_customer(session, payment, sign=-1)
     session.delete(payment)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     return payment
\ No newline at end of file
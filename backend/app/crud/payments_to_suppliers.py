@@ -3,6 +3,8 @@
 from sqlmodel import Session, select, func
 from typing import List, Optional
 
+from app.crud import ledger as ledger_crud
+from app.crud import reporting as reporting_crud
 from app.models import PaymentToSupplier, PaymentToSupplierCreate, PaymentToSupplierUpdate, ExternalInvoice, Supplier, Project
 
 def create_payment_to_supplier_db(session: Session, payment_in: PaymentToSupplierCreate) -> PaymentToSupplier:
@@ -27,6 +29,8 @@ def create_payment_to_supplier_db(session: Session, payment_in: PaymentToSupplie
 
     payment = PaymentToSupplier.model_validate(payment_data)
     session.add(payment)
+    ledger_crud.post_payment_to_supplier(session, payment)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(payment)
     return payment
@@ -41,6 +45,8 @@ def get_payments_to_suppliers_count_db(session: Session) -> int:
     return session.exec(select(func.count()).select_from(PaymentToSupplier)).one()
 
 def update_payment_to_supplier_db(session: Session, payment: PaymentToSupplier, payment_in: PaymentToSupplierUpdate) -> PaymentToSupplier:
+    ledger_crud.post_payment_to_supplier(session, payment, sign=-1)
+
     if payment_in.external_invoice_id is not None:
         external_invoice = session.get(ExternalInvoice, payment_in.external_invoice_id)
         if not external_invoice:
@@ -65,11 +71,15 @@ def update_payment_to_supplier_db(session: Session, payment: PaymentToSupplier,
         setattr(payment, key, value)
     
     session.add(payment)
+    ledger_crud.post_payment_to_supplier(session, payment)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(payment)
     return payment
 
 def delete_payment_to_supplier_db(session: Session, payment: PaymentToSupplier) -> PaymentToSupplier:
+    ledger_crud.post_payment_to_supplier(session, payment, sign=-1)
     session.delete(payment)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     return payment
\ No newline at end of file
@@ -3,11 +3,14 @@ from sqlmodel import Session, select, func
 from typing import Any, List
 
 
+from app.crud import ledger as ledger_crud
+from app.crud import reporting as reporting_crud
 from app.models import Project, ProjectCreate, ProjectUpdate, Part
 
 def create_project_db(session: Session, project_in: ProjectCreate) -> Project:
     project = Project.model_validate(project_in)
     session.add(project)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(project)
     return project
@@ -26,12 +29,15 @@ def update_project_db(session: Session, project: Project, project_in: ProjectUpd
     for key, value in project_data.items():
         setattr(project, key, value)
     session.add(project)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(project)
     return project
 
 def delete_project_db(session: Session, project: Project) -> Project:
+    ledger_crud.purge_project_ledger(session, project.id)
     session.delete(project)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     return project
 
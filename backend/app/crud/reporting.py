@@ -0,0 +1,450 @@
+# app/crud/reporting.py
+
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, Integer, case, cast, column, create_engine, lateral, true, values
+from sqlalchemy.engine import Engine, URL
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select, func, literal
+
+from app.core.config import settings
+from app.core.fx import FxRateCache
+
+from app.models import (
+    PaymentFromCustomer,
+    PaymentToSupplier,
+    InternalInvoice,
+    ExternalInvoice,
+    AgingRow,
+    CurrencyType,
+    FxRate,
+    LedgerDaily,
+    ReportDataVersion,
+    LedgerPartyType,
+    Project,
+    Customer,
+    Supplier,
+    ProjectData,
+    EntityPayment,
+    ReportData,
+    PeriodData,
+    SeriesGranularity
+)
+
+# Rows of report_data_version: one counter for everything a report reads, and one
+# for the fx_rate table alone
+REPORT_DATA_VERSION_ID = 1
+FX_RATES_VERSION_ID = 2
+
+def _get_version_db(session: Session, version_id: int) -> int:
+    version = session.exec(
+        select(ReportDataVersion.version).where(ReportDataVersion.id == version_id)
+    ).first()
+    return version or 0
+
+def _bump_version_db(session: Session, version_id: int) -> None:
+    stmt = insert(ReportDataVersion).values(id=version_id, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={"version": ReportDataVersion.version + 1},
+    )
+    session.execute(stmt)
+
+def get_report_data_version_db(session: Session) -> int:
+    return _get_version_db(session, REPORT_DATA_VERSION_ID)
+
+def bump_report_data_version_db(session: Session) -> None:
+    """Invalidate cached reports. Call before committing any write that can change a report."""
+    _bump_version_db(session, REPORT_DATA_VERSION_ID)
+
+def get_fx_rates_version_db(session: Session) -> int:
+    return _get_version_db(session, FX_RATES_VERSION_ID)
+
+def bump_fx_rates_version_db(session: Session) -> None:
+    """Invalidate the in-process FX rate copies. Call before committing any write to fx_rate."""
+    _bump_version_db(session, FX_RATES_VERSION_ID)
+
+# Reports are consolidated in MAD; fx_rate holds the MAD value of every other currency.
+BASE_CURRENCY = CurrencyType.MAD
+
+# Sorted per-currency copy of fx_rate, reloaded whenever the FX rates version moves
+fx_rate_cache = FxRateCache(BASE_CURRENCY)
+
+def get_fx_rate_cache_db(session: Session) -> FxRateCache:
+    version = get_fx_rates_version_db(session)
+    if fx_rate_cache.version != version:
+        rows = session.exec(
+            select(FxRate.currency_type, FxRate.rate_date, FxRate.rate)
+            .order_by(FxRate.currency_type, FxRate.rate_date)
+        ).all()
+        fx_rate_cache.load(rows, version)
+    return fx_rate_cache
+
+def check_fx_coverage_db(session: Session, start_date: Optional[date] = None, end_date: Optional[date] = None) -> None:
+    """
+    Raise MissingFxRate unless every foreign-currency ledger row (between start_date and
+    end_date, when given) has a rate on or before its day. Rates are looked up as of a
+    date, so it is enough to check the earliest day per currency.
+    """
+    rates = get_fx_rate_cache_db(session)
+    statement = select(LedgerDaily.currency_type, func.min(LedgerDaily.day)).where(LedgerDaily.currency_type != BASE_CURRENCY)
+    if start_date is not None:
+        statement = statement.where(LedgerDaily.day >= start_date)
+    if end_date is not None:
+        statement = statement.where(LedgerDaily.day <= end_date)
+    first_days = session.exec(statement.group_by(LedgerDaily.currency_type)).all()
+    for currency_type, first_day in first_days:
+        rates.require_rate(currency_type, first_day)
+
+def ledger_fx_rate():
+    """
+    LATERAL lookup of the rate in effect on each ledger row's day, to be outer-joined
+    next to LedgerDaily. Postgres memoizes it per (currency, day), so the cost is one
+    index probe per distinct day rather than one per row.
+    """
+    return lateral(
+        select(FxRate.rate)
+        .where(FxRate.currency_type == LedgerDaily.currency_type, FxRate.rate_date <= LedgerDaily.day)
+        .order_by(FxRate.rate_date.desc())
+        .limit(1)
+    ).alias("fx")
+
+def in_base_currency(amount, fx):
+    return amount * case((LedgerDaily.currency_type == BASE_CURRENCY, 1.0), else_=fx.c.rate)
+
+# All report aggregates read from the ledger_daily rollup (see app/crud/ledger.py),
+# so their cost depends on the number of days in range, not the number of payments.
+# Amounts are converted to BASE_CURRENCY inside the aggregates; get_report_data_db()
+# checks rate coverage first so a missing rate is an error rather than a silent gap.
+
+def get_report_totals_db(session: Session, start_date: date, end_date: date) -> dict:
+    """Income, expenses, receivables and payables for the range in a single round trip."""
+    fx = ledger_fx_rate()
+
+    def total(column, condition=None):
+        aggregate = func.sum(in_base_currency(column, fx))
+        if condition is not None:
+            aggregate = aggregate.filter(condition)
+        return func.coalesce(aggregate, 0.0)
+
+    row = session.exec(
+        select(
+            total(LedgerDaily.income).label("total_income"),
+            total(LedgerDaily.expenses).label("total_expenses"),
+            total(LedgerDaily.invoiced_ttc, LedgerDaily.party_type == LedgerPartyType.customer).label("total_receivables"),
+            total(LedgerDaily.invoiced_ttc, LedgerDaily.party_type == LedgerPartyType.supplier).label("total_payables"),
+        )
+        .outerjoin(fx, true())
+        .where(LedgerDaily.day.between(start_date, end_date))
+    ).one()
+    return dict(row._mapping)
+
+def get_project_breakdown_db(session: Session, start_date: date, end_date: date) -> List[ProjectData]:
+    """Per-project income and expenses, one row for every project (zero when it had no payments)."""
+    fx = ledger_fx_rate()
+    per_project = (
+        select(
+            LedgerDaily.project_id,
+            func.sum(in_base_currency(LedgerDaily.income, fx)).label("income"),
+            func.sum(in_base_currency(LedgerDaily.expenses, fx)).label("expenses"),
+        )
+        .outerjoin(fx, true())
+        .where(LedgerDaily.day.between(start_date, end_date))
+        .group_by(LedgerDaily.project_id)
+        .subquery()
+    )
+
+    rows = session.exec(
+        select(
+            Project.name,
+            func.coalesce(per_project.c.income, 0.0),
+            func.coalesce(per_project.c.expenses, 0.0),
+        )
+        .outerjoin(per_project, per_project.c.project_id == Project.id)
+        .order_by(Project.id)
+    ).all()
+    return [
+        ProjectData(project_name=name, income=income, expenses=expenses, profit=income - expenses)
+        for name, income, expenses in rows
+    ]
+
+def get_top_customers_db(session: Session, limit: int = 5) -> List[EntityPayment]:
+    """The customers with payments, ranked on their total over all time."""
+    fx = ledger_fx_rate()
+    total_payment = func.sum(in_base_currency(LedgerDaily.income, fx))
+    rows = session.exec(
+        select(Customer.name, total_payment)
+        .join(LedgerDaily, (LedgerDaily.party_id == Customer.id) & (LedgerDaily.party_type == LedgerPartyType.customer))
+        .outerjoin(fx, true())
+        .where(Customer.id.in_(select(PaymentFromCustomer.customer_id)))
+        .group_by(Customer.id)
+        .order_by(total_payment.desc())
+        .limit(limit)
+    ).all()
+    return [EntityPayment(name=name, total_payment=total) for name, total in rows]
+
+def get_top_suppliers_db(session: Session, limit: int = 5) -> List[EntityPayment]:
+    """The suppliers with payments, ranked on their total over all time."""
+    fx = ledger_fx_rate()
+    total_payment = func.sum(in_base_currency(LedgerDaily.expenses, fx))
+    rows = session.exec(
+        select(Supplier.name, total_payment)
+        .join(LedgerDaily, (LedgerDaily.party_id == Supplier.id) & (LedgerDaily.party_type == LedgerPartyType.supplier))
+        .outerjoin(fx, true())
+        .where(Supplier.id.in_(select(PaymentToSupplier.supplier_id)))
+        .group_by(Supplier.id)
+        .order_by(total_payment.desc())
+        .limit(limit)
+    ).all()
+    return [EntityPayment(name=name, total_payment=total) for name, total in rows]
+
+# The report aggregates are independent, so they run concurrently on separate pooled
+# connections; latency is that of the slowest query rather than the sum. The pool is
+# shared by all requests, which bounds the connections reports can hold at once.
+# They all import the snapshot exported by the caller's transaction, so the figures
+# of one report agree with each other even while writes are committed.
+report_query_executor = ThreadPoolExecutor(
+    max_workers=settings.REPORT_QUERY_WORKERS,
+    thread_name_prefix="report-query"
+)
+
+# The aggregates run on their own pool, one connection per worker: the request that
+# waits for them holds a connection of the main pool, so taking theirs from it too
+# could exhaust it under concurrent reports.
+_report_engines: Dict[URL, Engine] = {}
+_report_engines_lock = threading.Lock()
+
+def report_engine(bind) -> Engine:
+    url = bind.engine.url
+    with _report_engines_lock:
+        if url not in _report_engines:
+            _report_engines[url] = create_engine(
+                url, pool_size=settings.REPORT_QUERY_WORKERS, max_overflow=0
+            )
+        return _report_engines[url]
+
+# What pg_export_snapshot() returns, e.g. 00000003-0000001B-1
+SNAPSHOT_ID = re.compile(r"[0-9A-F]+(-[0-9A-F]+){1,2}")
+
+def _in_snapshot(engine: Engine, snapshot_id: str, query, *args):
+    with Session(engine) as session:
+        connection = session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        connection.exec_driver_sql(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'")
+        return query(session, *args)
+
+def get_report_data_db(session: Session, start_date: date, end_date: date) -> ReportData:
+    """
+    Totals and project breakdown for start_date..end_date; the top customers and
+    suppliers are ranked on their payments over all time, so the rate check covers every day.
+    """
+    check_fx_coverage_db(session)
+    engine = report_engine(session.get_bind())
+    # Valid until the session's transaction ends, which is after the aggregates return
+    snapshot_id = session.exec(select(func.pg_export_snapshot())).one()
+    if not SNAPSHOT_ID.fullmatch(snapshot_id):
+        raise ValueError(f"Unexpected snapshot id {snapshot_id!r}")
+    totals, project_data, top_customers, top_suppliers = [
+        report_query_executor.submit(_in_snapshot, engine, snapshot_id, query, *args)
+        for query, args in [
+            (get_report_totals_db, (start_date, end_date)),
+            (get_project_breakdown_db, (start_date, end_date)),
+            (get_top_customers_db, ()),
+            (get_top_suppliers_db, ()),
+        ]
+    ]
+    totals = totals.result()
+    return ReportData(
+        total_income=totals["total_income"],
+        total_expenses=totals["total_expenses"],
+        net_profit=totals["total_income"] - totals["total_expenses"],
+        total_receivables=totals["total_receivables"],
+        total_payables=totals["total_payables"],
+        project_data=project_data.result(),
+        top_customers=top_customers.result(),
+        top_suppliers=top_suppliers.result(),
+        currency=BASE_CURRENCY,
+    )
+
+# Period-over-period series: every period and project comes out of one grouped query,
+# with calendar periods bucketed by date_trunc and explicit periods joined from VALUES.
+GRANULARITY_MONTHS = {
+    SeriesGranularity.month: 1,
+    SeriesGranularity.quarter: 3,
+    SeriesGranularity.year: 12,
+}
+
+def series_period_count(start_date: date, end_date: date, granularity: SeriesGranularity) -> int:
+    """Number of periods series_periods() returns, without building them."""
+    if end_date < start_date:
+        return 0
+    step = GRANULARITY_MONTHS[granularity]
+    first = (start_date.year * 12 + start_date.month - 1) // step
+    last = (end_date.year * 12 + end_date.month - 1) // step
+    return last - first + 1
+
+def series_periods(start_date: date, end_date: date, granularity: SeriesGranularity) -> List[Tuple[date, date]]:
+    """Calendar periods overlapping start_date..end_date, the first and last clipped to the range."""
+    step = GRANULARITY_MONTHS[granularity]
+    month_index = start_date.year * 12 + start_date.month - 1
+    month_index -= month_index % step
+    periods = []
+    while True:
+        period_start = date(month_index // 12, month_index % 12 + 1, 1)
+        if period_start > end_date:
+            return periods
+        month_index += step
+        next_start = date(month_index // 12, month_index % 12 + 1, 1)
+        periods.append((max(period_start, start_date), min(next_start - timedelta(days=1), end_date)))
+
+def get_report_series_db(
+    session: Session,
+    periods: List[Tuple[date, date]],
+    granularity: Optional[SeriesGranularity] = None
+) -> List[PeriodData]:
+    """
+    Income, expenses, receivables, payables and per-project profit for each period.
+    With a granularity, periods must come from series_periods(); otherwise they may
+    be any (possibly overlapping) date ranges.
+    """
+    check_fx_coverage_db(session, min(start for start, _ in periods), max(end for _, end in periods))
+    fx = ledger_fx_rate()
+
+    def amount(column, condition=None):
+        aggregate = func.sum(in_base_currency(column, fx))
+        if condition is not None:
+            aggregate = aggregate.filter(condition)
+        return func.coalesce(aggregate, 0.0)
+
+    amounts = [
+        amount(LedgerDaily.income),
+        amount(LedgerDaily.expenses),
+        amount(LedgerDaily.invoiced_ttc, LedgerDaily.party_type == LedgerPartyType.customer),
+        amount(LedgerDaily.invoiced_ttc, LedgerDaily.party_type == LedgerPartyType.supplier),
+    ]
+    if granularity:
+        period_key = cast(func.date_trunc(granularity.value, LedgerDaily.day), Date)
+        statement = (
+            select(period_key, LedgerDaily.project_id, *amounts)
+            .select_from(LedgerDaily)
+            .where(LedgerDaily.day.between(periods[0][0], periods[-1][1]))
+        )
+    else:
+        period_table = values(
+            column("index", Integer), column("start_date", Date), column("end_date", Date), name="periods"
+        ).data([(index, start, end) for index, (start, end) in enumerate(periods)])
+        period_key = period_table.c.index
+        statement = (
+            select(period_key, LedgerDaily.project_id, *amounts)
+            .select_from(LedgerDaily)
+            .join(period_table, LedgerDaily.day.between(period_table.c.start_date, period_table.c.end_date))
+        )
+
+    rows = session.exec(
+        statement.outerjoin(fx, true()).group_by(period_key, LedgerDaily.project_id)
+    ).all()
+
+    totals = [[0.0, 0.0, 0.0, 0.0] for _ in periods]
+    project_amounts = [{} for _ in periods]
+    # date_trunc buckets are keyed by period start; the first one may begin before start_date
+    index_by_start = {start: index for index, (start, _) in enumerate(periods)}
+    for key, project_id, income, expenses, receivables, payables in rows:
+        index = index_by_start[max(key, periods[0][0])] if granularity else key
+        project_amounts[index][project_id] = (income, expenses)
+        for position, value in enumerate((income, expenses, receivables, payables)):
+            totals[index][position] += value
+
+    projects = session.exec(select(Project.id, Project.name).order_by(Project.id)).all()
+    series = []
+    for (start, end), (income, expenses, receivables, payables), by_project in zip(periods, totals, project_amounts):
+        project_data = []
+        for project_id, name in projects:
+            project_income, project_expenses = by_project.get(project_id, (0.0, 0.0))
+            project_data.append(ProjectData(
+                project_name=name,
+                income=project_income,
+                expenses=project_expenses,
+                profit=project_income - project_expenses,
+            ))
+        series.append(PeriodData(
+            start_date=start,
+            end_date=end,
+            income=income,
+            expenses=expenses,
+            net_profit=income - expenses,
+            receivables=receivables,
+            payables=payables,
+            project_data=project_data,
+        ))
+    return series
+
+
+AGING_BUCKETS = ["current", "days_1_30", "days_31_60", "days_61_90", "days_over_90"]
+
+def aging_statement(party_type: LedgerPartyType, as_of: date):
+    """
+    Outstanding balance per invoice (amount_ttc minus payments up to as_of), bucketed by
+    days past due_date and summed per counterparty and currency in one grouped query.
+    """
+    if party_type == LedgerPartyType.customer:
+        Invoice, Payment, Party = InternalInvoice, PaymentFromCustomer, Customer
+        payment_invoice_id, invoice_party_id = Payment.internal_invoice_id, Invoice.customer_id
+    else:
+        Invoice, Payment, Party = ExternalInvoice, PaymentToSupplier, Supplier
+        payment_invoice_id, invoice_party_id = Payment.external_invoice_id, Invoice.supplier_id
+
+    # Payments are joined on invoice_id (indexed) and summed per invoice in the same pass
+    paid = func.coalesce(func.sum(Payment.amount), 0.0)
+    balances = (
+        select(
+            invoice_party_id.label("party_id"),
+            Invoice.currency_type,
+            (Invoice.amount_ttc - paid).label("outstanding"),
+            (literal(as_of, Date) - Invoice.due_date).label("days_past_due"),
+        )
+        .outerjoin(Payment, (payment_invoice_id == Invoice.id) & (Payment.disbursement_date <= as_of))
+        .where(Invoice.invoice_date <= as_of)
+        .group_by(Invoice.id)
+        .subquery()
+    )
+
+    def bucket(condition):
+        return func.coalesce(func.sum(balances.c.outstanding).filter(condition), 0.0)
+
+    days = balances.c.days_past_due
+    total = func.sum(balances.c.outstanding)
+    return (
+        select(
+            Party.id,
+            Party.name,
+            balances.c.currency_type,
+            func.count(),
+            bucket(days <= 0),
+            bucket(days.between(1, 30)),
+            bucket(days.between(31, 60)),
+            bucket(days.between(61, 90)),
+            bucket(days > 90),
+            total,
+        )
+        .join(Party, Party.id == balances.c.party_id)
+        # Ignore fully paid invoices (and float noise from partial payments)
+        .where(balances.c.outstanding > 0.005)
+        .group_by(Party.id, balances.c.currency_type)
+        .order_by(total.desc())
+    )
+
+def aging_row(row) -> AgingRow:
+    party_id, name, currency_type, invoices, *amounts = row
+    return AgingRow(
+        party_id=party_id,
+        name=name,
+        currency_type=currency_type,
+        invoices=invoices,
+        **dict(zip(AGING_BUCKETS + ["total"], amounts))
+    )
+
+def get_aging_rows_db(session: Session, party_type: LedgerPartyType, as_of: date) -> List[AgingRow]:
+    return [aging_row(row) for row in session.exec(aging_statement(party_type, as_of)).all()]
@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Any, Collection, Dict, List, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, select, func
+
+from app.models import SupplierTemplate
+
+def get_supplier_templates_db(session: Session, skip: int = 0, limit: int = 100) -> List[SupplierTemplate]:
+    statement = select(SupplierTemplate).order_by(SupplierTemplate.supplier).offset(skip).limit(limit)
+    return session.exec(statement).all()
+
+def get_supplier_templates_count_db(session: Session) -> int:
+    return session.exec(select(func.count()).select_from(SupplierTemplate)).one()
+
+def get_supplier_template_db(session: Session, template_id: int) -> Optional[SupplierTemplate]:
+    return session.get(SupplierTemplate, template_id)
+
+def get_supplier_templates_by_ice_db(session: Session, ices: Collection[str]) -> List[SupplierTemplate]:
+    if not ices:
+        return []
+    return session.exec(select(SupplierTemplate).where(SupplierTemplate.ice.in_(ices))).all()
+
+def save_supplier_template_db(session: Session, ice: str, supplier: str, template: Dict[str, Any]) -> SupplierTemplate:
+    """Store the template of a supplier, replacing the one learned before (and its counters)."""
+    now = datetime.utcnow()
+    stmt = insert(SupplierTemplate).values(
+        ice=ice, supplier=supplier, template=template, created_at=now, uses=0, failures=0
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[SupplierTemplate.ice],
+        set_={
+            "supplier": stmt.excluded.supplier,
+            "template": stmt.excluded.template,
+            "created_at": now,
+            "uses": 0,
+            "failures": 0,
+            "last_used_at": None,
+        },
+    )
+    session.execute(stmt)
+    session.commit()
+    return session.exec(select(SupplierTemplate).where(SupplierTemplate.ice == ice)).one()
+
+def record_supplier_template_use_db(session: Session, template: SupplierTemplate, success: bool) -> None:
+    # Counted in SQL so that concurrent extractions do not overwrite each other
+    column = SupplierTemplate.uses if success else SupplierTemplate.failures
+    session.execute(
+        SupplierTemplate.__table__.update()
+        .where(SupplierTemplate.id == template.id)
+        .values({column.key: column + 1, "last_used_at": datetime.utcnow()})
+    )
+    session.commit()
+
+def delete_supplier_template_db(session: Session, template: SupplierTemplate) -> None:
+    session.delete(template)
+    session.commit()
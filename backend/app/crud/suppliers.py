@@ -3,7 +3,11 @@
 from sqlmodel import Session, select, func
 from typing import List, Optional, Any
 
+from app.crud import counterparties as counterparties_crud
+from app.crud import ledger as ledger_crud
+from app.crud import reporting as reporting_crud
 from app.models import (
+    LedgerPartyType,
     Supplier,
     SupplierCreate,
     SupplierUpdate,
@@ -19,6 +23,7 @@ def create_supplier_db(session: Session, supplier_in: SupplierCreate) -> Supplie
     session.add(supplier)
     session.commit()
     session.refresh(supplier)
+    counterparties_crud.index_counterparty(supplier)
     return supplier
 
 def get_supplier_db(session: Session, supplier_id: int) -> Optional[Supplier]:
@@ -35,13 +40,19 @@ def update_supplier_db(session: Session, supplier: Supplier, supplier_in: Suppli
     for key, value in supplier_data.items():
         setattr(supplier, key, value)
     session.add(supplier)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
     session.refresh(supplier)
+    counterparties_crud.index_counterparty(supplier)
     return supplier
 
 def delete_supplier_db(session: Session, supplier: Supplier) -> Supplier:
+    ledger_crud.purge_party_ledger(session, LedgerPartyType.supplier, supplier.id)
+    supplier_id = supplier.id
     session.delete(supplier)
+    reporting_crud.bump_report_data_version_db(session)
     session.commit()
+    counterparties_crud.unindex_counterparty(Supplier, supplier_id)
     return supplier
 
 def get_supplier_contacts_db(session: Session, supplier_id: int) -> List[SupplierContact]:
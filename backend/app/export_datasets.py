@@ -0,0 +1,36 @@
+import argparse
+import logging
+import os
+
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.api.routes.tools.dataset_export import DATASETS, DATASET_FORMATS, write_dataset
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def init(output_dir: str, output_format: str, names: list[str]) -> None:
+    os.makedirs(output_dir, exist_ok=True)
+    extension = DATASET_FORMATS[output_format][0]
+    with Session(engine) as session:
+        for name in names:
+            path = os.path.join(output_dir, f"{name}.{extension}")
+            rows = write_dataset(session, name, output_format, path)
+            logger.info(f"{name}: {rows} rows written to {path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export accounting tables as Parquet or Arrow IPC files")
+    parser.add_argument("output_dir")
+    parser.add_argument("--format", dest="output_format", choices=sorted(DATASET_FORMATS), default="parquet")
+    parser.add_argument("--datasets", nargs="+", choices=sorted(DATASETS), default=list(DATASETS))
+    args = parser.parse_args()
+
+    logger.info(f"Exporting {', '.join(args.datasets)} as {args.output_format}")
+    init(args.output_dir, args.output_format, args.datasets)
+
+
+if __name__ == "__main__":
+    main()
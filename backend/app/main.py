@@ -1,10 +1,16 @@
+import threading
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
+from sqlmodel import Session
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import engine
+from app.crud import counterparties as counterparties_crud
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,10 +20,24 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+def build_counterparty_indexes() -> None:
+    with Session(engine) as session:
+        counterparties_crud.build_counterparty_indexes_db(session)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Loaded in the background: requests arriving first load it themselves
+    threading.Thread(target=build_counterparty_indexes, daemon=True).start()
+    yield
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
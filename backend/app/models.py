@@ -1,9 +1,9 @@
 from sqlmodel import Field, Relationship, SQLModel
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, UniqueConstraint
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-from pydantic import validator
+from pydantic import validator, field_validator
 import base64
 
 
@@ -349,6 +349,50 @@ class ExternalInvoicesPublic(SQLModel):
 
 class InvoiceProcessingResponse(BaseModel):
     data: List[Dict[str, Any]]
+
+# Extracted invoice data keyed by the sha256 of the upload and of the rendered image,
+# so re-uploads of the same document skip the model call
+class ExtractionCache(SQLModel, table=True):
+    __tablename__ = "extraction_cache"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "model", "prompt_version", name="uq_extraction_cache_key"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    content_hash: str
+    image_hash: str = Field(index=True)
+    model: str
+    prompt_version: str
+    invoice_data: Dict[str, Any] = Field(sa_column=Column(JSON, nullable=False))
+    created_at: datetime
+    last_used_at: datetime = Field(index=True)
+    hits: int = Field(default=0)
+
+# Layout learned from one confirmed invoice of a supplier (found by its ICE), used to
+# read its next digital invoices without the model
+class SupplierTemplate(SQLModel, table=True):
+    __tablename__ = "supplier_template"
+    id: Optional[int] = Field(default=None, primary_key=True)
+    ice: str = Field(unique=True, index=True)
+    supplier: str
+    template: Dict[str, Any] = Field(sa_column=Column(JSON, nullable=False))
+    created_at: datetime
+    uses: int = Field(default=0)
+    failures: int = Field(default=0)
+    last_used_at: Optional[datetime] = None
+
+class SupplierTemplatePublic(BaseModel):
+    id: int
+    ice: str
+    supplier: str
+    fields: List[str]
+    created_at: datetime
+    uses: int
+    failures: int
+    last_used_at: Optional[datetime] = None
+
+class SupplierTemplatesPublic(BaseModel):
+    data: List[SupplierTemplatePublic]
+    count: int
 # ---
 
 
@@ -446,6 +490,65 @@ class PartsPublic(SQLModel):
     data: List[PartPublic]
     count: int
 
+# --- Invoice ingestion ---
+# An extracted invoice (same fields as the extraction result's invoice_data), as
+# reviewed by the user, entered with its counterparty and parts in one request
+class InvoiceIngestItem(BaseModel):
+    code: Optional[str] = ""
+    description: Optional[str] = ""
+    unit_price: Optional[float] = 0
+    quantity: Optional[int] = 1
+
+class InvoiceIngestData(BaseModel):
+    invoice_number: Optional[str] = ""
+    invoice_date: Optional[date] = None
+    due_date: Optional[date] = None
+    items: List[InvoiceIngestItem] = []
+    total_amount_ht: Optional[float] = None
+    total_vat_amount: Optional[float] = None
+    total_amount_ttc: Optional[float] = None
+    currency: Optional[CurrencyType] = None
+    supplier: Optional[str] = ""
+    customer: Optional[str] = ""
+    ice: Optional[str] = ""
+    postal_code: Optional[str] = ""
+
+    @field_validator("invoice_date", "due_date", "currency", mode="before")
+    @classmethod
+    def empty_as_none(cls, value: Any) -> Any:
+        # The extraction returns "" for fields it could not read
+        return value or None
+
+class InvoiceIngest(BaseModel):
+    project_id: int
+    # The supplier or customer picked by the user; otherwise found by ICE or created
+    counterparty_id: Optional[int] = None
+    invoice: InvoiceIngestData
+
+class ExternalInvoiceIngestPublic(BaseModel):
+    external_invoice: ExternalInvoicePublic
+    supplier: SupplierPublic
+    supplier_created: bool
+    parts: List[PartPublic]
+
+class InternalInvoiceIngestPublic(BaseModel):
+    internal_invoice: InternalInvoicePublic
+    customer: CustomerPublic
+    customer_created: bool
+
+# Existing suppliers/customers matching an extracted name, ICE and postal code,
+# best first (score 1 for an ICE match, else the similarity of the names)
+class CounterpartyCandidate(BaseModel):
+    id: int
+    name: str
+    ice: Optional[str] = None
+    postal_code: Optional[str] = None
+    score: float
+    match: str
+
+class CounterpartyCandidatesPublic(BaseModel):
+    data: List[CounterpartyCandidate]
+
 
 
 
@@ -477,7 +580,7 @@ class PaymentToSupplierUpdate(PaymentToSupplierBase):
     additional_fees: Optional[float] = None
 class PaymentToSupplier(PaymentToSupplierBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    external_invoice_id: int = Field(foreign_key="externalinvoice.id")
+    external_invoice_id: int = Field(foreign_key="externalinvoice.id", index=True)
     supplier_id: int = Field(foreign_key="supplier.id") 
     project_id: int = Field(foreign_key="project.id")
     external_invoice: "ExternalInvoice" = Relationship(back_populates="payments_to_suppliers")
@@ -517,7 +620,7 @@ class PaymentFromCustomerUpdate(PaymentFromCustomerBase):
     additional_fees: Optional[float] = None
 class PaymentFromCustomer(PaymentFromCustomerBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    internal_invoice_id: int = Field(foreign_key="internalinvoice.id")
+    internal_invoice_id: int = Field(foreign_key="internalinvoice.id", index=True)
     customer_id: int = Field(foreign_key="customer.id")
     project_id: int = Field(foreign_key="project.id")
     internal_invoice: "InternalInvoice" = Relationship(back_populates="payments_from_customers")
@@ -556,6 +659,73 @@ class ReportData(BaseModel):
     project_data: List[ProjectData]
     top_customers: List[EntityPayment]
     top_suppliers: List[EntityPayment]
+    # All amounts are converted to this currency at each row's date
+    currency: CurrencyType = CurrencyType.MAD
+
+# --- Ledger rollup ---
+# One row per day x project x counterparty x currency, kept in step with
+# payments and invoices by app/crud/ledger.py. Reporting reads from here.
+class LedgerPartyType(str, Enum):
+    customer = "customer"
+    supplier = "supplier"
+
+class LedgerDaily(SQLModel, table=True):
+    __tablename__ = "ledger_daily"
+    __table_args__ = (
+        UniqueConstraint("day", "project_id", "party_type", "party_id", "currency_type", name="uq_ledger_daily_key"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    day: date = Field(index=True)
+    project_id: int = Field(foreign_key="project.id", index=True)
+    party_type: LedgerPartyType
+    party_id: int
+    currency_type: CurrencyType
+    income: float = Field(default=0.0)
+    expenses: float = Field(default=0.0)
+    invoiced_ttc: float = Field(default=0.0)
+    invoiced_ht: float = Field(default=0.0)
+    vat: float = Field(default=0.0)
+
+# --- FX rates ---
+# Value of one unit of currency_type in MAD, effective from rate_date until the next rate.
+class FxRateBase(SQLModel):
+    currency_type: CurrencyType
+    rate_date: date
+    rate: float = Field(gt=0)
+
+class FxRate(FxRateBase, table=True):
+    __tablename__ = "fx_rate"
+    __table_args__ = (
+        UniqueConstraint("currency_type", "rate_date", name="uq_fx_rate_currency_date"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+class FxRatePublic(FxRateBase):
+    id: int
+
+class FxRatesPublic(SQLModel):
+    data: List[FxRatePublic]
+    count: int
+
+class FxRateImportResult(BaseModel):
+    imported: int
+    currencies: List[CurrencyType]
+    first_date: Optional[date] = None
+    last_date: Optional[date] = None
+
+# Bumped in the same transaction as every write that can change a report,
+# so cached reports are keyed by the version they were computed from.
+class ReportDataVersion(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    version: int = Field(default=0)
+
+class ReportCacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    evictions: int
+    data_version: int
 
 class ReportRequest(BaseModel):
     start_date: date
@@ -569,6 +739,94 @@ class ReportResponse(BaseModel):
     end_date: date
     report_type: str
 
+class AgingRequest(BaseModel):
+    party_type: LedgerPartyType = LedgerPartyType.customer
+    as_of: Optional[date] = None
+    output_format: str = "json"
+
+class AgingRow(BaseModel):
+    party_id: int
+    name: str
+    currency_type: CurrencyType
+    invoices: int
+    current: float
+    days_1_30: float
+    days_31_60: float
+    days_61_90: float
+    days_over_90: float
+    total: float
+
+class AgingReport(BaseModel):
+    as_of: date
+    party_type: LedgerPartyType
+    rows: List[AgingRow]
+
+class SeriesGranularity(str, Enum):
+    month = "month"
+    quarter = "quarter"
+    year = "year"
+
+class DateRange(BaseModel):
+    start_date: date
+    end_date: date
+
+class ReportSeriesRequest(BaseModel):
+    # Either split start_date..end_date by granularity, or compare explicit periods
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    granularity: Optional[SeriesGranularity] = None
+    periods: Optional[List[DateRange]] = None
+
+class PeriodData(BaseModel):
+    start_date: date
+    end_date: date
+    income: float
+    expenses: float
+    net_profit: float
+    receivables: float
+    payables: float
+    project_data: List[ProjectData]
+
+class ReportSeries(BaseModel):
+    granularity: Optional[SeriesGranularity] = None
+    currency: CurrencyType
+    periods: List[PeriodData]
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+class ReportJobPublic(BaseModel):
+    id: str
+    status: JobStatus
+    progress: float
+    message: Optional[str] = None
+    request: ReportRequest
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    download_url: Optional[str] = None
+
+class ExtractionJobPublic(BaseModel):
+    id: str
+    status: JobStatus
+    progress: float
+    message: Optional[str] = None
+    files: List[str]
+    completed: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    # Per-file results in completion order, from the requested one on (without
+    # thumbnails), and the since to pass on the next poll for only the newer ones
+    results: List[Dict[str, Any]] = []
+    next_since: int = 0
+    # Model tokens and estimated cost (USD), and seconds per pipeline stage, summed
+    # over the files completed so far
+    usage: Dict[str, Any] = {}
+    timings: Dict[str, float] = {}
+    events_url: str
+
 
 
 
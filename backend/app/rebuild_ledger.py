@@ -0,0 +1,24 @@
+import logging
+
+from sqlmodel import Session
+
+from app.core.db import engine
+from app.crud.ledger import rebuild_ledger_daily_db
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def init() -> int:
+    with Session(engine) as session:
+        return rebuild_ledger_daily_db(session)
+
+
+def main() -> None:
+    logger.info("Rebuilding ledger_daily rollup")
+    rows = init()
+    logger.info(f"ledger_daily rebuilt with {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
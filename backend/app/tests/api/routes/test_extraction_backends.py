@@ -0,0 +1,77 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.api.routes.tools import gpt_process
+from app.api.routes.tools.extraction_backends import ReplayBackend, SyntheticBackend, set_extraction_backend
+from app.api.routes.tools.gpt_process import BatchTooLarge, ExtractionQueue, ExtractionQueueFull, Upload, extract_files
+from app.core.documents import documents
+
+
+@pytest.fixture
+def uploads(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Generator[list[Upload], None, None]:
+    """Three distinct scanned pages, stored under tmp_path."""
+    monkeypatch.setattr(documents, "root", str(tmp_path / "documents"))
+    files = []
+    for number in range(3):
+        image = Image.new("RGB", (600, 800), "white")
+        ImageDraw.Draw(image).text((50, 50 + 100 * number), f"Invoice {number}", fill="black")
+        path = tmp_path / f"scan-{number}.png"
+        image.save(path)
+        files.append(Upload(path.name, "image/png", str(path)))
+    yield files
+    set_extraction_backend(None)
+
+
+def extract(uploads: list[Upload]) -> list[dict]:
+    results = dict(extract_files("sk-test", uploads, user_id=1, force_refresh=True))
+    return [results[index] for index in range(len(uploads))]
+
+
+def test_synthetic_backend_is_deterministic(uploads: list[Upload]) -> None:
+    set_extraction_backend(SyntheticBackend(latency=0))
+    first, second = extract(uploads), extract(uploads)
+    assert all(result["error"] is None for result in first + second)
+    assert [result["invoice_data"] for result in first] == [result["invoice_data"] for result in second]
+    assert len({result["invoice_data"]["invoice_number"] for result in first}) == len(uploads)
+    assert all(result["usage"]["prompt_tokens"] > 0 for result in first)
+    assert gpt_process.extraction_queue.depth() == 0
+
+
+def test_synthetic_backend_failures_fail_their_file_only(uploads: list[Upload]) -> None:
+    set_extraction_backend(SyntheticBackend(latency=0, failure_rate=1.0))
+    results = extract(uploads)
+    assert [result["error"] for result in results] == ["Synthetic extraction failure"] * len(uploads)
+    assert gpt_process.extraction_queue.depth() == 0
+
+    set_extraction_backend(SyntheticBackend(latency=0, failure_rate=0.5, seed=7))
+    errors = [result["error"] is not None for _ in range(4) for result in extract(uploads)]
+    assert any(errors) and not all(errors)
+
+
+def test_replay_backend_misses_then_replays_recordings(uploads: list[Upload], tmp_path: Path) -> None:
+    replay_dir = str(tmp_path / "replay")
+    set_extraction_backend(ReplayBackend(replay_dir))
+    assert all(result["error"].startswith("No recorded extraction") for result in extract(uploads))
+
+    set_extraction_backend(ReplayBackend(replay_dir, record=True, recorder=SyntheticBackend(latency=0)))
+    recorded = extract(uploads)
+    assert all(result["error"] is None for result in recorded)
+
+    set_extraction_backend(ReplayBackend(replay_dir))
+    replayed = extract(uploads)
+    assert [result["invoice_data"] for result in replayed] == [result["invoice_data"] for result in recorded]
+    assert all(result["usage"]["prompt_tokens"] == 0 for result in replayed)
+
+
+def test_queue_refuses_batches_over_the_user_limit() -> None:
+    queue = ExtractionQueue(max_files=5, max_files_per_user=3)
+    with pytest.raises(BatchTooLarge, match="/process_invoice/jobs"):
+        queue.enter(1, 4)
+    queue.enter(1, 3)
+    queue.enter(2, 2)
+    with pytest.raises(ExtractionQueueFull):
+        queue.enter(3, 1)
+    assert queue.depth() == 5
@@ -0,0 +1,138 @@
+from datetime import date
+from typing import List, Tuple
+
+import pytest
+
+from app.api.routes.tools.gpt_utils import Invoice, ItemDetail
+from app.api.routes.tools.invoice_templates import (
+    TemplateError,
+    learn_template,
+    parse_amount,
+    parse_date,
+    parse_with_template,
+    validate_invoice,
+    values_in,
+)
+
+# Item table columns (x ranges) of the synthetic layout
+CODE, DESCRIPTION, QUANTITY, PRICE = (50, 80), (100, 200), (250, 270), (300, 360)
+
+
+def cell(x: Tuple[int, int], text: str) -> list:
+    """One cell, its words spread evenly over x."""
+    words = text.split()
+    width = (x[1] - x[0]) / len(words)
+    return [(x[0] + i * width, x[0] + (i + 1) * width - 2, word) for i, word in enumerate(words)]
+
+
+def invoice_lines(number: str, day: str, items: List[Tuple[str, str, str, str]], totals: Tuple[str, str, str]) -> list:
+    ht, vat, ttc = totals
+    return [
+        [cell((50, 220), "ACME SARL")],
+        [cell((50, 90), "ICE"), cell((100, 250), "001234567000089")],
+        [cell((50, 150), "Facture N°"), cell((300, 360), number)],
+        [cell((50, 150), "Date"), cell((300, 360), day)],
+        [cell(CODE, "Code"), cell(DESCRIPTION, "Désignation"), cell(QUANTITY, "Qté"), cell(PRICE, "P.U.")],
+        *[
+            [cell(CODE, code), cell(DESCRIPTION, description), cell(QUANTITY, quantity), cell(PRICE, price)]
+            for code, description, quantity, price in items
+        ],
+        [cell((50, 150), "Total HT"), cell((300, 360), ht)],
+        [cell((50, 150), "TVA"), cell((300, 360), vat)],
+        [cell((50, 150), "Total TTC"), cell((300, 360), ttc)],
+    ]
+
+
+def confirmed_invoice(**overrides) -> Invoice:
+    values = dict(
+        invoice_number="F-2024-001",
+        invoice_date=date(2024, 3, 12),
+        items=[
+            ItemDetail(code="A1", description="Vis inox", quantity=10, unit_price=2.5),
+            ItemDetail(code="B2", description="Ecrou", quantity=4, unit_price=1250.0),
+        ],
+        total_amount_ht=5025.0,
+        total_vat_amount=1005.0,
+        total_amount_ttc=6030.0,
+        currency="MAD",
+        supplier="ACME SARL",
+        ice="001234567000089",
+    )
+    values.update(overrides)
+    return Invoice(**values)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 550,00", 1550.0),
+    ("7,000.00", 7000.0),
+    ("7.000,00", 7000.0),
+    ("6400.00", 6400.0),
+    ("3300", 3300.0),
+    ("1,250", 1250.0),
+    ("2,5", 2.5),
+    ("12.345.678", 12345678.0),
+    ("N/A", None),
+    ("", None),
+])
+def test_parse_amount(text: str, expected: float | None) -> None:
+    assert parse_amount(text) == expected
+
+
+def test_values_in_splits_amounts_and_reads_dates() -> None:
+    assert values_in("1 550,00 550,00", "amount") == [1550.0, 550.0]
+    assert parse_date("12/03/2024", "%d/%m/%Y") == date(2024, 3, 12)
+    assert parse_date("2024-03-12", "%d/%m/%Y") is None
+    assert values_in("Du 12.03.24 au 31.03.24", "date", "%d.%m.%y") == [date(2024, 3, 12), date(2024, 3, 31)]
+
+
+def test_learned_template_reads_the_next_invoice() -> None:
+    lines = invoice_lines(
+        "F-2024-001", "12/03/2024",
+        [("A1", "Vis inox", "10", "2,50"), ("B2", "Ecrou", "4", "1 250,00")],
+        ("5 025,00", "1 005,00", "6 030,00"),
+    )
+    template = learn_template(lines, confirmed_invoice())
+
+    next_lines = invoice_lines(
+        "F-2024-002", "02/04/2024",
+        [("C3", "Rondelle", "100", "0,40"), ("A1", "Vis inox", "20", "2,50"), ("D4", "Cheville", "5", "3,00")],
+        ("105,00", "21,00", "126,00"),
+    )
+    invoice, errors = parse_with_template(template, next_lines)
+    assert errors == []
+    assert invoice.invoice_number == "F-2024-002"
+    assert invoice.invoice_date == date(2024, 4, 2)
+    assert (invoice.total_amount_ht, invoice.total_vat_amount, invoice.total_amount_ttc) == (105.0, 21.0, 126.0)
+    assert [(item.code, item.description, item.quantity, item.unit_price) for item in invoice.items] == [
+        ("C3", "Rondelle", 100, 0.4), ("A1", "Vis inox", 20, 2.5), ("D4", "Cheville", 5, 3.0),
+    ]
+    assert (invoice.supplier, invoice.ice) == ("ACME SARL", "001234567000089")
+
+
+def test_template_parse_with_inconsistent_totals_is_rejected() -> None:
+    lines = invoice_lines(
+        "F-2024-001", "12/03/2024",
+        [("A1", "Vis inox", "10", "2,50"), ("B2", "Ecrou", "4", "1 250,00")],
+        ("5 025,00", "1 005,00", "6 030,00"),
+    )
+    template = learn_template(lines, confirmed_invoice())
+
+    misread = invoice_lines("F-2024-003", "05/04/2024", [("A1", "Vis inox", "10", "2,50")], ("30,00", "5,00", "36,00"))
+    _, errors = parse_with_template(template, misread)
+    assert errors == [
+        "items sum to 25.00, total HT is 30.00",
+        "total HT 30.00 + VAT 5.00 is not total TTC 36.00",
+    ]
+
+
+def test_validate_invoice() -> None:
+    assert validate_invoice(confirmed_invoice()) == []
+    assert validate_invoice(confirmed_invoice(invoice_number="", items=[], total_amount_ht=None, total_amount_ttc=None)) == [
+        "no invoice number", "no line items", "no total",
+    ]
+    # Rounding on the printed totals is tolerated
+    assert validate_invoice(confirmed_invoice(total_amount_ttc=6030.04)) == []
+
+    lines = invoice_lines("F-2024-001", "12/03/2024", [("A1", "Vis inox", "10", "2,50")], ("25,00", "5,00", "30,00"))
+    with pytest.raises(TemplateError, match="inconsistent"):
+        learn_template(lines, confirmed_invoice(items=[ItemDetail(code="A1", description="Vis inox", quantity=10, unit_price=2.5)]))
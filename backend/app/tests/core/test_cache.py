@@ -0,0 +1,23 @@
+from app.core.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used() -> None:
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_lru_cache_disabled_when_size_is_zero() -> None:
+    cache = LRUCache(max_entries=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
@@ -0,0 +1,51 @@
+from app.core.counterparty_index import Counterparty, CounterpartyIndex, normalize_name
+
+
+def test_normalize_name_drops_accents_punctuation_and_legal_forms() -> None:
+    assert normalize_name("Sté PRO-ASSID S.A.R.L.") == "pro assid"
+    assert normalize_name("Société Générale de Fournitures") == "generale fournitures"
+
+
+def test_resolve_ranks_ice_then_name_matches() -> None:
+    index = CounterpartyIndex()
+    index.replace([
+        Counterparty(1, "PRO-ASSID SARL", "001234567000089", "20250"),
+        Counterparty(2, "Pro Assist", "009876543000012", "10000"),
+        Counterparty(3, "Maroc Telecom", "000000000000001", "10000"),
+    ])
+    candidates = index.resolve(name="pro assid", ice="001234567000089")
+    assert [(c.id, c.match) for c in candidates][:2] == [(1, "ice"), (2, "name")]
+    assert candidates[0].score == 1.0
+
+    candidates = index.resolve(name="Ste Pro-Assid")
+    assert candidates[0].id == 1 and candidates[0].score > 0.9
+    assert all(c.id != 3 for c in candidates)
+
+
+def test_upsert_and_remove_keep_the_index_current() -> None:
+    index = CounterpartyIndex()
+    index.replace([Counterparty(1, "Atlas Bureau", "111111111111111", None)])
+    index.upsert(Counterparty(1, "Atlas Informatique", "111111111111111", None))
+    assert index.resolve(name="atlas informatique")[0].score == 1.0
+    assert not index.resolve(name="bureau")
+    index.remove(1)
+    assert not index.resolve(name="atlas informatique", ice="111111111111111")
+    assert len(index) == 0
+
+
+def test_writes_during_a_rebuild_survive_its_older_snapshot() -> None:
+    index = CounterpartyIndex()
+    snapshot = [Counterparty(1, "Atlas Bureau", None, None), Counterparty(2, "Maroc Telecom", None, None)]
+    index.replace(snapshot)
+
+    index.begin_replace()
+    # Committed after the snapshot was read
+    index.upsert(Counterparty(3, "Sigma Froid", None, None))
+    index.upsert(Counterparty(1, "Atlas Informatique", None, None))
+    index.remove(2)
+    index.replace(snapshot)
+
+    assert index.resolve(name="sigma froid")[0].id == 3
+    assert index.resolve(name="atlas informatique")[0].id == 1
+    assert not index.resolve(name="maroc telecom")
+    assert len(index) == 2
@@ -0,0 +1,41 @@
+import os
+import time
+from pathlib import Path
+
+from app.core.documents import DocumentStore
+
+ID_A, ID_B, ID_C = "a" * 64, "b" * 64, "c" * 64
+
+
+def upload(tmp_path: Path, size: int) -> str:
+    path = tmp_path / f"upload-{size}"
+    path.write_bytes(b"x" * size)
+    return str(path)
+
+
+def test_put_records_every_uploader(tmp_path: Path) -> None:
+    store = DocumentStore(str(tmp_path / "documents"), retention_days=30, max_bytes=10_000, cleanup_interval_seconds=3600)
+    store.put(ID_A, upload(tmp_path, 100), "application/pdf", owner_id=1)
+    store.put(ID_A, upload(tmp_path, 100), "application/pdf", owner_id=2)
+    document = store.get(ID_A)
+    assert document == {"content_type": "application/pdf", "size": 100, "owner_ids": [1, 2]}
+    assert store.is_owner(document, 2) and not store.is_owner(document, 3)
+
+
+def test_cleanup_removes_expired_then_least_recently_uploaded(tmp_path: Path) -> None:
+    store = DocumentStore(str(tmp_path / "documents"), retention_days=30, max_bytes=250, cleanup_interval_seconds=3600)
+    for age_days, document_id in ((40, ID_A), (2, ID_B), (1, ID_C)):
+        store.put(document_id, upload(tmp_path, 100), "application/pdf", owner_id=1)
+        used_at = time.time() - age_days * 86400
+        os.utime(f"{store.path(document_id)}.json", (used_at, used_at))
+    store.put_thumbnail(ID_C, b"x" * 10)
+
+    store.cleanup()
+    # A is past retention; B and C together are 210 bytes, under the limit
+    assert store.get(ID_A) is None and not os.path.exists(store.path(ID_A))
+    assert store.get(ID_B) and store.get(ID_C)
+
+    store.max_bytes = 150
+    store.cleanup()
+    assert store.get(ID_B) is None
+    assert store.get(ID_C) and store.get_thumbnail(ID_C) == b"x" * 10
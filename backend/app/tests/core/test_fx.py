@@ -0,0 +1,25 @@
+from datetime import date
+
+import pytest
+
+from app.core.fx import FxRateCache, MissingFxRate
+
+
+def test_fx_rate_cache_uses_latest_rate_on_or_before_day() -> None:
+    cache = FxRateCache(base_currency="MAD")
+    cache.load([("EUR", date(2024, 1, 1), 10.5), ("EUR", date(2024, 3, 1), 11.0)], version=1)
+    assert cache.rate("MAD", date(2000, 1, 1)) == 1.0
+    assert cache.rate("EUR", date(2024, 1, 1)) == 10.5
+    assert cache.rate("EUR", date(2024, 2, 29)) == 10.5
+    assert cache.rate("EUR", date(2024, 3, 1)) == 11.0
+    assert cache.rate("EUR", date(2030, 1, 1)) == 11.0
+    assert cache.convert(2.0, "EUR", date(2024, 3, 2)) == 22.0
+
+
+def test_fx_rate_cache_missing_rate() -> None:
+    cache = FxRateCache(base_currency="MAD")
+    cache.load([("EUR", date(2024, 1, 1), 10.5)], version=1)
+    assert cache.rate("EUR", date(2023, 12, 31)) is None
+    assert cache.rate("USD", date(2024, 1, 1)) is None
+    with pytest.raises(MissingFxRate):
+        cache.require_rate("EUR", date(2023, 12, 31))
@@ -0,0 +1,41 @@
+from app.core.metrics import Metrics
+
+
+def test_metrics_counters_ratio_and_timings() -> None:
+    metrics = Metrics()
+    assert metrics.ratio("text", "text", "vision") is None
+    metrics.increment("text", 3)
+    metrics.increment("vision")
+    assert metrics.ratio("text", "text", "vision") == 0.75
+    metrics.observe("model", 1.0)
+    metrics.observe("model", 3.0)
+    with metrics.timer("render"):
+        pass
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"text": 3, "vision": 1}
+    assert snapshot["timings"]["model"] == {
+        "count": 2,
+        "total_seconds": 4.0,
+        "mean_seconds": 2.0,
+        "min_seconds": 1.0,
+        "max_seconds": 3.0,
+    }
+    assert snapshot["timings"]["render"]["count"] == 1
+    metrics.reset()
+    assert metrics.snapshot() == {"counters": {}, "timings": {}}
+
+
+def test_metrics_prometheus_histograms() -> None:
+    metrics = Metrics()
+    metrics.increment("extraction.cost_usd", 0.5)
+    metrics.observe("extraction.stage.model", 0.3)
+    metrics.observe("extraction.stage.model", 200.0)
+    metrics.histogram("extraction.tokens.prompt", 700, buckets=(100, 1000))
+    text = metrics.prometheus()
+    assert "extraction_cost_usd_total 0.5" in text
+    assert 'extraction_stage_model_seconds_bucket{le="0.25"} 0' in text
+    assert 'extraction_stage_model_seconds_bucket{le="0.5"} 1' in text
+    assert 'extraction_stage_model_seconds_bucket{le="+Inf"} 2' in text
+    assert "extraction_stage_model_seconds_count 2" in text
+    assert 'extraction_tokens_prompt_bucket{le="1000"} 1' in text
+    assert "extraction_tokens_prompt_sum 700" in text
@@ -0,0 +1,32 @@
+from datetime import date
+
+from app.crud.reporting import series_period_count, series_periods
+from app.models import SeriesGranularity
+
+
+def test_series_periods_clips_first_and_last_period() -> None:
+    periods = series_periods(date(2023, 11, 15), date(2024, 2, 10), SeriesGranularity.month)
+    assert periods == [
+        (date(2023, 11, 15), date(2023, 11, 30)),
+        (date(2023, 12, 1), date(2023, 12, 31)),
+        (date(2024, 1, 1), date(2024, 1, 31)),
+        (date(2024, 2, 1), date(2024, 2, 10)),
+    ]
+
+
+def test_series_periods_quarters_align_to_calendar() -> None:
+    periods = series_periods(date(2024, 2, 1), date(2024, 12, 31), SeriesGranularity.quarter)
+    assert [start for start, _ in periods] == [date(2024, 2, 1), date(2024, 4, 1), date(2024, 7, 1), date(2024, 10, 1)]
+    assert periods[0][1] == date(2024, 3, 31)
+
+
+def test_series_period_count_matches_series_periods() -> None:
+    for granularity in SeriesGranularity:
+        for start, end in [
+            (date(2023, 11, 15), date(2024, 2, 10)),
+            (date(2024, 3, 31), date(2024, 4, 1)),
+            (date(2024, 1, 1), date(2024, 1, 1)),
+            (date(2019, 12, 31), date(2031, 1, 1)),
+        ]:
+            assert series_period_count(start, end, granularity) == len(series_periods(start, end, granularity))
+    assert series_period_count(date(1, 1, 1), date(9999, 12, 31), SeriesGranularity.month) == 9999 * 12
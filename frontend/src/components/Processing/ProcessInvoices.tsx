@@ -18,7 +18,7 @@ import {
 import AddExternalInvoice from '../Externalinvoices/AddExternalinvoice';
 import AddInternalInvoice from '../Internalinvoices/AddInternalinvoice';
 import AddPart from '../Parts/AddPart';
-import { type SupplierPublic, type CustomerPublic } from "../../client";
+import { OpenAPI, type SupplierPublic, type CustomerPublic } from "../../client";
 
 interface ProcessInvoicesProps {
   isOpen: boolean;
@@ -38,6 +38,35 @@ const ProcessInvoices: React.FC<ProcessInvoicesProps> = ({ isOpen, onClose, sele
   const [invoiceId, setInvoiceId] = useState<number | undefined>(undefined);
   const [matchedEntity, setMatchedEntity] = useState<SupplierPublic | CustomerPublic | undefined>(undefined);
   const [selectedSupplierId, setSelectedSupplierId] = useState<number | undefined>(undefined);
+  const [documentFile, setDocumentFile] = useState<{ url: string; type: string } | undefined>(undefined);
+
+  const documentUrl = processedData[currentInvoiceIndex]?.document_url;
+  const thumbnail = processedData[currentInvoiceIndex]?.thumbnail;
+
+  // The document is served by the API (authenticated), so load it as a blob for the viewer
+  useEffect(() => {
+    setDocumentFile(undefined);
+    if (!documentUrl) return;
+    let objectUrl: string | undefined;
+    let cancelled = false;
+    fetch(`${OpenAPI.BASE}${documentUrl}`, {
+      headers: { Authorization: `Bearer ${localStorage.getItem("access_token") || ""}` },
+    })
+      .then((response) => {
+        if (!response.ok) throw new Error(`Failed to load document: ${response.status}`);
+        return response.blob();
+      })
+      .then((blob) => {
+        if (cancelled) return;
+        objectUrl = URL.createObjectURL(blob);
+        setDocumentFile({ url: objectUrl, type: blob.type });
+      })
+      .catch((error) => console.error(error));
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [documentUrl]);
   
   useEffect(() => {
     if (isOpen) {
@@ -134,7 +163,6 @@ const ProcessInvoices: React.FC<ProcessInvoicesProps> = ({ isOpen, onClose, sele
 
   const currentInvoiceData = processedData[currentInvoiceIndex]?.invoice_data;
   const currentItemData = currentInvoiceData?.items?.[currentPartIndex];
-  const documentImage = processedData[currentInvoiceIndex]?.document_image;
 
   const invoicePrefillData = currentInvoiceData ? {
     reference: currentInvoiceData.invoice_number,
@@ -180,10 +208,17 @@ const ProcessInvoices: React.FC<ProcessInvoicesProps> = ({ isOpen, onClose, sele
                   <Center height="100%">
                     <Spinner size="xl" />
                   </Center>
+                ) : documentFile?.type === "application/pdf" ? (
+                  <iframe
+                    src={documentFile.url}
+                    title={`Document ${currentInvoiceIndex + 1}`}
+                    width="100%"
+                    height="100%"
+                  />
                 ) : (
-                  documentImage && (
+                  (documentFile || thumbnail) && (
                     <Image
-                      src={`data:image/jpeg;base64,${documentImage}`}
+                      src={documentFile ? documentFile.url : `data:image/jpeg;base64,${thumbnail}`}
                       alt={`Document ${currentInvoiceIndex + 1}`}
                       objectFit="contain"
                       width="100%"